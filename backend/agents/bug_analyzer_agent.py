@@ -1,17 +1,23 @@
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import PromptTemplate
 from backend.config import Config
+from backend.services.llm_cache import cached_invoke
 import json
 
+MODEL = "gemini-pro"
+# Bump whenever the prompt below changes so cached responses are not reused
+PROMPT_VERSION = "analyze_logs-v1"
+
 class BugAnalyzerAgent:
     def __init__(self):
         if not Config.GEMINI_API_KEY:
             raise ValueError("GEMINI_API_KEY not found")
-        self.llm = ChatGoogleGenerativeAI(model="gemini-pro", google_api_key=Config.GEMINI_API_KEY)
+        self.llm = ChatGoogleGenerativeAI(model=MODEL, google_api_key=Config.GEMINI_API_KEY)
         
-    def analyze_logs(self, logs: str) -> dict:
+    def analyze_logs(self, logs: str, cache_info: dict = None) -> dict:
         """
         Analyzes logs to find the first error.
+        If `cache_info` is given, cache_info["hit"] tells whether the response came from the LLM cache.
         Returns:
             {
                 "file": "path/to/file.py",
@@ -44,8 +50,7 @@ class BugAnalyzerAgent:
             # Truncate logs if too long
             truncated_logs = logs[-5000:] if len(logs) > 5000 else logs
             
-            response = chain.invoke({"logs": truncated_logs})
-            content = response.content.strip()
+            content = cached_invoke(chain, {"logs": truncated_logs}, MODEL, PROMPT_VERSION, cache_info).strip()
             
             if content.startswith("```json"):
                 content = content[7:-3]
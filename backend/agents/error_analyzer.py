@@ -1,7 +1,26 @@
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import PromptTemplate
 from backend.config import Config
+from backend.services.llm_cache import cached_invoke
 import json
+import threading
+
+MODEL = "gemini-pro"
+# Bump whenever CODE_FILE_PROMPT changes so cached responses are not reused
+CODE_FILE_PROMPT_VERSION = "analyze_code_file-v1"
+
+_llm = None
+_llm_lock = threading.Lock()
+
+def get_llm():
+    """
+    Shared Gemini client for all analysis calls (thread-safe, created once).
+    """
+    global _llm
+    with _llm_lock:
+        if _llm is None:
+            _llm = ChatGoogleGenerativeAI(model=MODEL, google_api_key=Config.GEMINI_API_KEY)
+        return _llm
 
 def analyze_error(test_output: str):
     if not Config.GEMINI_API_KEY:
@@ -35,47 +54,49 @@ def analyze_error(test_output: str):
         # Fallback if parsing fails
         return {"type": "LOGIC", "description": "Could not parse error", "file": "unknown", "line": 0}
 
-def analyze_code_file(file_info: dict):
+CODE_FILE_PROMPT = PromptTemplate.from_template(
+    """
+    You are a senior python developer.
+    Analyze the following python file for errors.
+    
+    File: {filename}
+    
+    Potential Issues Detected:
+    {error_detail}
+    
+    File Content:
+    {content}
+    
+    Task:
+    Identify the FIRST critical error (Syntax, Linting, Import, Logic).
+    If no critical error exists, return INVALID_JSON.
+    
+    Return a valid JSON object (NO MARKDOWN) with:
+    - "file": "{filename}"
+    - "line": line number (integer)
+    - "type": one of [LINTING, SYNTAX, LOGIC, TYPE_ERROR, IMPORT, INDENTATION]
+    - "description": brief description of error
+    - "suggested_fix": brief fix suggestion
+    """
+)
+
+def analyze_code_file(file_info: dict, cache_info: dict = None):
     if not Config.GEMINI_API_KEY:
         return {"error": "Missing API Key"}
-        
-    llm = ChatGoogleGenerativeAI(model="gemini-pro", google_api_key=Config.GEMINI_API_KEY)
     
-    prompt = PromptTemplate.from_template(
-        """
-        You are a senior python developer.
-        Analyze the following python file for errors.
-        
-        File: {filename}
-        
-        Potential Issues Detected:
-        {error_detail}
-        
-        File Content:
-        {content}
-        
-        Task:
-        Identify the FIRST critical error (Syntax, Linting, Import, Logic).
-        If no critical error exists, return INVALID_JSON.
-        
-        Return a valid JSON object (NO MARKDOWN) with:
-        - "file": "{filename}"
-        - "line": line number (integer)
-        - "type": one of [LINTING, SYNTAX, LOGIC, TYPE_ERROR, IMPORT, INDENTATION]
-        - "description": brief description of error
-        - "suggested_fix": brief fix suggestion
-        """
-    )
-    
-    chain = prompt | llm
+    chain = CODE_FILE_PROMPT | get_llm()
     try:
-        response = chain.invoke({
-            "filename": file_info.get("file"),
-            "error_detail": file_info.get("error_detail", "None"),
-            "content": file_info.get("content")
-        })
-        
-        content = response.content.strip()
+        content = cached_invoke(
+            chain,
+            {
+                "filename": file_info.get("file"),
+                "error_detail": file_info.get("error_detail", "None"),
+                "content": file_info.get("content")
+            },
+            MODEL,
+            CODE_FILE_PROMPT_VERSION,
+            cache_info
+        ).strip()
         if content.startswith("```json"):
             content = content[7:-3]
         elif content.startswith("```"):
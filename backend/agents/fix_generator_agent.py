@@ -2,7 +2,86 @@
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import PromptTemplate
 from backend.config import Config
+from backend.services.llm_cache import cached_invoke
+from backend.services.patch_applier import PatchApplier, PatchError
+from backend.services.context_builder import ContextBuilder
 import os
+import threading
+
+MODEL = "gemini-1.5-pro-latest"
+TEMPERATURE = 0.2
+# Bump whenever a prompt below changes so cached responses are not reused
+PROMPT_VERSION = "generate_fix-v2"
+PATCH_PROMPT_VERSION = "generate_patch-v2"
+
+FULL_FILE_PROMPT = PromptTemplate(
+    input_variables=["code", "language", "type", "line", "message", "context"],
+    template="""
+    You are an expert Autonomous Coding Agent specializing in {language}.
+    
+    Analyze the following code and the detected error.
+    Generate a minimal, correct fix.
+    
+    Context:
+    - Language: {language}
+    - Error Type: {type}
+    - Location: Line {line}
+    - Message: {message}
+    
+    READ-ONLY CONTEXT (imports and definitions the code uses; do not repeat or modify):
+    ```
+    {context}
+    ```
+    
+    CODE CONTENT:
+    ```
+    {code}
+    ```
+    
+    INSTRUCTIONS:
+    1. Fix ONLY the reported error.
+    2. Do not add comments or explanations.
+    3. Return the COMPLETE code content with the fix applied, keeping its indentation.
+    4. Ensure the syntax is correct for {language}.
+    
+    OUTPUT (Raw Code Only):
+    """
+)
+
+PATCH_PROMPT = PromptTemplate(
+    input_variables=["code", "language", "type", "line", "message", "context"],
+    template="""
+    You are an expert Autonomous Coding Agent specializing in {language}.
+    
+    Analyze the following code and the detected error.
+    Generate a minimal, correct fix as a unified diff.
+    
+    Context:
+    - Language: {language}
+    - Error Type: {type}
+    - Location: Line {line}
+    - Message: {message}
+    
+    READ-ONLY CONTEXT (imports and definitions the code uses; do not repeat or modify):
+    ```
+    {context}
+    ```
+    
+    CODE CONTENT (each line is prefixed with its line number and "| ", which is NOT part of the code):
+    ```
+    {code}
+    ```
+    
+    INSTRUCTIONS:
+    1. Fix ONLY the reported error.
+    2. Do not add comments or explanations.
+    3. Return a unified diff: "@@ -start,count +start,count @@" hunk headers, 3 lines of unchanged context,
+       "-" for removed lines, "+" for added lines. Do not include the line-number prefixes.
+    4. Ensure the syntax is correct for {language}.
+    
+    OUTPUT (Diff Only):
+    """
+)
 
 class FixGeneratorAgent:
     def __init__(self):
@@ -10,54 +89,114 @@ class FixGeneratorAgent:
             raise ValueError("GEMINI_API_KEY not found")
             
         self.llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-pro-latest",
+            model=MODEL,
             google_api_key=Config.GEMINI_API_KEY,
-            temperature=0.2
+            temperature=TEMPERATURE
         )
+        self._llms = {TEMPERATURE: self.llm}
+        self._llms_lock = threading.Lock()
 
-    def generate_fix(self, file_content: str, error_analysis: dict, language: str = "Unknown") -> str:
+    def _llm_for(self, temperature: float = None):
+        # Speculative candidates sample at other temperatures; one client per temperature
+        if temperature is None:
+            temperature = TEMPERATURE
+        with self._llms_lock:
+            if temperature not in self._llms:
+                self._llms[temperature] = ChatGoogleGenerativeAI(
+                    model=MODEL,
+                    google_api_key=Config.GEMINI_API_KEY,
+                    temperature=temperature
+                )
+            return self._llms[temperature]
+
+    def generate_scoped_fix(self, file_path: str, file_content: str, error_analysis: dict, language: str = "Unknown", cache_info: dict = None, temperature: float = None) -> str:
+        """
+        Fixes only the code around the error: the enclosing function/class plus
+        read-only imports and referenced symbols, within FIX_CONTEXT_TOKENS.
+        The fixed window is spliced back and the whole file content is returned.
+        """
+        if cache_info is None:
+            cache_info = {}
+        if Config.FIX_CONTEXT_TOKENS <= 0:
+            return self.generate_fix(file_content, error_analysis, language, cache_info, temperature=temperature)
+
+        window = ContextBuilder.build(file_content, file_path, error_analysis.get("line", 0), Config.FIX_CONTEXT_TOKENS)
+        cache_info["window"] = (window["start"], window["end"])
+        local_error = dict(error_analysis, line=window["line"])
+        fixed = self.generate_fix(window["code"], local_error, language, cache_info, context=window["context"], temperature=temperature)
+        if fixed == window["code"]:
+            return file_content
+        return ContextBuilder.splice(file_content, window, fixed)
+
+    def generate_fix(self, file_content: str, error_analysis: dict, language: str = "Unknown", cache_info: dict = None, context: str = "", temperature: float = None) -> str:
         """
         Generates a code fix using LLM with language context.
+        In "patch" mode the model returns a unified diff which is applied with a
+        fuzzy hunk matcher; if that fails the whole file is regenerated.
+        If `cache_info` is given, cache_info["hit"] tells whether the response came
+        from the LLM cache and cache_info["fix_mode"] which mode produced the fix.
         """
-        prompt_template = PromptTemplate(
-            input_variables=["code", "error", "language"],
-            template="""
-            You are an expert Autonomous Coding Agent specializing in {language}.
-            
-            Analyze the following code and the detected error.
-            Generate a minimal, correct fix.
-            
-            Context:
-            - Language: {language}
-            - Error Type: {error[type]}
-            - Location: Line {error[line]}
-            - Message: {error[message]}
-            
-            CODE CONTENT:
-            ```
-            {code}
-            ```
-            
-            INSTRUCTIONS:
-            1. Fix ONLY the reported error.
-            2. Do not add comments or explanations.
-            3. Return the COMPLETE file content with the fix applied.
-            4. Ensure the syntax is correct for {language}.
-            
-            OUTPUT (Raw Code Only):
-            """
+        if cache_info is None:
+            cache_info = {}
+
+        if Config.FIX_MODE == "patch":
+            try:
+                fixed = self.generate_patch(file_content, error_analysis, language, cache_info, context, temperature)
+                cache_info["fix_mode"] = "patch"
+                return fixed
+            except Exception as e:
+                cache_info["patch_error"] = str(e)
+
+        cache_info["fix_mode"] = "full"
+        return self._generate_full_file(file_content, error_analysis, language, cache_info, context, temperature)
+
+    def generate_patch(self, file_content: str, error_analysis: dict, language: str = "Unknown", cache_info: dict = None, context: str = "", temperature: float = None) -> str:
+        """
+        Asks for a unified diff and returns the patched content.
+        Raises PatchError when the diff is missing or does not apply.
+        """
+        numbered = "\n".join(f"{i:>5}| {line}" for i, line in enumerate(file_content.split("\n"), 1))
+        chain = PATCH_PROMPT | self._llm_for(temperature)
+        response = cached_invoke(
+            chain,
+            {
+                "code": numbered,
+                "language": language,
+                "type": error_analysis.get("type", "UNKNOWN"),
+                "line": error_analysis.get("line", 0),
+                "message": error_analysis.get("message") or error_analysis.get("description", ""),
+                "context": context or "(none)"
+            },
+            f"{MODEL}@{TEMPERATURE if temperature is None else temperature}",
+            PATCH_PROMPT_VERSION,
+            cache_info
         )
-        
-        chain = prompt_template | self.llm
+
+        diff = PatchApplier.extract_diff(response)
+        if not diff:
+            raise PatchError("Model did not return a diff")
+        return PatchApplier.apply(file_content, diff, fuzz=Config.PATCH_FUZZ)
+
+    def _generate_full_file(self, file_content: str, error_analysis: dict, language: str, cache_info: dict, context: str = "", temperature: float = None) -> str:
+        chain = FULL_FILE_PROMPT | self._llm_for(temperature)
         
         try:
-            response = chain.invoke({
-                "code": file_content,
-                "error": error_analysis,
-                "language": language
-            })
+            content = cached_invoke(
+                chain,
+                {
+                    "code": file_content,
+                    "language": language,
+                    "type": error_analysis.get("type", "UNKNOWN"),
+                    "line": error_analysis.get("line", 0),
+                    "message": error_analysis.get("message") or error_analysis.get("description", ""),
+                    "context": context or "(none)"
+                },
+                f"{MODEL}@{TEMPERATURE if temperature is None else temperature}",
+                PROMPT_VERSION,
+                cache_info
+            )
             
-            clean_code = response.content.replace("```python", "").replace("```javascript", "").replace("```java", "").replace("```go", "").replace("```", "").strip()
+            clean_code = content.replace("```python", "").replace("```javascript", "").replace("```java", "").replace("```go", "").replace("```", "").strip("\n").rstrip()
             return clean_code
             
         except Exception as e:
@@ -1,4 +1,4 @@
-from typing import Dict
+from typing import Callable, Dict, List, Optional
 from backend.docker_manager import DockerManager
 from backend.config import Config
 
@@ -6,21 +6,24 @@ class TestRunnerAgent:
     def __init__(self):
         self.docker_manager = DockerManager()
 
-    def run_tests(self, repo_url: str, branch_name: str, token: str, auth_mode: str = "https", private_key: str = None) -> Dict[str, str]:
+    def run_tests(self, repo_url: str, branch_name: str, token: str, auth_mode: str = "https", private_key: str = None, repo_path: str = None, changed_files: List[str] = None, on_event: Optional[Callable[[Dict], None]] = None) -> Dict[str, str]:
         """
         Orchestrates test execution in a sandbox.
         """
         print(f"TestRunner: Starting tests for {repo_url} on branch {branch_name} (Auth: {auth_mode})")
         
         # We delegate the heavy lifting to DockerManager
-        # Now passing auth_mode and private_key
+        # Now passing auth_mode and private_key; repo_path lets the sandbox use the host clone
         result = self.docker_manager.run_tests_in_sandbox(
             
             repo_url=repo_url,
             branch_name=branch_name,
             token=token,
             auth_mode=auth_mode,
-            private_key=private_key
+            private_key=private_key,
+            repo_path=repo_path,
+            changed_files=changed_files,
+            on_event=on_event
         )
         
         return result
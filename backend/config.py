@@ -11,5 +11,88 @@ class Config:
     WORKSPACE_DIR = os.path.join(os.getcwd(), "workspace")
     RESULTS_FILE = "results.json"
 
+    # Concurrent runs (worker pool size for the run manager)
+    MAX_CONCURRENT_RUNS = int(os.getenv("MAX_CONCURRENT_RUNS", max(1, (os.cpu_count() or 2) // 2)))
+    MAX_RETAINED_RUNS = int(os.getenv("MAX_RETAINED_RUNS", 50))
+
+    # Per-run log store: lines kept in memory, older lines spill to disk
+    RUN_LOG_BUFFER_LINES = int(os.getenv("RUN_LOG_BUFFER_LINES", 2000))
+    RUN_LOG_DIR = os.getenv("RUN_LOG_DIR", os.path.join(os.getcwd(), "run_logs"))
+
+    # Repository scanner: syntax checks run in a process pool; results cached by blob hash / (path, size, mtime)
+    SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", os.cpu_count() or 2))
+    SCAN_CACHE_ENTRIES = int(os.getenv("SCAN_CACHE_ENTRIES", 100000))
+
+    # Repository analysis pipeline (graph.analyze_node)
+    ANALYSIS_CONCURRENCY = int(os.getenv("ANALYSIS_CONCURRENCY", 8))
+    ANALYSIS_QUEUE_SIZE = int(os.getenv("ANALYSIS_QUEUE_SIZE", 32))
+    ANALYSIS_MAX_FILES = int(os.getenv("ANALYSIS_MAX_FILES", 0))  # 0 = whole repository
+    ANALYSIS_WRITE_INTERVAL = float(os.getenv("ANALYSIS_WRITE_INTERVAL", 2))  # seconds between results.json updates
+
+    # Sandbox container pool
+    SANDBOX_IMAGE = "rift-sandbox:latest"
+    SANDBOX_POOL_SIZE = int(os.getenv("SANDBOX_POOL_SIZE", 2))
+    SANDBOX_POOL_IDLE_TIMEOUT = int(os.getenv("SANDBOX_POOL_IDLE_TIMEOUT", 600))  # seconds
+
+    # Per-sandbox limits (0 = unlimited) and the wall-clock deadline of one test run
+    SANDBOX_CPUS = float(os.getenv("SANDBOX_CPUS", 2))
+    SANDBOX_MEMORY_MB = int(os.getenv("SANDBOX_MEMORY_MB", 2048))
+    SANDBOX_PIDS_LIMIT = int(os.getenv("SANDBOX_PIDS_LIMIT", 1024))
+    SANDBOX_TIMEOUT = int(os.getenv("SANDBOX_TIMEOUT", 1800))  # seconds
+    SANDBOX_QUEUE_TIMEOUT = int(os.getenv("SANDBOX_QUEUE_TIMEOUT", 1800))  # seconds waiting for capacity (0 = no limit)
+    # Host capacity sandboxes are admitted against (0 = detected from the Docker host)
+    SANDBOX_CAPACITY_CPUS = float(os.getenv("SANDBOX_CAPACITY_CPUS", 0))
+    SANDBOX_CAPACITY_MEMORY_MB = int(os.getenv("SANDBOX_CAPACITY_MEMORY_MB", 0))
+
+    # Where the sandbox gets the code from: "local" copies the host clone, "remote" re-clones the pushed branch
+    SANDBOX_SOURCE = os.getenv("SANDBOX_SOURCE", "local")
+
+    # "deferred" commits locally each iteration and pushes once before the PR (local sandbox source only);
+    # "every" pushes after each commit
+    PUSH_MODE = os.getenv("PUSH_MODE", "deferred")
+
+    # "changed" runs only tests affected by the last fix (full suite confirms before PR); "full" always runs everything
+    TEST_SELECTION = os.getenv("TEST_SELECTION", "changed")
+
+    # Full-suite runs are split across this many sandbox containers (1 = no sharding),
+    # balanced by the per-test durations of earlier runs
+    TEST_SHARDS = int(os.getenv("TEST_SHARDS", 1))
+    TEST_TIMINGS_DIR = os.getenv("TEST_TIMINGS_DIR", os.path.join(os.getcwd(), "test_timings"))
+
+    # Subprojects of a polyglot/monorepo (e.g. Python backend + Node frontend) tested at once in a sandbox
+    SUBPROJECT_CONCURRENCY = int(os.getenv("SUBPROJECT_CONCURRENCY", 4))
+
+    # Dependency cache shared by sandboxes, keyed by lockfile hash (empty dir = disabled)
+    DEP_CACHE_DIR = os.getenv("DEP_CACHE_DIR", os.path.join(os.getcwd(), "dep_cache"))
+    DEP_CACHE_MAX_MB = int(os.getenv("DEP_CACHE_MAX_MB", 10240))
+
+    # Post-install sandbox snapshots (0 images = disabled)
+    SNAPSHOT_MAX_IMAGES = int(os.getenv("SNAPSHOT_MAX_IMAGES", 10))
+    SNAPSHOT_MAX_AGE_HOURS = int(os.getenv("SNAPSHOT_MAX_AGE_HOURS", 72))
+
+    # Bare mirrors of cloned repositories; workspaces are cloned from them (empty dir = disabled)
+    MIRROR_DIR = os.getenv("MIRROR_DIR", os.path.join(os.getcwd(), "git_mirrors"))
+
+    # Disk-backed LLM response cache (empty dir = disabled)
+    LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", os.path.join(os.getcwd(), "llm_cache"))
+    LLM_CACHE_MAX_MB = int(os.getenv("LLM_CACHE_MAX_MB", 256))
+    LLM_CACHE_TTL_HOURS = int(os.getenv("LLM_CACHE_TTL_HOURS", 168))
+
+    # "patch" asks the model for a unified diff (falls back to full-file on failure); "full" always rewrites the file
+    FIX_MODE = os.getenv("FIX_MODE", "patch")
+    PATCH_FUZZ = int(os.getenv("PATCH_FUZZ", 2))  # context lines a hunk may drop to find its place
+
+    # Token budget for the code sent with a fix prompt (enclosing scope + imports); 0 sends whole files
+    FIX_CONTEXT_TOKENS = int(os.getenv("FIX_CONTEXT_TOKENS", 3000))
+
+    # Batch fixing: all errors of a test run are fixed per iteration, grouped by file
+    FIX_BATCH_MAX_FILES = int(os.getenv("FIX_BATCH_MAX_FILES", 10))
+    FIX_CONCURRENCY = int(os.getenv("FIX_CONCURRENCY", 4))  # files fixed in parallel
+
+    # Speculative fixing: K candidates per file, tested in parallel sandboxes; first green wins (1 = off)
+    FIX_CANDIDATES = int(os.getenv("FIX_CANDIDATES", 1))
+    FIX_CANDIDATE_PARALLELISM = int(os.getenv("FIX_CANDIDATE_PARALLELISM", 2))
+    FIX_CANDIDATE_TEMPERATURES = os.getenv("FIX_CANDIDATE_TEMPERATURES", "0.2,0.5,0.8,1.0")
+
     # Ensure workspace exists
     os.makedirs(WORKSPACE_DIR, exist_ok=True)
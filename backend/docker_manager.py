@@ -1,11 +1,185 @@
 
 import docker
+import io
 import os
 import shutil
 import time
 import json
 import base64
-from typing import Dict
+import shlex
+import threading
+import tarfile
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+from backend.config import Config
+from backend.services.dependency_cache import DependencyCache
+from backend.services.sandbox_snapshots import SandboxSnapshots
+from backend.services.repo_mirror import get_repo_mirror
+from backend.services.test_timings import get_test_timings
+from backend.services.sandbox_scheduler import SandboxScheduler
+from backend.services.tracing import span, record_span, in_context
+from backend.scripts.universal_runner import detect_subprojects
+
+POOL_LABEL = "rift.sandbox.pool"
+CACHE_MOUNT = "/cache"
+MIRROR_MOUNT = "/mirrors"
+SHARD_TIMINGS_PATH = "/app/rift-timings.json"
+MERGED_LOG_LIMIT = 200000
+# Installed into a subproject's directory by the runner (by toolchain); survive the workspace refresh of a snapshot
+WORKSPACE_DEPENDENCY_DIRS = {"node": "node_modules", "php": "vendor"}
+
+# Runner stages timed as spans (stage event -> span name); a stage ends when the next one starts
+STAGE_SPANS = {"install": "install", "test": "test_execution"}
+
+# Worst first: a merged run has the status of its worst part
+STATUS_RANK = ["FAILED", "INSTALL_FAILED", "KILLED", "TIMEOUT", "SYSTEM_ERROR", "ERROR"]
+
+# Share of the Docker host's memory left to the daemon and the host itself
+HOST_MEMORY_HEADROOM = 0.1
+# Exit status of a process killed with SIGKILL (OOM killer, `docker kill`)
+KILLED_EXIT_CODES = (137, -9)
+
+def start_sandbox_container(client, image: str):
+    """
+    Starts an idle sandbox container; work is injected later via exec.
+    The dependency cache directory is mounted when enabled. CPU, memory
+    (no swap) and process limits come from the SANDBOX_* settings.
+    """
+    volumes = {}
+    environment = {}
+    if Config.DEP_CACHE_DIR:
+        volumes[os.path.abspath(Config.DEP_CACHE_DIR)] = {"bind": CACHE_MOUNT, "mode": "rw"}
+        environment["RIFT_CACHE_ROOT"] = CACHE_MOUNT
+    if Config.MIRROR_DIR:
+        # Remote-mode checkouts borrow objects from the host's repository mirrors
+        os.makedirs(Config.MIRROR_DIR, exist_ok=True)
+        volumes[os.path.abspath(Config.MIRROR_DIR)] = {"bind": MIRROR_MOUNT, "mode": "ro"}
+
+    limits = {}
+    if Config.SANDBOX_CPUS > 0:
+        limits["nano_cpus"] = int(Config.SANDBOX_CPUS * 1e9)
+    if Config.SANDBOX_MEMORY_MB > 0:
+        limits["mem_limit"] = f"{Config.SANDBOX_MEMORY_MB}m"
+        limits["memswap_limit"] = f"{Config.SANDBOX_MEMORY_MB}m"
+    if Config.SANDBOX_PIDS_LIMIT > 0:
+        limits["pids_limit"] = Config.SANDBOX_PIDS_LIMIT
+
+    return client.containers.run(
+        image,
+        command="sleep infinity",
+        detach=True,
+        labels={POOL_LABEL: "1"},
+        volumes=volumes,
+        environment=environment,
+        **limits
+    )
+
+class SandboxPool:
+    """
+    Keeps a number of started, idle sandbox containers ready to be claimed.
+    Claimed containers are recycled (removed) after use and the pool is
+    refilled in the background, so container start-up is off the critical path.
+    """
+
+    def __init__(self, client, image: str, size: int, idle_timeout: int):
+        self.client = client
+        self.image = image
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self._idle: List = []
+        self._starting = 0
+        self._last_claim = time.time()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        self._remove_orphans()
+        self._thread = threading.Thread(target=self._maintain, name="rift-sandbox-pool", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        self._wakeup.set()
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for container in idle:
+            self._discard(container)
+
+    def claim(self):
+        """
+        Returns a started sandbox container, from the pool when one is idle,
+        otherwise a freshly started one.
+        """
+        with self._lock:
+            self._last_claim = time.time()
+            container = self._idle.pop() if self._idle else None
+        self._wakeup.set()
+
+        if container is not None:
+            try:
+                container.reload()
+                if container.status == "running":
+                    return container
+            except Exception:
+                pass
+            self._discard(container)
+
+        return start_sandbox_container(self.client, self.image)
+
+    def release(self, container):
+        """
+        Recycles a claimed container. Containers are never reused across runs,
+        so no state (credentials, installed packages) leaks between repositories.
+        """
+        self._discard(container)
+        self._wakeup.set()
+
+    def _discard(self, container):
+        try:
+            container.remove(force=True)
+        except Exception:
+            pass
+
+    def _remove_orphans(self):
+        # Containers left over from a previous server process
+        try:
+            for container in self.client.containers.list(all=True, filters={"label": POOL_LABEL}):
+                self._discard(container)
+        except Exception as e:
+            print(f"Sandbox Pool: failed to clean up old containers: {e}")
+
+    def _maintain(self):
+        while not self._stopped:
+            with self._lock:
+                idle_for = time.time() - self._last_claim
+                drain = idle_for > self.idle_timeout
+                expired = self._idle if drain else []
+                if drain:
+                    self._idle = []
+                missing = 0 if drain else self.size - len(self._idle) - self._starting
+                self._starting += max(missing, 0)
+
+            for container in expired:
+                self._discard(container)
+
+            for _ in range(max(missing, 0)):
+                try:
+                    container = start_sandbox_container(self.client, self.image)
+                    with self._lock:
+                        self._idle.append(container)
+                except Exception as e:
+                    print(f"Sandbox Pool: failed to start container: {e}")
+                finally:
+                    with self._lock:
+                        self._starting -= 1
+
+            # Refill promptly after a claim, otherwise check periodically for idle expiry
+            self._wakeup.wait(timeout=min(30, self.idle_timeout))
+            self._wakeup.clear()
 
 class DockerManager:
     def __init__(self):
@@ -15,6 +189,109 @@ class DockerManager:
             print(f"Docker Error: {e}")
             self.client = None
 
+        self.pool: Optional[SandboxPool] = None
+        self.snapshots: Optional[SandboxSnapshots] = None
+        self.dep_cache: Optional[DependencyCache] = None
+        self.scheduler: Optional[SandboxScheduler] = None
+        if Config.DEP_CACHE_DIR:
+            self.dep_cache = DependencyCache(Config.DEP_CACHE_DIR, Config.DEP_CACHE_MAX_MB * 1024 * 1024)
+        self._ready = threading.Event()
+        self._started = False
+        self._start_lock = threading.Lock()
+        self._image_ok = False
+
+    def startup(self):
+        """
+        Ensures the sandbox image exists and starts the warm container pool.
+        Called once at server startup; test runs wait until this completes.
+        """
+        with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+
+        try:
+            if not self.client:
+                return
+
+            try:
+                self.client.images.get(Config.SANDBOX_IMAGE)
+                self._image_ok = True
+            except docker.errors.ImageNotFound:
+                self._image_ok = self.build_sandbox_image()
+
+            self.scheduler = self._create_scheduler()
+
+            if self._image_ok and Config.SNAPSHOT_MAX_IMAGES > 0:
+                self.snapshots = SandboxSnapshots(
+                    self.client,
+                    Config.SANDBOX_IMAGE,
+                    Config.SNAPSHOT_MAX_IMAGES,
+                    Config.SNAPSHOT_MAX_AGE_HOURS * 3600
+                )
+                self.snapshots.enforce_retention()
+
+            if self._image_ok and Config.SANDBOX_POOL_SIZE > 0:
+                self.pool = SandboxPool(
+                    self.client,
+                    Config.SANDBOX_IMAGE,
+                    Config.SANDBOX_POOL_SIZE,
+                    Config.SANDBOX_POOL_IDLE_TIMEOUT
+                )
+                self.pool.start()
+                print(f"Sandbox Pool started (size={Config.SANDBOX_POOL_SIZE}).")
+        finally:
+            self._ready.set()
+
+    def _create_scheduler(self) -> SandboxScheduler:
+        capacity_cpus = Config.SANDBOX_CAPACITY_CPUS
+        capacity_memory = Config.SANDBOX_CAPACITY_MEMORY_MB * 1024 * 1024
+        if not capacity_cpus or not capacity_memory:
+            try:
+                info = self.client.info()
+            except Exception:
+                info = {}
+            capacity_cpus = capacity_cpus or info.get("NCPU") or os.cpu_count() or 1
+            capacity_memory = capacity_memory or int((info.get("MemTotal") or 0) * (1 - HOST_MEMORY_HEADROOM))
+
+        scheduler = SandboxScheduler(
+            capacity_cpus,
+            capacity_memory,
+            Config.SANDBOX_CPUS,
+            Config.SANDBOX_MEMORY_MB * 1024 * 1024 if capacity_memory else 0
+        )
+        print(f"Sandbox admission: {capacity_cpus} CPUs, {capacity_memory // (1024 * 1024)} MB capacity.")
+        return scheduler
+
+    def shutdown(self):
+        if self.pool:
+            self.pool.stop()
+
+    def _claim_container(self, snapshot_image: str = None):
+        """
+        A started sandbox container: from `snapshot_image` (a post-install
+        snapshot) when given, otherwise from the pool.
+        """
+        with span("docker_start", source="snapshot" if snapshot_image else "pool" if self.pool else "image"):
+            if snapshot_image:
+                return start_sandbox_container(self.client, snapshot_image)
+            if self.pool:
+                return self.pool.claim()
+            return start_sandbox_container(self.client, Config.SANDBOX_IMAGE)
+
+    def _release_container(self, container):
+        if self.pool:
+            self.pool.release(container)
+        else:
+            try:
+                container.remove(force=True)
+            except Exception:
+                pass
+
+        # Keep the dependency cache within its size budget
+        if self.dep_cache:
+            threading.Thread(target=self.dep_cache.enforce_limit, daemon=True).start()
+
     def build_sandbox_image(self):
         """
         Builds the universal sandbox image if not present.
@@ -28,7 +305,7 @@ class DockerManager:
             self.client.images.build(
                 path=os.path.dirname(__file__),
                 dockerfile="sandbox.Dockerfile",
-                tag="rift-sandbox:latest"
+                tag=Config.SANDBOX_IMAGE
             )
             print("Sandbox Image Built Successfully.")
             return True
@@ -36,110 +313,423 @@ class DockerManager:
             print(f"Build Failed: {e}")
             return False
 
-    def run_tests_in_sandbox(self, repo_url: str, branch_name: str, token: str, auth_mode: str = "https", private_key: str = None) -> Dict:
+    def _copy_workspace(self, container, repo_path: str):
+        """
+        Copies the host clone (without .git) into the container at /app/repo.
+        Files already there are removed first: a snapshot still holds the workspace
+        it was taken from, and files deleted since then must not survive. Only the
+        dependency directories the runner installs (node_modules, composer's vendor
+        at each subproject root) are kept, they are what the snapshot is for; one
+        that exists in the host clone is committed source and is replaced too.
+        """
+        def skip_git(info):
+            parts = info.name.split("/")
+            return None if len(parts) > 1 and parts[1] == ".git" else info
+
+        keep = []
+        for root, language in detect_subprojects(repo_path):
+            name = WORKSPACE_DEPENDENCY_DIRS.get(language)
+            if name and not os.path.lexists(os.path.join(repo_path, root, name)):
+                keep.append(shlex.quote(os.path.normpath(os.path.join("/app/repo", root, name))))
+        prune = f"\\( {' -o '.join(f'-path {path}' for path in keep)} \\) -prune -o " if keep else ""
+        container.exec_run(["sh", "-c", f"[ -d /app/repo ] && find /app/repo -mindepth 1 {prune}! -type d -exec rm -f {{}} +"])
+        with span("workspace_copy"), tempfile.TemporaryFile() as archive:
+            with tarfile.open(fileobj=archive, mode="w") as tar:
+                tar.add(repo_path, arcname="repo", filter=skip_git)
+            archive.seek(0)
+            container.put_archive("/app", archive)
+
+    def _remote_checkout_script(self, repo_url: str, branch_name: str, token: str, auth_mode: str, private_key: str) -> Optional[str]:
+        """
+        Builds the shell prefix that clones the pushed branch inside the container.
+        Returns None if the credentials for the auth mode are missing.
+        """
+        clean_url = repo_url.replace("https://", "")
+        clone_cmd = ""
+        pre_config = ""
+
+        # Objects already in the host mirror are copied locally instead of downloaded
+        reference = ""
+        mirror = get_repo_mirror()
+        if mirror and mirror.existing(repo_url):
+            reference = f"--reference {MIRROR_MOUNT}/{mirror.key(repo_url)} --dissociate "
+        
+        if auth_mode == "https":
+            if token:
+                 auth_url = f"https://{token}@{clean_url}"
+            else:
+                 auth_url = repo_url
+            clone_cmd = f"git clone {reference}{auth_url} /app/repo"
+            
+        elif auth_mode == "ssh":
+            if not private_key:
+                 return None
+                 
+            b64_key = base64.b64encode(private_key.encode('utf-8')).decode('utf-8')
+            
+            pre_config = f"""
+            mkdir -p /root/.ssh && \
+            echo '{b64_key}' | base64 -d > /root/.ssh/id_rsa && \
+            chmod 600 /root/.ssh/id_rsa && \
+            ssh-keyscan github.com >> /root/.ssh/known_hosts && \
+            """
+            
+            ssh_url = repo_url
+            if "https://" in repo_url:
+                 ssh_url = repo_url.replace("https://github.com/", "git@github.com:")
+            
+            clone_cmd = f"git clone {reference}{ssh_url} /app/repo"
+
+        return f"""
+            {pre_config}
+            {clone_cmd} && \
+            cd /app/repo && \
+            (git checkout {branch_name} || git checkout -b {branch_name})"""
+
+    def run_tests_in_sandbox(self, repo_url: str, branch_name: str, token: str, auth_mode: str = "https", private_key: str = None, repo_path: str = None, changed_files: List[str] = None, on_event: Optional[Callable[[Dict], None]] = None) -> Dict:
         """
         Runs tests in a Docker container using Universal Runner.
+        With SANDBOX_SOURCE=local and a repo_path, the host clone is copied into
+        the container; otherwise the branch is cloned from the remote.
+        If changed_files is given, the runner only runs the tests affected by them.
+        Runner events (stage, output, error, finished) are passed to on_event as they arrive.
+
+        The run is admitted by the scheduler (waiting up to SANDBOX_QUEUE_TIMEOUT
+        while the host is at capacity) and, once admitted, must finish within
+        SANDBOX_TIMEOUT; otherwise its sandboxes are killed and the status is TIMEOUT. A runner killed by the
+        OOM killer reports KILLED.
         """
         if not self.client:
             return {"status": "ERROR", "logs": "Docker not available."}
 
-        # Check for image
+        # Image check / build happens at startup; wait for it if still in progress
+        if not self._started:
+            self.startup()
+        self._ready.wait()
+        if not self._image_ok:
+            return {"status": "ERROR", "logs": "Failed to build sandbox image."}
+
+        wanted = Config.TEST_SHARDS if not changed_files and Config.TEST_SHARDS > 1 else 1
+        if self.scheduler:
+            with span("sandbox_queue"):
+                slots = self.scheduler.acquire(wanted, timeout=Config.SANDBOX_QUEUE_TIMEOUT if Config.SANDBOX_QUEUE_TIMEOUT > 0 else None)
+            if slots == 0:
+                return {"status": "TIMEOUT", "errors": [], "raw_logs": f"No sandbox capacity within {Config.SANDBOX_QUEUE_TIMEOUT}s ({self.scheduler.stats()})."}
+        else:
+            slots = wanted
+
+        # Time spent queued is not charged to the run
+        deadline = time.time() + Config.SANDBOX_TIMEOUT if Config.SANDBOX_TIMEOUT > 0 else None
+
         try:
-            self.client.images.get("rift-sandbox:latest")
-        except docker.errors.ImageNotFound:
-            if not self.build_sandbox_image():
-                return {"status": "ERROR", "logs": "Failed to build sandbox image."}
+            return self._run_tests(repo_url, branch_name, token, auth_mode, private_key, repo_path, changed_files, on_event, slots, deadline)
+        finally:
+            if self.scheduler:
+                self.scheduler.release(slots)
+
+    def _run_tests(self, repo_url: str, branch_name: str, token: str, auth_mode: str, private_key: Optional[str], repo_path: Optional[str], changed_files: Optional[List[str]], on_event: Optional[Callable[[Dict], None]], shards: int, deadline: Optional[float]) -> Dict:
+        use_local = Config.SANDBOX_SOURCE == "local" and repo_path and os.path.isdir(repo_path)
 
         container = None
         try:
-            clean_url = repo_url.replace("https://", "")
-            
-            # 1. Prepare Clone Command
-            clone_cmd = ""
-            pre_config = ""
-            
-            if auth_mode == "https":
-                if token:
-                     auth_url = f"https://{token}@{clean_url}"
+            # 1. Prepare Source Checkout
+            if use_local:
+                checkout = "cd /app/repo"
+            else:
+                checkout = self._remote_checkout_script(repo_url, branch_name, token, auth_mode, private_key)
+                if checkout is None:
+                    return {"status": "ERROR", "logs": "Private Key missing for SSH mode."}
+
+            # 2. Pick the container: a post-install snapshot of this repo if one exists
+            phase = "all"
+            snapshot_tag = None
+            if use_local and self.snapshots:
+                snapshot_tag = self.snapshots.tag_for(repo_url, repo_path)
+                snapshot_image = self.snapshots.lookup(snapshot_tag)
+                if snapshot_image:
+                    container = self._claim_container(snapshot_image)
+                    phase = "test"
                 else:
-                     auth_url = repo_url
-                clone_cmd = f"git clone {auth_url} /app/repo"
-                
-            elif auth_mode == "ssh":
-                if not private_key:
-                     return {"status": "ERROR", "logs": "Private Key missing for SSH mode."}
-                     
-                b64_key = base64.b64encode(private_key.encode('utf-8')).decode('utf-8')
-                
-                pre_config = f"""
-                mkdir -p /root/.ssh && \
-                echo '{b64_key}' | base64 -d > /root/.ssh/id_rsa && \
-                chmod 600 /root/.ssh/id_rsa && \
-                ssh-keyscan github.com >> /root/.ssh/known_hosts && \
-                """
-                
-                ssh_url = repo_url
-                if "https://" in repo_url:
-                     ssh_url = repo_url.replace("https://github.com/", "git@github.com:")
-                
-                clone_cmd = f"git clone {ssh_url} /app/repo"
-
-            # 2. Inject Universal Runner Script
-            # Read script content
-            runner_path = os.path.join(os.path.dirname(__file__), "scripts", "universal_runner.py")
-            with open(runner_path, "r") as f:
-                runner_content = f.read()
-            
-            b64_runner = base64.b64encode(runner_content.encode('utf-8')).decode('utf-8')
+                    container = self._claim_container()
+                    phase = "install"
+            else:
+                container = self._claim_container()
 
-            # 3. Execution Script
-            script = f"""
-            {pre_config}
-            {clone_cmd} && \
-            cd /app/repo && \
-            git checkout {branch_name} || git checkout -b {branch_name} && \
-            echo '{b64_runner}' | base64 -d > /app/universal_runner.py && \
-            python3 /app/universal_runner.py && \
-            rm -rf /root/.ssh/id_rsa
-            """
-            
-            container = self.client.containers.run(
-                "rift-sandbox:latest",
-                command=f"bash -c '{script}'",
-                detach=True,
-                remove=False
-            )
-            
-            exit_code = container.wait()
-            logs = container.logs().decode("utf-8")
-            container.remove()
+            if use_local:
+                self._copy_workspace(container, repo_path)
 
-            # 4. Parse JSON Output
-            # The runner outputs JSON at the end, but logs might contain other stuff.
-            # Look for the last line or JSON block.
-            try:
-                # Find start of JSON
-                json_start = logs.rfind('{')
-                if json_start != -1:
-                    json_str = logs[json_start:]
-                    result = json.loads(json_str)
-                    
-                    # Add raw logs if missing or just keep full logs
-                    if "raw_logs" not in result or not result["raw_logs"]:
-                         result["raw_logs"] = logs
-                    
-                    # Mask Token
-                    if token:
-                        result["raw_logs"] = result["raw_logs"].replace(token, "***TOKEN***")
-                        
+            # 3. Install once and snapshot, then run the tests
+            install_logs = ""
+            if phase == "install":
+                result = self._exec_runner(container, checkout, "install", token, on_event=on_event, deadline=deadline)
+                if result.get("status") != "INSTALLED":
+                    self._release_container(container)
+                    container = None
                     return result
-            except:
-                pass
-            
-            return {"status": "ERROR", "logs": logs}
+                with span("snapshot_commit"):
+                    self.snapshots.commit(container, repo_url, snapshot_tag)
+                install_logs = result.get("raw_logs", "")
+                phase = "test"
+
+            if shards <= 1:
+                env = {"RIFT_CHANGED_FILES": "\n".join(changed_files)} if changed_files else None
+                result = self._exec_runner(container, checkout, phase, token, env, on_event, deadline)
+                self._release_container(container)
+                container = None
+            else:
+                # Full suite: split across parallel containers
+                snapshot_image = self.snapshots.lookup(snapshot_tag) if snapshot_tag else None
+                shard_container, container = container, None
+                result = self._run_shards(shard_container, shards, checkout, phase, token, repo_url,
+                                          repo_path if use_local else None, snapshot_image, on_event, deadline)
+
+            timings = get_test_timings()
+            if timings and result.get("timings"):
+                timings.record(repo_url, result["timings"])
+            result.pop("timings", None)
+
+            if install_logs and "raw_logs" in result:
+                result["raw_logs"] = install_logs + result["raw_logs"]
+            return result
             
         except Exception as e:
             if container:
-                try: container.kill(); container.remove()
-                except: pass
+                self._release_container(container)
             return {"status": "ERROR", "logs": str(e)}
+
+    def _run_shards(self, container, shards: int, checkout: str, phase: str, token: str, repo_url: str, repo_path: Optional[str], snapshot_image: Optional[str], on_event: Optional[Callable[[Dict], None]] = None, deadline: Optional[float] = None) -> Dict:
+        """
+        Runs the full suite split into `shards` parts, each in its own container,
+        in parallel. The runner in every container computes the same split from
+        the recorded test durations and runs its part. `container` (already
+        prepared) takes shard 0; the others start from the post-install snapshot
+        when there is one, otherwise they install for themselves.
+        All containers are released here.
+        """
+        store = get_test_timings()
+        timings = json.dumps(store.load(repo_url) if store else {})
+
+        def run_shard(index: int) -> Dict:
+            shard_container = container if index == 0 else None
+            try:
+                shard_phase = phase
+                if shard_container is None:
+                    if snapshot_image:
+                        shard_container = self._claim_container(snapshot_image)
+                        shard_phase = "test"
+                    else:
+                        shard_container = self._claim_container()
+                        shard_phase = "all"
+                    if repo_path:
+                        self._copy_workspace(shard_container, repo_path)
+                self._put_file(shard_container, SHARD_TIMINGS_PATH, timings)
+                env = {"RIFT_SHARD": f"{index}/{shards}", "RIFT_SHARD_TIMINGS_FILE": SHARD_TIMINGS_PATH}
+                shard_events = (lambda event: on_event(dict(event, shard=index))) if on_event else None
+                return self._exec_runner(shard_container, checkout, shard_phase, token, env, shard_events, deadline)
+            except Exception as e:
+                return {"status": "ERROR", "logs": str(e)}
+            finally:
+                if shard_container is not None:
+                    self._release_container(shard_container)
+
+        with ThreadPoolExecutor(max_workers=shards) as pool:
+            results = list(pool.map(in_context(run_shard), range(shards)))
+        return self._merge_shards(results)
+
+    @staticmethod
+    def _merge_shards(results: List[Dict]) -> Dict:
+        """
+        Combines shard results into the single result a test run returns.
+        """
+        def worst(statuses):
+            return next((s for s in STATUS_RANK if s in statuses), "PASSED")
+
+        status = worst([r.get("status") for r in results])
+        merged = {
+            "status": status,
+            "language": next((r["language"] for r in results if r.get("language")), "Unknown"),
+            "exit_code": next((r.get("exit_code") or 1 for r in results if r.get("status") != "PASSED"), 0),
+            "errors": [],
+            "timings": {},
+            "test_selection": {"mode": "shard", "shards": len(results), "targets": []},
+            "shards": []
+        }
+
+        seen = set()
+        subprojects = {}
+        for index, res in enumerate(results):
+            for err in res.get("errors", []):
+                key = (err.get("file"), err.get("line"), (err.get("message") or "")[:200])
+                if key not in seen:
+                    seen.add(key)
+                    merged["errors"].append(err)
+            merged["timings"].update(res.get("timings") or {})
+            targets = (res.get("test_selection") or {}).get("targets", [])
+            merged["test_selection"]["targets"].extend(targets)
+            merged["shards"].append({
+                "index": index,
+                "status": res.get("status"),
+                "exit_code": res.get("exit_code"),
+                "errors": len(res.get("errors", [])),
+                "targets": len(targets)
+            })
+            for sub in res.get("subprojects", []):
+                entry = subprojects.setdefault(sub["root"], dict(sub, statuses=[], errors=0))
+                entry["statuses"].append(sub.get("status"))
+                entry["errors"] += sub.get("errors", 0)
+
+        if status == "PASSED":
+            merged["errors"] = []
+        if subprojects:
+            merged["subprojects"] = [
+                {"root": root, "language": sub["language"], "status": worst(sub["statuses"]), "errors": sub["errors"]}
+                for root, sub in subprojects.items()
+            ]
+
+        # Equal share of the log tail per shard; failing shards last so they survive trimming
+        share = MERGED_LOG_LIMIT // max(1, len(results))
+        parts = []
+        for index in sorted(range(len(results)), key=lambda i: results[i].get("status") != "PASSED"):
+            res = results[index]
+            logs = res.get("raw_logs") or res.get("logs") or ""
+            parts.append(f"\n===== shard {index + 1}/{len(results)}: {res.get('status')} =====\n{logs[-share:]}")
+        merged["raw_logs"] = "".join(parts)
+        return merged
+
+    @staticmethod
+    def _put_file(container, path: str, content: str):
+        data = content.encode("utf-8")
+        info = tarfile.TarInfo(os.path.basename(path))
+        info.size = len(data)
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode="w") as tar:
+            tar.addfile(info, io.BytesIO(data))
+        container.put_archive(os.path.dirname(path), archive.getvalue())
+
+    def _exec_runner(self, container, checkout: str, phase: str, token: str, env: Dict = None, on_event: Optional[Callable[[Dict], None]] = None, deadline: Optional[float] = None) -> Dict:
+        """
+        Injects the Universal Runner into the container, executes one phase and streams its events.
+        The container is killed when `deadline` passes (status TIMEOUT).
+        """
+        # Inject Universal Runner Script
+        # Read script content
+        runner_path = os.path.join(os.path.dirname(__file__), "scripts", "universal_runner.py")
+        with open(runner_path, "r") as f:
+            runner_content = f.read()
+        
+        b64_runner = base64.b64encode(runner_content.encode('utf-8')).decode('utf-8')
+
+        # Execution Script; exits with the runner's status so a SIGKILL (137) is visible to exec_inspect
+        script = f"""
+        {checkout} && \
+        echo '{b64_runner}' | base64 -d > /app/universal_runner.py && \
+        python3 /app/universal_runner.py --phase {phase}
+        code=$?
+        rm -rf /root/.ssh/id_rsa
+        exit $code
+        """
+
+        env = {"RIFT_SUBPROJECT_CONCURRENCY": str(Config.SUBPROJECT_CONCURRENCY), **(env or {})}
+        exec_id = self.client.api.exec_create(container.id, ["bash", "-c", script], environment=env)["Id"]
+        stream = self.client.api.exec_start(exec_id, stream=True)
+
+        # Wall-clock deadline: killing the container ends the stream
+        timed_out = threading.Event()
+        watchdog = None
+        if deadline is not None:
+            def expire():
+                timed_out.set()
+                try:
+                    container.kill()
+                except Exception:
+                    pass
+            watchdog = threading.Timer(max(0.0, deadline - time.time()), expire)
+            watchdog.daemon = True
+            watchdog.start()
+        try:
+            result = self._consume_events(stream, token, on_event)
+        finally:
+            if watchdog:
+                watchdog.cancel()
+
+        if timed_out.is_set():
+            logs = result.get("raw_logs") or result.get("logs") or ""
+            return {"status": "TIMEOUT", "exit_code": 124, "errors": [],
+                    "raw_logs": f"{logs}\nSandbox killed: deadline of {Config.SANDBOX_TIMEOUT}s exceeded."}
+        if result.get("status") == "ERROR":
+            # No result from the runner: find out whether it was killed
+            try:
+                exit_code = self.client.api.exec_inspect(exec_id).get("ExitCode")
+            except Exception:
+                exit_code = None
+            if exit_code in KILLED_EXIT_CODES:
+                return {"status": "KILLED", "exit_code": exit_code, "errors": [],
+                        "raw_logs": f"{result.get('logs', '')}\nSandbox runner was killed (out of memory or SIGKILL)."}
+        return result
+
+    def _consume_events(self, stream, token: str, on_event: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """
+        Reads the runner's NDJSON events as they arrive. Every event is passed to
+        on_event; the `finished` event carries the result. Non-event output (git,
+        shell errors) is kept as a bounded tail for error reporting.
+        Install and test stages (per subproject) are recorded as spans.
+        """
+        def mask(text: str) -> str:
+            return text.replace(token, "***TOKEN***") if token else text
+
+        result = None
+        other_output = deque(maxlen=200)
+        pending = b""
+        stages = {}  # subproject -> (stage, start)
+
+        def end_stage(subproject, now: float):
+            stage, started = stages.pop(subproject, (None, None))
+            if stage in STAGE_SPANS:
+                record_span(STAGE_SPANS[stage], started, now, **({"subproject": subproject} if subproject else {}))
+
+        def handle(raw: bytes):
+            nonlocal result
+            line = raw.decode("utf-8", errors="replace").rstrip("\r")
+            if not line:
+                return
+            event = None
+            if line.startswith('{"event"'):
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    event = None
+            if event is None:
+                other_output.append(mask(line))
+                return
+
+            if event.get("event") == "stage":
+                now = time.perf_counter()
+                end_stage(event.get("subproject"), now)
+                stages[event.get("subproject")] = (event.get("stage"), now)
+            if event.get("event") == "finished":
+                result = event.get("result", {})
+            if on_event:
+                try:
+                    on_event(event)
+                except Exception as e:
+                    print(f"Sandbox event handler error: {e}")
+
+        for chunk in stream:
+            pending += chunk
+            *lines, pending = pending.split(b"\n")
+            for raw in lines:
+                handle(raw)
+        if pending:
+            handle(pending)
+        now = time.perf_counter()
+        for subproject in list(stages):
+            end_stage(subproject, now)
+
+        if result is None:
+            return {"status": "ERROR", "logs": "\n".join(other_output)}
+
+        # Add raw logs if missing
+        if not result.get("raw_logs"):
+            result["raw_logs"] = "\n".join(other_output)
+        result["raw_logs"] = mask(result["raw_logs"])
+        return result
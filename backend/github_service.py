@@ -6,6 +6,8 @@ import tempfile
 import stat
 from git import GitCommandError
 from backend.utils.file_utils import FileUtils
+from backend.services.repo_mirror import get_repo_mirror
+from backend.services.tracing import span
 
 class GithubService:
     @staticmethod
@@ -67,6 +69,25 @@ class GithubService:
             
             FileUtils.safe_delete_folder(clone_path)
             
+            # Repeat runs: refresh the local mirror incrementally and clone from it
+            mirror = get_repo_mirror()
+            if mirror:
+                try:
+                    mirror_path = mirror.update(repo_url, auth_url, env)
+                    mirror.clone(mirror_path, clone_path, auth_url, env)
+                    return {
+                        "status": "success",
+                        "message": "Repository cloned from local mirror",
+                        "repo_path": clone_path,
+                        "workspace": workspace_path
+                    }
+                except Exception as e:
+                    error_msg = str(e)
+                    if token:
+                        error_msg = error_msg.replace(token, "***TOKEN***")
+                    print(f"Mirror clone failed, cloning directly: {error_msg}")
+                    FileUtils.safe_delete_folder(clone_path)
+
             try:
                 # Pass env for SSH and enable longpaths
                 git.Repo.clone_from(auth_url, clone_path, env=env, config='core.longpaths=true', allow_unsafe_options=True)
@@ -122,7 +143,11 @@ class GithubService:
             return branch_name
 
     @staticmethod
-    def commit_and_push(repo_path: str, message: str, branch_name: str, token: str, auth_mode: str = "https", private_key: str = None) -> dict:
+    def commit_and_push(repo_path: str, message: str, branch_name: str, token: str, auth_mode: str = "https", private_key: str = None, push: bool = True) -> dict:
+        """
+        Commits all changes (if a message is given) and pushes HEAD to `branch_name`.
+        With push=False the commit stays local (deferred push mode).
+        """
         ssh_key_path = None
         try:
             repo = git.Repo(repo_path)
@@ -142,31 +167,35 @@ class GithubService:
                         pass 
                     else:
                         raise e
+
+            if not push:
+                return {"status": "success"}
             
             # Prepare Push
-            if auth_mode == "https":
-                origin = repo.remotes.origin
-                url = origin.url
-                if "https://" in url and "@" not in url:
-                    clean = url.replace("https://", "")
-                    auth_url = f"https://{token}@{clean}"
-                    repo.git.push(auth_url, f"HEAD:{branch_name}")
-                else:
-                    repo.git.push('origin', f"HEAD:{branch_name}")
+            with span("git_push", auth_mode=auth_mode):
+                if auth_mode == "https":
+                    origin = repo.remotes.origin
+                    url = origin.url
+                    if "https://" in url and "@" not in url:
+                        clean = url.replace("https://", "")
+                        auth_url = f"https://{token}@{clean}"
+                        repo.git.push(auth_url, f"HEAD:{branch_name}")
+                    else:
+                        repo.git.push('origin', f"HEAD:{branch_name}")
                     
-            elif auth_mode == "ssh":
-                if not private_key:
-                     return {"status": "error", "message": "Private Key required for SSH push"}
+                elif auth_mode == "ssh":
+                    if not private_key:
+                         return {"status": "error", "message": "Private Key required for SSH push"}
                 
-                ssh_key_path = GithubService._create_ssh_key_file(private_key)
-                ssh_cmd = f"ssh -i {ssh_key_path} -o UserKnownHostsFile=/dev/null -o StrictHostKeyChecking=no"
+                    ssh_key_path = GithubService._create_ssh_key_file(private_key)
+                    ssh_cmd = f"ssh -i {ssh_key_path} -o UserKnownHostsFile=/dev/null -o StrictHostKeyChecking=no"
                 
-                # We need to ensure remote URL is SSH format if it wasn't already?
-                # If we cloned via SSH, origin URL should be SSH.
-                # Just use `repo.git.push` with the custom SSH command ENV.
+                    # We need to ensure remote URL is SSH format if it wasn't already?
+                    # If we cloned via SSH, origin URL should be SSH.
+                    # Just use `repo.git.push` with the custom SSH command ENV.
                 
-                with repo.git.custom_environment(GIT_SSH_COMMAND=ssh_cmd):
-                    repo.git.push('origin', f"HEAD:{branch_name}")
+                    with repo.git.custom_environment(GIT_SSH_COMMAND=ssh_cmd):
+                        repo.git.push('origin', f"HEAD:{branch_name}")
                 
             return {"status": "success"}
             
@@ -182,6 +211,24 @@ class GithubService:
                 except:
                     pass
 
+    @staticmethod
+    def head_commit(repo_path: str) -> str:
+        try:
+            return git.Repo(repo_path).head.commit.hexsha
+        except Exception:
+            return ""
+
+    @staticmethod
+    def changed_files(repo_path: str, since_commit: str) -> list:
+        """
+        Files that differ between `since_commit` and the working tree (committed or not).
+        """
+        try:
+            out = git.Repo(repo_path).git.diff("--name-only", since_commit)
+            return [line for line in out.splitlines() if line.strip()]
+        except Exception:
+            return []
+
     @staticmethod
     def create_pr(repo_url: str, branch_name: str, token: str, title: str, body: str) -> dict:
         """
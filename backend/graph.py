@@ -1,14 +1,32 @@
 from langgraph.graph import StateGraph, END
-from typing import TypedDict, List, Dict, Any
+from typing import TypedDict, List, Dict, Any, Optional
+from datetime import datetime
 import os
 import json
-from backend.config import Config
+import time
+import queue
+import threading
 from backend.config import Config
 from backend.utils.file_utils import FileUtils
 from backend.utils import read_file_content, write_file_content
 from backend.services.git_service import GitService
 from backend.services.repo_scanner import RepoScanner
-from backend.agents import error_analyzer, fix_generator, git_manager
+from backend.agents import error_analyzer, git_manager
+from backend.agents.fix_generator_agent import FixGeneratorAgent
+
+_fix_agent = None
+_fix_agent_lock = threading.Lock()
+
+def get_fix_agent() -> FixGeneratorAgent:
+    """
+    Fix generator shared by healing runs. It owns the LLM cache and patch mode;
+    created on first use so importing this module needs no API key.
+    """
+    global _fix_agent
+    with _fix_agent_lock:
+        if _fix_agent is None:
+            _fix_agent = FixGeneratorAgent()
+        return _fix_agent
 
 # --- States ---
 class AnalysisState(TypedDict):
@@ -18,6 +36,8 @@ class AnalysisState(TypedDict):
     workspace: str
     repo_path: str
     scan_results: List[Dict] # From RepoScanner
+    last_scanned_commit: str # HEAD when scan_results were taken; enables incremental rescans
+    rescan_files: Optional[List[str]] # Files to re-analyze (None = all)
     analysis_report: List[Dict] # From ErrorAnalyzer
     logs: List[str]
 
@@ -33,6 +53,11 @@ class HealingState(TypedDict):
 # --- Nodes for Analysis ---
 
 def secure_clone_node(state: AnalysisState):
+    # Re-analysis of a previous state (after fixes were applied): keep the clone, scan_node
+    # then only rescans files changed since `last_scanned_commit` and their direct importers
+    if state.get("repo_path") and os.path.isdir(state["repo_path"]):
+        return state
+
     # 1. Create Workspace
     if not state.get("workspace"):
         state["workspace"] = FileUtils.create_workspace()
@@ -56,62 +81,136 @@ def secure_clone_node(state: AnalysisState):
 def scan_node(state: AnalysisState):
     if not state.get("repo_path"):
         return state
-        
-    state["logs"].append("Scanning repository...")
-    files = RepoScanner.scan_repository(state["repo_path"])
-    state["scan_results"] = files
-    state["logs"].append(f"Scanned {len(files)} python files.")
+
+    head = RepoScanner.head_commit(state["repo_path"])
+    last = state.get("last_scanned_commit")
+    changed = RepoScanner.changed_since(state["repo_path"], last) if last and state.get("scan_results") else None
+
+    if changed is None:
+        state["logs"].append("Scanning repository...")
+        files = RepoScanner.scan_repository(state["repo_path"])
+        state["scan_results"] = files
+        state["rescan_files"] = None
+        state["logs"].append(f"Scanned {len(files)} python files.")
+    else:
+        # Incremental: reparse only what changed since the last scan, keep the other records
+        records = {f["file"]: f for f in state["scan_results"]}
+        for path in changed:
+            records.pop(path, None)
+        for f in RepoScanner.scan_repository(state["repo_path"], only=changed):
+            records[f["file"]] = f
+        files = [records[path] for path in sorted(records)]
+        importers = RepoScanner.direct_importers(files, changed)
+        state["scan_results"] = files
+        state["rescan_files"] = sorted((set(changed) | set(importers)) & set(records))
+        state["logs"].append(
+            f"Incremental scan since {last[:8]}: {len(changed)} changed file(s), {len(importers)} direct importer(s); "
+            f"{len(state['rescan_files'])} of {len(files)} python files to re-analyze."
+        )
+
+    state["last_scanned_commit"] = head
     return state
 
+def _write_results(path: str, results: Dict):
+    # Write to a temp file and swap, so readers never see a half-written results.json
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    os.replace(tmp_path, path)
+
 def analyze_node(state: AnalysisState):
+    """
+    Streams scanned files through a bounded queue to a pool of LLM workers
+    sharing one client. results.json is rewritten as findings arrive.
+    """
+    scan_results = state["scan_results"]
     report = []
-    # Identify files that passed scanning but might have issues, or just strictly files with syntax errors first?
-    # The prompt says: "Detect: Syntax, Lint... Send to LLM".
-    # We will send ALL files found by scanner to LLM to be thorough, 
-    # OR just the ones with syntax errors if we want to be fast.
-    # Let's send ALL for now, but limit to small number if many?
-    # For safety, let's limit to top 20 files to avoid hitting limits in this demo.
-    
-    files_to_analyze = state["scan_results"][:20] 
-    
-    for file_info in files_to_analyze:
-        # If syntax error, explicitly mark it
-        if file_info.get("has_syntax_error"):
-             analysis = {
-                 "file": file_info["file"],
-                 "line": 0, # We might parse from error_detail
-                 "type": "SYNTAX",
-                 "description": file_info["error_detail"],
-                 "suggested_fix": "Fix syntax error"
-             }
-             report.append(analysis)
-             continue
-
-        # Else, ask LLM
-        analysis = error_analyzer.analyze_code_file(file_info)
-        if analysis and isinstance(analysis, dict):
-            # Ensure keys exist
-            if "type" in analysis:
+    rescan = state.get("rescan_files")
+    if rescan is not None:
+        # Incremental: re-analyze the affected files, reuse findings for the rest
+        rescan = set(rescan)
+        present = {f["file"] for f in scan_results}
+        report = [e for e in state.get("analysis_report") or [] if e.get("file") not in rescan and e.get("file") in present]
+        scan_results = [f for f in scan_results if f["file"] in rescan]
+    reused = len(report)
+    if Config.ANALYSIS_MAX_FILES > 0:
+        scan_results = scan_results[:Config.ANALYSIS_MAX_FILES]
+
+    results_path = os.path.join(state["workspace"], "results.json")
+    work = queue.Queue(maxsize=Config.ANALYSIS_QUEUE_SIZE)
+    progress = {"analyzed": 0, "last_write": 0.0, "cache_hits": 0}
+    lock = threading.Lock()
+    done = object()
+
+    def record(analysis: Dict = None, final: bool = False):
+        with lock:
+            if analysis is not None:
                 report.append(analysis)
-    
+            progress["analyzed"] += 0 if final else 1
+            now = time.time()
+            if not final and now - progress["last_write"] < Config.ANALYSIS_WRITE_INTERVAL:
+                return
+            progress["last_write"] = now
+            _write_results(results_path, {
+                "timestamp": datetime.now().isoformat(),
+                "status": "complete" if final else "in_progress",
+                "total_files": len(scan_results),
+                "analyzed_files": progress["analyzed"],
+                "incremental": rescan is not None,
+                "reused_errors": reused,
+                "total_errors": len(report),
+                "errors": list(report)
+            })
+
+    def worker():
+        while True:
+            file_info = work.get()
+            if file_info is done:
+                return
+            cache_info = {}
+            try:
+                analysis = error_analyzer.analyze_code_file(file_info, cache_info=cache_info)
+            except Exception as e:
+                print(f"Analysis failed for {file_info.get('file')}: {e}")
+                analysis = None
+            if cache_info.get("hit"):
+                with lock:
+                    progress["cache_hits"] += 1
+            # Ensure keys exist
+            if analysis and isinstance(analysis, dict) and "type" in analysis:
+                record(analysis)
+            else:
+                record()
+
+    workers = [threading.Thread(target=worker, daemon=True) for _ in range(Config.ANALYSIS_CONCURRENCY)]
+    for t in workers:
+        t.start()
+
+    for file_info in scan_results:
+        # Syntax errors are known without asking the LLM
+        if file_info.get("has_syntax_error"):
+            record({
+                "file": file_info["file"],
+                "line": 0, # We might parse from error_detail
+                "type": "SYNTAX",
+                "description": file_info["error_detail"],
+                "suggested_fix": "Fix syntax error"
+            })
+            continue
+        work.put(file_info)  # Blocks while the queue is full
+
+    for _ in workers:
+        work.put(done)
+    for t in workers:
+        t.join()
+
+    record(final=True)
     state["analysis_report"] = report
-    state["logs"].append(f"Analysis complete. Found {len(report)} issues.")
-    
-    # Save results.json
-    results = {
-        "timestamp": "now", # Placeholder
-        "total_files": len(state["scan_results"]),
-        "total_errors": len(report),
-        "errors": report
-    }
-    
-    # We save this in the workspace usually, or a global results path?
-    # The requirement says "Create results.json".
-    # We can save it in the workspace root.
-    results_path = os.path.join(state["workspace"], "results.json")
-    with open(results_path, 'w') as f:
-        json.dump(results, f, indent=2)
-        
+    state["logs"].append(f"Analysis complete. Analyzed {len(scan_results)} files with {Config.ANALYSIS_CONCURRENCY} workers. Found {len(report)} issues.")
+    if rescan is not None:
+        state["logs"].append(f"Reused {reused} finding(s) from unchanged files.")
+    if progress["cache_hits"]:
+        state["logs"].append(f"LLM cache hits: {progress['cache_hits']} of {len(scan_results)} files reused previous analyses.")
     return state
 
 # --- Nodes for Healing ---
@@ -124,7 +223,14 @@ def apply_fix_node(state: HealingState):
     
     if os.path.exists(file_path):
         content = read_file_content(file_path)
-        fixed_content = fix_generator.generate_fix(content, error)
+        cache_info = {}
+        fixed_content = get_fix_agent().generate_scoped_fix(error["file"], content, error, cache_info=cache_info)
+        if cache_info.get("hit"):
+            state["logs"].append(f"LLM cache hit: reused a previous fix for {error['file']}.")
+        if cache_info.get("patch_error"):
+            state["logs"].append(f"Patch did not apply ({cache_info['patch_error']}); regenerated the whole file.")
+        elif cache_info.get("fix_mode") == "patch":
+            state["logs"].append("Fix generated as a patch.")
         
         if fixed_content != content:
             write_file_content(file_path, fixed_content)
@@ -169,7 +275,8 @@ def commit_push_node(state: HealingState):
 
 # --- Workflows ---
 
-# Analysis Workflow
+# Analysis Workflow: invoked again with the final state of an earlier analysis, it reuses the
+# clone and re-analyzes only what changed since then
 analysis_workflow = StateGraph(AnalysisState)
 analysis_workflow.add_node("secure_clone", secure_clone_node)
 analysis_workflow.add_node("scan", scan_node)
@@ -1,14 +1,19 @@
 
 from langgraph.graph import StateGraph, END
-from typing import TypedDict, List, Dict
+from langchain_core.runnables import RunnableConfig
+from typing import TypedDict, List, Dict, Optional
 import os
 import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from backend.config import Config
 from backend.utils.file_utils import FileUtils, read_file_content
 from backend.github_service import GithubService
 from backend.agents.test_runner_agent import TestRunnerAgent
 from backend.agents.bug_analyzer_agent import BugAnalyzerAgent
 from backend.agents.fix_generator_agent import FixGeneratorAgent
+from backend.services.tracing import traced_node, in_context
 
 # State Definition
 class AgentState(TypedDict):
@@ -27,7 +32,11 @@ class AgentState(TypedDict):
     logs: List[str] 
     fixes_applied: List[Dict] 
     current_error: Dict 
+    current_errors: List[Dict] # every structured error from the last test run
     language_detected: str # NEW FIELD
+    last_tested_commit: str # HEAD at the previous test run, for change-aware test selection
+    push_failed: bool # deferred push before the PR did not go through
+    push_skipped: bool # deferred mode with nothing committed: the branch never reached the remote
 
 # Agents
 github_service = GithubService()
@@ -37,6 +46,10 @@ fix_generator = FixGeneratorAgent()
 
 # Nodes
 
+def _deferred_push() -> bool:
+    # Remote sandboxes clone the pushed branch, so they need a push per iteration
+    return Config.PUSH_MODE == "deferred" and Config.SANDBOX_SOURCE == "local"
+
 def clone_node(state: AgentState):
     workspace = FileUtils.create_workspace()
     state["workspace"] = workspace
@@ -62,6 +75,10 @@ def clone_node(state: AgentState):
     state["branch_name"] = branch
     state["logs"].append(f"Created branch: {branch}")
     
+    if _deferred_push():
+        # The sandbox reads the local clone; the branch is pushed once before the PR
+        return state
+
     push_res = github_service.commit_and_push(
         state["repo_path"], 
         None, 
@@ -78,21 +95,79 @@ def clone_node(state: AgentState):
 
     return state
 
-def test_node(state: AgentState):
-    state["logs"].append(f"Running Universal Tests (Iteration {state['iteration'] + 1}/{state['max_iterations']})...")
-    
-    res = test_runner.run_tests(
+def _sandbox_event_logger(state: AgentState, config: Optional[RunnableConfig]):
+    """
+    Turns streamed sandbox events into log lines. With a `progress` callback in the
+    run config the lines go straight to the run's log store (live on the dashboard);
+    otherwise they are appended to the state logs.
+    """
+    progress = (config or {}).get("configurable", {}).get("progress")
+
+    def on_event(event: Dict):
+        kind = event.get("event")
+        if kind == "stage":
+            line = f"Sandbox stage: {event.get('stage')}"
+            if event.get("language"):
+                line += f" ({event['language']})"
+            if event.get("subproject"):
+                line += f" [{event['subproject']}]"
+            if event.get("shard") is not None:
+                line += f" [shard {event['shard'] + 1}]"
+        elif kind == "error":
+            err = event.get("error", {})
+            line = f"Sandbox detected error in {err.get('file')} line {err.get('line')}"
+        else:
+            return
+        if progress:
+            progress(line)
+        else:
+            state["logs"].append(line)
+
+    return on_event
+
+def _run_sandbox_tests(state: AgentState, changed_files: List[str] = None, config: Optional[RunnableConfig] = None) -> Dict:
+    return test_runner.run_tests(
         state["repo_url"], 
         state["branch_name"], 
         state.get("token"),
         auth_mode=state.get("auth_mode", "https"),
-        private_key=state.get("private_key")
+        private_key=state.get("private_key"),
+        repo_path=state.get("repo_path"),
+        changed_files=changed_files,
+        on_event=_sandbox_event_logger(state, config)
     )
+
+def test_node(state: AgentState, config: RunnableConfig = None):
+    state["logs"].append(f"Running Universal Tests (Iteration {state['iteration'] + 1}/{state['max_iterations']})...")
+    
+    # Change-aware selection: only tests affected by files changed since the last run
+    changed_files = None
+    if Config.TEST_SELECTION == "changed" and state.get("last_tested_commit"):
+        changed_files = github_service.changed_files(state["repo_path"], state["last_tested_commit"])
+        previous_files = [e.get("file") for e in state.get("current_errors") or [state.get("current_error", {})]]
+        for previous_file in previous_files:
+            if previous_file and previous_file not in changed_files:
+                changed_files.append(previous_file)
+    state["last_tested_commit"] = github_service.head_commit(state["repo_path"])
+    
+    res = _run_sandbox_tests(state, changed_files, config)
+    
+    selection = res.get("test_selection", {})
+    if selection.get("mode") == "selected":
+        state["logs"].append(f"Ran {len(selection.get('targets', []))} affected test target(s) for {len(changed_files)} changed file(s).")
+        if res["status"] == "PASSED":
+            # Final confirmation before the PR: the full suite
+            state["logs"].append("Affected tests passed. Running full suite for confirmation...")
+            res = _run_sandbox_tests(state, config=config)
     
     # Extract language from result if present
     if "language" in res:
          state["language_detected"] = res["language"]
          state["logs"].append(f"Language Detected: {res['language']}")
+    for sub in res.get("subprojects", []):
+        state["logs"].append(f"Subproject {sub['root']} ({sub['language']}): {sub['status']}, {sub['errors']} error(s)")
+    for shard in res.get("shards", []):
+        state["logs"].append(f"Shard {shard['index'] + 1}/{len(res['shards'])}: {shard['status']}, {shard['targets']} test target(s), {shard['errors']} error(s)")
     
     state["test_status"] = res["status"]
     state["logs"].append(f"Test Result: {res['status']}")
@@ -100,100 +175,334 @@ def test_node(state: AgentState):
     if res["status"] == "FAILED":
         # Check if structured errors exist
         if "errors" in res and res["errors"]:
-             # Use the first structured error directly?
-             state["current_error"] = res["errors"][0]
-             state["current_error"]["raw_logs"] = res.get("raw_logs", "")
+             # Keep every structured error; fix_node handles them as one batch
+             state["current_errors"] = list(res["errors"])
+             state["current_error"] = dict(res["errors"][0], raw_logs=res.get("raw_logs", ""))
         else:
              # Fallback to log analysis
+             state["current_errors"] = []
              state["current_error"] = {"raw_logs": res.get("raw_logs", "")}
         
     return state
 
+def _is_located(err: Dict) -> bool:
+    return err.get("type", "UNKNOWN") != "UNKNOWN" and bool(err.get("file")) and bool(err.get("line"))
+
 def analyze_node(state: AgentState):
-    # If we already have a structured error from Universal Runner, skip LLM analysis?
-    # Or refine it with LLM?
-    # Let's refine it if type is generic.
-    
-    err = state.get("current_error", {})
-    if err.get("type", "UNKNOWN") != "UNKNOWN" and err.get("file") and err.get("line"):
-         # We have good data from Regex
-         state["logs"].append(f"Regex Detected {err.get('type')} error in {err.get('file')} line {err.get('line')}")
-         return state
+    # Structured errors from the Universal Runner (test reports / regex) are used as-is;
+    # the LLM is only asked to localize the failure when none of them is precise.
+    located = [e for e in state.get("current_errors", []) if _is_located(e)]
+    if located:
+        for err in located:
+            source = "Test report" if err.get("source") == "report" else "Regex"
+            state["logs"].append(f"{source} Detected {err.get('type')} error in {err.get('file')} line {err.get('line')}")
+        state["current_errors"] = located
+        state["current_error"] = dict(located[0], raw_logs=state.get("current_error", {}).get("raw_logs", ""))
+        return state
 
+    err = state.get("current_error", {})
     state["logs"].append("Analyzing failure logs with LLM...")
     logs = err.get("raw_logs", "")
-    analysis = bug_analyzer.analyze_logs(logs)
+    cache_info = {}
+    analysis = bug_analyzer.analyze_logs(logs, cache_info=cache_info)
+    if cache_info.get("hit"):
+        state["logs"].append("LLM cache hit: reused a previous analysis of identical logs.")
     state["current_error"].update(analysis)
+    state["current_errors"] = [state["current_error"]]
     state["logs"].append(f"LLM Detected {analysis.get('type')} error in {analysis.get('file')} line {analysis.get('line')}")
     return state
 
+def _generate_file_fix(file_rel: str, content: str, errors: List[Dict], language: str, temperature: float = None):
+    """
+    Fixes every error reported in one file (in memory). Errors are handled bottom-up
+    so the line numbers of the remaining ones stay valid after each edit.
+    Returns (fixed content, fix records, log lines).
+    """
+    logs = []
+    fixes = []
+    for err in sorted(errors, key=lambda e: int(e.get("line") or 0), reverse=True):
+        cache_info = {}
+        fixed_content = fix_generator.generate_scoped_fix(file_rel, content, err, language, cache_info=cache_info, temperature=temperature)
+        if cache_info.get("window"):
+            start, end = cache_info["window"]
+            logs.append(f"Fix context: lines {start}-{end} of {file_rel}")
+        if cache_info.get("hit"):
+            logs.append(f"LLM cache hit: reused a previous fix for {file_rel}.")
+        if cache_info.get("patch_error"):
+            logs.append(f"Patch did not apply ({cache_info['patch_error']}); regenerated the whole file.")
+        elif cache_info.get("fix_mode") == "patch":
+            logs.append("Fix generated as a patch.")
+
+        if fixed_content == content:
+            logs.append(f"LLM could not generate a fix for {file_rel} line {err.get('line', 0)}.")
+            continue
+        content = fixed_content
+        fixes.append({
+            "file": file_rel,
+            "bug_type": err.get("type", "General"),
+            "line_number": err.get("line", 0),
+            "commit_message": f"[AI-AGENT] Fix {err.get('type', 'General')} error in {file_rel} line {err.get('line', 0)}",
+            "status": "Applied" 
+        })
+    return content, fixes, logs
+
+def _fix_file(state: AgentState, file_rel: str, errors: List[Dict], language: str):
+    """
+    Returns (fix records, log lines) after writing the fixed file.
+    """
+    full_path = os.path.join(state["repo_path"], file_rel)
+    if not os.path.exists(full_path):
+        return [], [f"File {file_rel} not found in workspace."]
+
+    original = read_file_content(full_path)
+    content, fixes, logs = _generate_file_fix(file_rel, original, errors, language)
+    if content != original:
+        fix_generator.apply_fix_to_repo(state["repo_path"], file_rel, content)
+        logs.append(f"Applied {len(fixes)} fix(es) locally to {file_rel}")
+    return fixes, logs
+
+def _error_key(err: Dict) -> str:
+    # Line numbers move when code is edited; test names and messages don't
+    message = (err.get("message") or "").strip().split("\n")[0]
+    return err.get("test") or f"{err.get('file')}: {message}"
+
+def _candidate_temperatures() -> List[float]:
+    # One candidate per distinct temperature: the LLM cache keys on model@temperature and
+    # the prompt, so a repeated temperature would only replay an earlier candidate
+    temperatures = list(dict.fromkeys(float(t) for t in Config.FIX_CANDIDATE_TEMPERATURES.split(",") if t.strip())) or [0.2]
+    return temperatures[:max(1, Config.FIX_CANDIDATES)]
+
+# Sandboxes used for candidate evaluation, shared by all runs
+_candidate_slots = threading.BoundedSemaphore(max(1, Config.FIX_CANDIDATE_PARALLELISM))
+
+def _evaluate_candidate(state: AgentState, base_path: str, file_rel: str, content: str, errors: List[Dict], baseline: set, cancel: threading.Event = None) -> bool:
+    """
+    Tests a candidate in its own copy of `base_path`, the tree as it was before the
+    fix batch started. The candidate wins if none of the targeted errors remain and
+    no new failure appears.
+    Gives up (False) as soon as `cancel` is set, checked between the copy, apply and test steps.
+    """
+    cancelled = lambda: cancel is not None and cancel.is_set()
+    candidate_dir = tempfile.mkdtemp(prefix="candidate_", dir=state["workspace"])
+    try:
+        repo_copy = os.path.join(candidate_dir, "repo")
+        shutil.copytree(base_path, repo_copy, symlinks=True)
+        if cancelled():
+            return False
+        fix_generator.apply_fix_to_repo(repo_copy, file_rel, content)
+        if cancelled():
+            return False
+        res = test_runner.run_tests(
+            state["repo_url"],
+            state["branch_name"],
+            state.get("token"),
+            auth_mode=state.get("auth_mode", "https"),
+            private_key=state.get("private_key"),
+            repo_path=repo_copy,
+            changed_files=[file_rel]
+        )
+    finally:
+        shutil.rmtree(candidate_dir, ignore_errors=True)
+
+    if res.get("status") == "PASSED":
+        return True
+    if res.get("status") != "FAILED":
+        return False
+    remaining = {_error_key(e) for e in res.get("errors", [])}
+    targeted = {_error_key(e) for e in errors}
+    return bool(remaining) and not (remaining & targeted) and remaining <= baseline
+
+def _speculative_fix_file(state: AgentState, base_path: str, file_rel: str, errors: List[Dict], language: str, baseline: set):
+    """
+    Generates FIX_CANDIDATES versions of the fix at different temperatures and
+    tests them in parallel sandboxes; the first candidate to go green is applied.
+    Falls back to the first generated candidate when none passes.
+    Returns (fix records, log lines).
+    """
+    full_path = os.path.join(state["repo_path"], file_rel)
+    if not os.path.exists(full_path):
+        return [], [f"File {file_rel} not found in workspace."]
+
+    original = read_file_content(full_path)
+    temperatures = _candidate_temperatures()
+    stop = threading.Event()
+    seen = set()
+    seen_lock = threading.Lock()
+
+    def attempt(index: int, temperature: float):
+        content, fixes, logs = _generate_file_fix(file_rel, original, errors, language, temperature)
+        with seen_lock:
+            duplicate = content in seen
+            seen.add(content)
+        green = False
+        if content != original and not duplicate and not stop.is_set():
+            with _candidate_slots:
+                if not stop.is_set():
+                    green = _evaluate_candidate(state, base_path, file_rel, content, errors, baseline, cancel=stop)
+        return index, temperature, content, fixes, logs, green
+
+    pool = ThreadPoolExecutor(max_workers=len(temperatures), thread_name_prefix="rift-candidate")
+    futures = [pool.submit(in_context(attempt), i, t) for i, t in enumerate(temperatures)]
+    finished = []
+    failures = []
+    winner = None
+    try:
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                failures.append(f"Candidate failed for {file_rel}: {e}")
+                continue
+            finished.append(result)
+            if result[5]:
+                winner = result
+                stop.set()
+                break
+    finally:
+        # Losing candidates still running see `stop` at their next step and clean up in the background
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    if winner is None:
+        changed = sorted((r for r in finished if r[2] != original), key=lambda r: r[0])
+        if not changed:
+            logs = finished[0][4] if finished else []
+            return [], failures + logs + [f"No candidate produced a fix for {file_rel}."]
+        winner = changed[0]
+        note = f"None of {len(temperatures)} candidates passed the affected tests for {file_rel}; applying candidate {winner[0] + 1}."
+    else:
+        note = f"Candidate {winner[0] + 1}/{len(temperatures)} (temperature {winner[1]}) passed the affected tests for {file_rel}."
+
+    index, temperature, content, fixes, logs, green = winner
+    fix_generator.apply_fix_to_repo(state["repo_path"], file_rel, content)
+    return fixes, failures + logs + [note, f"Applied {len(fixes)} fix(es) locally to {file_rel}"]
+
 def fix_node(state: AgentState):
-    err = state["current_error"]
-    file_rel = err.get("file")
+    # Group this run's errors by file; files are fixed concurrently, errors within a file in sequence
+    groups: Dict[str, List[Dict]] = {}
+    for err in state.get("current_errors") or [state["current_error"]]:
+        file_rel = err.get("file")
+        if not file_rel or file_rel == "unknown":
+            continue
+        same_line = [e for e in groups.get(file_rel, []) if e.get("line") == err.get("line")]
+        if not same_line:
+            groups.setdefault(file_rel, []).append(err)
     
-    if not file_rel:
+    if not groups:
          state["logs"].append("Could not identify file to fix.")
          state["iteration"] += 1
          return state
 
-    full_path = os.path.join(state["repo_path"], file_rel)
-    if not os.path.exists(full_path):
-         state["logs"].append(f"File {file_rel} not found in workspace.")
-         state["iteration"] += 1
-         return state
-         
-    content = read_file_content(full_path)
-    
-    # Pass language context if available
+    if len(groups) > Config.FIX_BATCH_MAX_FILES:
+        state["logs"].append(f"{len(groups)} files have errors; fixing the first {Config.FIX_BATCH_MAX_FILES} this iteration.")
+        groups = dict(list(groups.items())[:Config.FIX_BATCH_MAX_FILES])
+
+    # Pass language context if available (errors from a polyglot repo carry their subproject's)
     context_lang = state.get("language_detected", "Unknown")
-    
-    fixed_content = fix_generator.generate_fix(content, err) # Update signature to pass lang?
-    
-    if fixed_content == content:
-        state["logs"].append("LLM could not generate a fix.")
-    else:
-        fix_generator.apply_fix_to_repo(state["repo_path"], file_rel, fixed_content)
-        
-        fix_record = {
-            "file": file_rel,
-            "bug_type": err.get("type", "General"),
-            "line_number": err.get("line", 0),
-            "commit_message": f"[AI-AGENT] Fix {err.get('type', 'General')} error in {file_rel} line {err.get('line', 0)}",
-            "status": "Applied" 
-        }
-        state["fixes_applied"].append(fix_record)
-        state["logs"].append(f"Applied fix locally to {file_rel}")
+    total = sum(len(errs) for errs in groups.values())
+    state["logs"].append(f"Fixing {total} error(s) across {len(groups)} file(s)...")
+
+    # Speculative candidates are tested on copies of the local clone
+    speculative = Config.FIX_CANDIDATES > 1 and Config.SANDBOX_SOURCE == "local"
+    baseline = {_error_key(e) for e in state.get("current_errors", [])}
+    base_dir = None
+    if speculative:
+        state["logs"].append(f"Speculative mode: {len(_candidate_temperatures())} candidates per file, {Config.FIX_CANDIDATE_PARALLELISM} evaluated in parallel.")
+        # Candidates are tested against this copy, not the live tree other files' fixes are written to
+        base_dir = tempfile.mkdtemp(prefix="fix_base_", dir=state["workspace"])
+        base_path = os.path.join(base_dir, "repo")
+        shutil.copytree(state["repo_path"], base_path, ignore=shutil.ignore_patterns(".git"), symlinks=True)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, Config.FIX_CONCURRENCY)) as pool:
+            futures = [
+                pool.submit(in_context(_speculative_fix_file), state, base_path, file_rel, errs, errs[0].get("language") or context_lang, baseline)
+                if speculative else
+                pool.submit(in_context(_fix_file), state, file_rel, errs, errs[0].get("language") or context_lang)
+                for file_rel, errs in groups.items()
+            ]
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    results.append(([], [f"Fix generation failed: {e}"]))
+    finally:
+        if base_dir:
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+    for fixes, logs in results:
+        state["logs"].extend(logs)
+        state["fixes_applied"].extend(fixes)
         
     return state
 
 def commit_node(state: AgentState):
-    if not state["fixes_applied"]:
+    # Everything fixed this iteration goes into a single commit
+    pending = [f for f in state["fixes_applied"] if f["status"] == "Applied"]
+    if not pending:
         state["iteration"] += 1
         return state
         
-    last_fix = state["fixes_applied"][-1]
-    msg = last_fix["commit_message"]
+    if len(pending) == 1:
+        msg = pending[0]["commit_message"]
+    else:
+        files = sorted({f["file"] for f in pending})
+        msg = f"[AI-AGENT] Fix {len(pending)} errors in {len(files)} file(s)\n\n" + "\n".join(f["commit_message"] for f in pending)
     
+    deferred = _deferred_push()
     res = github_service.commit_and_push(
         state["repo_path"], 
         msg, 
         state["branch_name"], 
         state.get("token"),
         auth_mode=state.get("auth_mode", "https"),
-        private_key=state.get("private_key")
+        private_key=state.get("private_key"),
+        push=not deferred
     )
     
+    status = "Fixed" if res["status"] == "success" else "Failed Commit"
+    for fix in pending:
+        fix["status"] = status
     if res["status"] == "success":
-        last_fix["status"] = "Fixed"
-        state["logs"].append("Committed and Synced changes.")
+        state["logs"].append(f"Committed {len(pending)} fix(es) locally." if deferred else f"Committed and Synced {len(pending)} fix(es).")
     else:
-        last_fix["status"] = "Failed Commit"
         state["logs"].append(f"Commit/Push failed: {res['message']}")
         
     state["iteration"] += 1
     return state
 
+def push_node(state: AgentState):
+    # Deferred mode: the only push of the run, right before the PR
+    if not _deferred_push() or not state.get("repo_path"):
+        return state
+    if not any(f["status"] == "Fixed" for f in state["fixes_applied"]):
+        state["push_skipped"] = True
+        state["logs"].append("No committed fixes; skipping push.")
+        return state
+
+    state["logs"].append(f"Pushing branch {state['branch_name']}...")
+    res = github_service.commit_and_push(
+        state["repo_path"],
+        None,
+        state["branch_name"],
+        state.get("token"),
+        auth_mode=state.get("auth_mode", "https"),
+        private_key=state.get("private_key")
+    )
+    if res["status"] == "success":
+        state["logs"].append(f"Pushed branch {state['branch_name']} to remote.")
+    else:
+        state["push_failed"] = True
+        state["logs"].append(f"Push failed: {res['message']}")
+    return state
+
 def pr_node(state: AgentState):
+    if state.get("push_failed"):
+        state["logs"].append("Skipping Pull Request: branch was not pushed.")
+        return state
+    if state.get("push_skipped"):
+        state["logs"].append("Skipping Pull Request: no fixes to propose.")
+        return state
     state["logs"].append("Creating Pull Request...")
     title = f"AI Fixes for {state['team_name']}"
     body = f"Autonomous fixes generated by RIFT Agent.\n\nStats:\n- Language: {state.get('language_detected', 'Unknown')}\n- Iterations: {state['iteration']}\n- Fixes: {len(state['fixes_applied'])}"
@@ -209,19 +518,21 @@ def pr_node(state: AgentState):
 
 # Flow Logic
 def check_retry(state: AgentState):
-    if state["test_status"] == "PASSED": return "create_pr"
-    if state["test_status"] == "ERROR": return "create_pr"
-    if state["iteration"] >= state["max_iterations"]: return "create_pr"
+    if state["test_status"] == "PASSED": return "push"
+    if state["test_status"] in ("ERROR", "TIMEOUT", "KILLED"): return "push"
+    if state["iteration"] >= state["max_iterations"]: return "push"
     return "analyze"
 
 workflow = StateGraph(AgentState)
 
-workflow.add_node("clone", clone_node)
-workflow.add_node("test", test_node)
-workflow.add_node("analyze", analyze_node)
-workflow.add_node("fix", fix_node)
-workflow.add_node("commit", commit_node)
-workflow.add_node("create_pr", pr_node)
+# Every node is timed (rift_node_duration_seconds, and a span in the run trace)
+workflow.add_node("clone", traced_node("clone", clone_node))
+workflow.add_node("test", traced_node("test", test_node))
+workflow.add_node("analyze", traced_node("analyze", analyze_node))
+workflow.add_node("fix", traced_node("fix", fix_node))
+workflow.add_node("commit", traced_node("commit", commit_node))
+workflow.add_node("push", traced_node("push", push_node))
+workflow.add_node("create_pr", traced_node("create_pr", pr_node))
 
 workflow.set_entry_point("clone")
 workflow.add_edge("clone", "test")
@@ -230,7 +541,7 @@ workflow.add_conditional_edges(
     "test",
     check_retry,
     {
-        "create_pr": "create_pr",
+        "push": "push",
         "analyze": "analyze"
     }
 )
@@ -238,6 +549,7 @@ workflow.add_conditional_edges(
 workflow.add_edge("analyze", "fix")
 workflow.add_edge("fix", "commit")
 workflow.add_edge("commit", "test")
+workflow.add_edge("push", "create_pr")
 workflow.add_edge("create_pr", END)
 
 app = workflow.compile()
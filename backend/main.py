@@ -1,12 +1,16 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, Response
 from pydantic import BaseModel
-import threading
-import time
 import json
 import os
+import threading
+import asyncio
 from datetime import datetime
-from backend.langgraph_flow import app as autonomous_app
+from backend.config import Config
+from backend.langgraph_flow import app as autonomous_app, test_runner
+from backend.run_manager import RunManager, FINISHED_STATUSES
+from backend.services import tracing
 
 app = FastAPI()
 
@@ -17,6 +21,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def start_sandbox():
+    # Image check/build can take minutes; don't block server start. Test runs wait for it.
+    threading.Thread(target=test_runner.docker_manager.startup, daemon=True).start()
+
+@app.on_event("shutdown")
+def stop_sandbox():
+    test_runner.docker_manager.shutdown()
+
 class AutonomousRunRequest(BaseModel):
     repo_url: str
     team_name: str
@@ -25,10 +38,18 @@ class AutonomousRunRequest(BaseModel):
     auth_mode: str = "https" # or "ssh"
     private_key: str = None # Required if SSH
 
-# Session State for Dashboard
-session_state = {
+# Run Manager: each submitted run gets its own state, executed on a bounded pool
+run_manager = RunManager(
+    max_workers=Config.MAX_CONCURRENT_RUNS,
+    max_retained_runs=Config.MAX_RETAINED_RUNS,
+    log_capacity=Config.RUN_LOG_BUFFER_LINES,
+    log_spill_dir=Config.RUN_LOG_DIR
+)
+
+IDLE_STATE = {
     "status": "IDLE",
     "logs": [],
+    "log_next_seq": 0,
     "repo_url": "",
     "branch_name": "",
     "total_failures": 0,
@@ -42,16 +63,15 @@ session_state = {
     "auth_mode": "https"
 }
 
-def run_autonomous_agent(req: AutonomousRunRequest):
-    global session_state
-    session_state["status"] = "RUNNING"
-    session_state["logs"] = []
-    session_state["repo_url"] = req.repo_url
-    session_state["fixes_applied"] = []
-    session_state["iteration"] = 0
-    session_state["final_status"] = "PENDING"
-    session_state["start_time"] = time.time()
-    session_state["auth_mode"] = req.auth_mode
+def run_autonomous_agent(run_id: str, req: AutonomousRunRequest):
+    # Node and step spans of this run (also exported as histograms on /metrics)
+    trace = tracing.Trace()
+    with tracing.activate(trace):
+        _run_autonomous_agent(run_id, req, trace)
+
+def _run_autonomous_agent(run_id: str, req: AutonomousRunRequest, trace: tracing.Trace):
+    start_time = trace.started_at
+    run_manager.update(run_id, status="RUNNING", start_time=start_time)
     
     initial_state = {
         "repo_url": req.repo_url,
@@ -68,29 +88,44 @@ def run_autonomous_agent(req: AutonomousRunRequest):
         "test_status": "PENDING",
         "logs": [],
         "fixes_applied": [],
-        "current_error": {}
+        "current_error": {},
+        "current_errors": [],
+        "last_tested_commit": "",
+        "push_failed": False,
+        "push_skipped": False
     }
     
     final_state = initial_state
+    logs_forwarded = 0  # Lines of the graph's log list already in the run's log store
     
     try:
         # Run LangGraph with Streaming for Live Updates
-        for event in autonomous_app.stream(initial_state):
+        # Sandbox progress lines are pushed to the run state while a node is still running
+        config = {"configurable": {"progress": lambda line: run_manager.append_log(run_id, line)}}
+        for event in autonomous_app.stream(initial_state, config=config):
             for key, value in event.items():
                 # Update local tracker of state
                 final_state.update(value)
                 
-                # Update Session State for Dashboard
+                # Update Run State for Dashboard
+                updates = {}
                 if "iteration" in value:
-                     session_state["iteration"] = value["iteration"]
+                     updates["iteration"] = value["iteration"]
                 if "logs" in value:
-                     session_state["logs"] = value["logs"]
+                     # Forward only the lines added since the previous step; the graph's
+                     # own state is never modified here (a shorter list starts over)
+                     if len(value["logs"]) < logs_forwarded:
+                          logs_forwarded = 0
+                     run_manager.append_logs(run_id, list(value["logs"][logs_forwarded:]))
+                     logs_forwarded = len(value["logs"])
                 if "fixes_applied" in value:
-                     session_state["fixes_applied"] = value["fixes_applied"]
+                     updates["fixes_applied"] = list(value["fixes_applied"])
+                if "branch_name" in value:
+                     updates["branch_name"] = value["branch_name"]
+                run_manager.update(run_id, **updates)
         
         # Calculate Stats
-        end_time = time.time()
-        duration = end_time - session_state["start_time"]
+        duration = trace.elapsed()
         minutes = int(duration // 60)
         seconds = int(duration % 60)
         time_str = f"{minutes}m {seconds}s"
@@ -105,8 +140,8 @@ def run_autonomous_agent(req: AutonomousRunRequest):
              base_score -= (commits_made - 20) * 2
         
         status = "PASSED" if final_state.get("test_status") == "PASSED" else "FAILED"
-        if final_state.get("test_status") == "ERROR":
-            status = "ERROR"
+        if final_state.get("test_status") in ("ERROR", "TIMEOUT", "KILLED"):
+            status = final_state["test_status"]
             
         # Active Error details
         active_error = None
@@ -134,19 +169,23 @@ def run_autonomous_agent(req: AutonomousRunRequest):
             "time_taken": time_str,
             "score": base_score,
             "fixes": final_state.get("fixes_applied", []),
-            "active_error": active_error
+            "active_error": active_error,
+            "trace": trace.to_dict()
         }
+        tracing.RUN_DURATION.observe(duration, status)
         
-        # Update Session State
-        session_state["branch_name"] = results["branch"]
-        session_state["total_failures"] = results["total_failures"]
-        session_state["fixes_applied"] = results["fixes"]
-        session_state["iteration"] = results["iterations_used"]
-        session_state["final_status"] = status
-        session_state["time_taken"] = time_str
-        session_state["score"] = base_score
-        session_state["logs"] = final_state.get("logs", [])
-        session_state["status"] = "COMPLETED"
+        # Update Run State
+        run_manager.update(
+            run_id,
+            branch_name=results["branch"],
+            total_failures=results["total_failures"],
+            fixes_applied=list(results["fixes"]),
+            iteration=results["iterations_used"],
+            final_status=status,
+            time_taken=time_str,
+            score=base_score,
+            status="COMPLETED"
+        )
         
         # Save results.json
         if final_state.get("workspace"):
@@ -155,24 +194,96 @@ def run_autonomous_agent(req: AutonomousRunRequest):
                  json.dump(results, f, indent=2)
                  
     except Exception as e:
-        session_state["status"] = "ERROR"
-        session_state["logs"].append(f"Critical System Error: {str(e)}")
+        tracing.RUN_DURATION.observe(trace.elapsed(), "CRASHED")
+        run_manager.update(run_id, status="ERROR")
+        run_manager.append_log(run_id, f"Critical System Error: {str(e)}")
 
 @app.get("/status")
-async def get_status():
-    return session_state
+async def get_status(since: int = None, limit: int = 500):
+    # Backwards compatible: reports the most recently submitted run
+    run_id = run_manager.latest_run_id()
+    if not run_id:
+        return IDLE_STATE
+    return run_manager.get(run_id, since, limit)
+
+@app.get("/runs")
+async def list_runs():
+    return {
+        "max_concurrent_runs": run_manager.max_workers,
+        "active": run_manager.active_count(),
+        "queued": run_manager.queued_count(),
+        "runs": run_manager.list_runs()
+    }
+
+@app.get("/runs/{run_id}/status")
+async def get_run_status(run_id: str, since: int = None, limit: int = 500):
+    state = run_manager.get(run_id, since, limit)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return state
+
+@app.get("/runs/{run_id}/events")
+async def stream_run_events(run_id: str, request: Request):
+    """
+    Server-Sent Events: a full snapshot on connect, then only deltas
+    (new log lines, changed fields, new/updated fix records) as the run progresses.
+    """
+    if run_manager.get(run_id) is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+
+    def notify():
+        loop.call_soon_threadsafe(changed.set)
+
+    async def event_stream():
+        run_manager.add_listener(run_id, notify)
+        cursor = None
+        try:
+            while True:
+                changed.clear()
+                events, cursor = run_manager.delta(run_id, cursor)
+                if cursor is None:
+                    break
+                for name, payload in events:
+                    yield f"event: {name}\ndata: {json.dumps(payload)}\n\n"
+
+                if cursor.get("has_more"):
+                    continue
+                if cursor["fields"]["status"] in FINISHED_STATUSES:
+                    yield "event: end\ndata: {}\n\n"
+                    break
+
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout=15)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+        finally:
+            run_manager.remove_listener(run_id, notify)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus scrape endpoint: duration histograms of graph nodes, steps inside
+    them (docker start, install, test execution, LLM calls, git push) and runs.
+    """
+    return Response(tracing.render_metrics(), media_type=tracing.CONTENT_TYPE)
 
 @app.post("/start-autonomous-run")
 async def start_autonomous_run(req: AutonomousRunRequest):
-    if session_state["status"] == "RUNNING":
-        raise HTTPException(status_code=400, detail="Agent is already running")
-        
-    thread = threading.Thread(target=run_autonomous_agent, args=(req,))
-    thread.start()
-    return {"message": "Autonomous Agent Started"}
+    run_id = run_manager.submit(req.repo_url, req.auth_mode, run_autonomous_agent, req)
+    return {"message": "Autonomous Agent Queued", "run_id": run_id}
 
 from backend.services.vercel_service import VercelService
-from backend.config import Config
 
 @app.get("/vercel-logs")
 async def get_vercel_logs(repo_url: str, vercel_token: str = None):
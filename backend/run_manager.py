@@ -0,0 +1,225 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from backend.services.log_store import RunLogStore
+
+# Scalar run fields pushed to live subscribers when they change
+STATE_FIELDS = ("status", "final_status", "iteration", "max_iterations", "branch_name",
+                "total_failures", "time_taken", "score", "auth_mode", "repo_url")
+FINISHED_STATUSES = ("COMPLETED", "ERROR")
+
+
+class RunManager:
+    """
+    Tracks autonomous runs by run ID and executes them on a bounded worker pool.
+    Submitting a run enqueues it; up to `max_workers` runs execute concurrently.
+    """
+
+    def __init__(self, max_workers: int, max_retained_runs: int = 50, log_capacity: int = 2000, log_spill_dir: str = "run_logs"):
+        self.max_workers = max_workers
+        self.max_retained_runs = max_retained_runs
+        self.log_capacity = log_capacity
+        self.log_spill_dir = log_spill_dir
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rift-run")
+        self._runs: "OrderedDict[str, Dict]" = OrderedDict()
+        self._listeners: Dict[str, Set[Callable[[], None]]] = {}
+        self._lock = threading.Lock()
+
+    def _new_state(self, run_id: str, repo_url: str, auth_mode: str) -> Dict:
+        return {
+            "run_id": run_id,
+            "status": "QUEUED",
+            "logs": RunLogStore(run_id, self.log_capacity, self.log_spill_dir),
+            "repo_url": repo_url,
+            "branch_name": "",
+            "total_failures": 0,
+            "fixes_applied": [],
+            "iteration": 0,
+            "max_iterations": 5,
+            "final_status": "PENDING",
+            "time_taken": "0s",
+            "score": 100,
+            "submitted_at": time.time(),
+            "start_time": 0,
+            "auth_mode": auth_mode
+        }
+
+    def submit(self, repo_url: str, auth_mode: str, target: Callable, *args) -> str:
+        """
+        Registers a new run and queues `target(run_id, *args)` on the worker pool.
+        Returns the run ID.
+        """
+        run_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._runs[run_id] = self._new_state(run_id, repo_url, auth_mode)
+            self._evict_finished()
+
+        self._executor.submit(self._execute, run_id, target, *args)
+        return run_id
+
+    def _execute(self, run_id: str, target: Callable, *args):
+        try:
+            target(run_id, *args)
+        except Exception as e:
+            self.update(run_id, status="ERROR")
+            self.append_log(run_id, f"Critical System Error: {str(e)}")
+
+    def _evict_finished(self):
+        # Drop the oldest finished runs once we hold more than the retention limit
+        if len(self._runs) <= self.max_retained_runs:
+            return
+        for run_id in list(self._runs.keys()):
+            if len(self._runs) <= self.max_retained_runs:
+                break
+            if self._runs[run_id]["status"] in FINISHED_STATUSES:
+                self._runs.pop(run_id)["logs"].delete()
+
+    def update(self, run_id: str, **fields):
+        with self._lock:
+            state = self._runs.get(run_id)
+            if state is not None:
+                state.update(fields)
+        self._notify(run_id)
+
+    def append_log(self, run_id: str, line: str):
+        self.append_logs(run_id, [line])
+
+    def append_logs(self, run_id: str, lines: List[str]):
+        with self._lock:
+            state = self._runs.get(run_id)
+        if state is None or not lines:
+            return
+        state["logs"].extend(lines)
+        self._notify(run_id)
+
+    def read_logs(self, run_id: str, since: int = 0, limit: int = 500) -> Optional[Dict]:
+        with self._lock:
+            state = self._runs.get(run_id)
+        if state is None:
+            return None
+        return state["logs"].read(since, limit)
+
+    def add_listener(self, run_id: str, callback: Callable[[], None]):
+        """
+        Registers a callback invoked (from the worker thread) whenever the run changes.
+        """
+        with self._lock:
+            self._listeners.setdefault(run_id, set()).add(callback)
+
+    def remove_listener(self, run_id: str, callback: Callable[[], None]):
+        with self._lock:
+            listeners = self._listeners.get(run_id)
+            if listeners:
+                listeners.discard(callback)
+                if not listeners:
+                    del self._listeners[run_id]
+
+    def _notify(self, run_id: str):
+        with self._lock:
+            listeners = list(self._listeners.get(run_id, ()))
+        for callback in listeners:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def delta(self, run_id: str, cursor: Optional[Dict], log_limit: int = 500) -> Tuple[List[Tuple[str, object]], Optional[Dict]]:
+        """
+        Returns the changes since `cursor` as (event, payload) pairs plus the new cursor.
+        Log lines are sent from the cursor's sequence number (at most `log_limit` per
+        call); fix records are sent when new or changed; scalar fields only when their
+        value changed. A None cursor yields a snapshot with the latest log lines.
+        Returns ([], None) for an unknown run.
+        """
+        with self._lock:
+            state = self._runs.get(run_id)
+            if state is None:
+                return [], None
+            fields = {k: state.get(k) for k in STATE_FIELDS}
+            fixes = [dict(f) for f in state["fixes_applied"]]
+            store = state["logs"]
+
+        if cursor is None:
+            tail = store.tail(log_limit)
+            snapshot = dict(fields, logs=tail, log_next_seq=store.next_seq, fixes_applied=fixes)
+            return [("snapshot", snapshot)], {"log_seq": store.next_seq, "fixes": fixes, "fields": fields}
+
+        events = []
+        changed = {k: v for k, v in fields.items() if cursor["fields"].get(k) != v}
+        if changed:
+            events.append(("state", changed))
+
+        page = store.read(cursor["log_seq"], log_limit)
+        if page["lines"]:
+            events.append(("logs", {
+                "from_seq": page["lines"][0]["seq"],
+                "next_seq": page["next_seq"],
+                "lines": [line["text"] for line in page["lines"]]
+            }))
+
+        previous = cursor["fixes"]
+        updated = [
+            {"index": i, "fix": fix}
+            for i, fix in enumerate(fixes)
+            if i >= len(previous) or previous[i] != fix
+        ]
+        if updated:
+            events.append(("fixes", updated))
+
+        return events, {"log_seq": page["next_seq"], "fixes": fixes, "fields": fields, "has_more": page["has_more"]}
+
+    def get(self, run_id: str, since: Optional[int] = None, limit: int = 500) -> Optional[Dict]:
+        """
+        Returns a snapshot of the run state, safe to serialize while the run progresses.
+        Logs are paginated: lines with seq >= since (or the latest `limit` lines when
+        since is None); `log_next_seq` is the cursor for the next call.
+        """
+        with self._lock:
+            state = self._runs.get(run_id)
+            if state is None:
+                return None
+            snapshot = dict(state)
+            snapshot["fixes_applied"] = list(state["fixes_applied"])
+            store = state["logs"]
+
+        if since is None:
+            snapshot["logs"] = store.tail(limit)
+            snapshot["log_next_seq"] = store.next_seq
+            snapshot["log_has_more"] = False
+        else:
+            page = store.read(since, limit)
+            snapshot["logs"] = [line["text"] for line in page["lines"]]
+            snapshot["log_next_seq"] = page["next_seq"]
+            snapshot["log_has_more"] = page["has_more"]
+        return snapshot
+
+    def latest_run_id(self) -> Optional[str]:
+        with self._lock:
+            if not self._runs:
+                return None
+            return next(reversed(self._runs))
+
+    def list_runs(self) -> List[Dict]:
+        with self._lock:
+            return [
+                {
+                    "run_id": s["run_id"],
+                    "repo_url": s["repo_url"],
+                    "status": s["status"],
+                    "final_status": s["final_status"],
+                    "iteration": s["iteration"],
+                    "submitted_at": s["submitted_at"]
+                }
+                for s in self._runs.values()
+            ]
+
+    def active_count(self) -> int:
+        with self._lock:
+            return sum(1 for s in self._runs.values() if s["status"] == "RUNNING")
+
+    def queued_count(self) -> int:
+        with self._lock:
+            return sum(1 for s in self._runs.values() if s["status"] == "QUEUED")
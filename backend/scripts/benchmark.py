@@ -0,0 +1,411 @@
+"""
+Offline end-to-end benchmark of the autonomous fix loop.
+
+For each fixture in benchmark_fixtures.FIXTURES a repository with seeded bugs is
+created and served from a local bare remote; `langgraph_flow.app` then runs
+clone -> test -> analyze -> fix -> commit -> ... -> push against it, with the
+Gemini models replaced by a deterministic stub that knows the seeded fixes.
+Every run executes in its own process (clean caches and singletons, honest
+peak RSS) and the results are written as JSON for comparison across commits.
+
+    python -m backend.scripts.benchmark                      # offline fixtures
+    python -m backend.scripts.benchmark --languages python go --repeat 3
+    python -m backend.scripts.benchmark --compare old.json   # print deltas
+
+--sandbox docker runs the tests in the sandbox containers like production;
+--sandbox local runs the universal runner on the host (toolchains must be
+installed; fixtures whose toolchain is missing are skipped).
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import statistics
+import subprocess
+import tempfile
+import threading
+
+from backend.scripts.benchmark_fixtures import FIXTURES
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+RUNNER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "universal_runner.py")
+
+# Fixture remotes are addressed as https://bench.local/<name>.git and rewritten to the bare repos
+REMOTE_HOST = "https://bench.local/"
+BENCH_TOKEN = "benchmark"
+RESULT_MARKER = "BENCHMARK_RESULT "
+
+# --- Fixtures and remote ---
+
+def bug_line(files, bug):
+    for number, line in enumerate(files[bug["file"]].split("\n"), 1):
+        if bug["buggy"] in line:
+            return number
+    return 1
+
+def create_remote(remotes_dir, name, fixture):
+    """
+    Commits the fixture to a bare repository `<remotes_dir>/<name>.git` and
+    returns the URL the agent clones it from.
+    """
+    bare = os.path.join(remotes_dir, f"{name}.git")
+    source = tempfile.mkdtemp(prefix=f"bench-{name}-")
+    try:
+        for rel_path, content in fixture["files"].items():
+            path = os.path.join(source, rel_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(content)
+        git = lambda *args, cwd=source: subprocess.run(["git"] + list(args), cwd=cwd, check=True, capture_output=True)
+        git("init", "--quiet", "--initial-branch=main")
+        git("add", "-A")
+        git("-c", "user.name=Benchmark", "-c", "user.email=benchmark@localhost", "commit", "--quiet", "-m", "Seeded fixture")
+        shutil.rmtree(bare, ignore_errors=True)
+        git("clone", "--quiet", "--bare", source, bare, cwd=remotes_dir)
+    finally:
+        shutil.rmtree(source, ignore_errors=True)
+    return f"{REMOTE_HOST}{name}.git"
+
+def git_env(remotes_dir):
+    # Offline remote: https://bench.local/... (with or without the token) resolves to file:// bare repos
+    target = "file://" + os.path.abspath(remotes_dir) + "/"
+    env = {"GIT_CONFIG_COUNT": "2"}
+    for i, prefix in enumerate([REMOTE_HOST, REMOTE_HOST.replace("https://", f"https://{BENCH_TOKEN}@")]):
+        env[f"GIT_CONFIG_KEY_{i}"] = f"url.{target}.insteadOf"
+        env[f"GIT_CONFIG_VALUE_{i}"] = prefix
+    return env
+
+# --- Stub model ---
+
+class StubModel:
+    """
+    Deterministic stand-in for the Gemini chat models. It answers the three
+    prompts the loop uses: log analysis (JSON location of the next seeded bug),
+    unified-diff fixes and full-file fixes (the seeded bug in the shown code,
+    nearest the reported line, replaced by its fix).
+    """
+
+    def __init__(self, files, bugs, latency=0.0):
+        self.bugs = [dict(bug, line=bug_line(files, bug)) for bug in bugs]
+        self.latency = latency
+        self.calls = 0
+        self.fixed = set()
+        self._lock = threading.Lock()
+
+    def runnable(self):
+        from langchain_core.runnables import RunnableLambda
+        return RunnableLambda(self.respond)
+
+    def respond(self, prompt_value):
+        from langchain_core.messages import AIMessage
+        text = prompt_value.to_string()
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if "unified diff" in text:
+            return AIMessage(content=self._diff(text))
+        if "CODE CONTENT:" in text:
+            return AIMessage(content=self._full_file(text))
+        return AIMessage(content=json.dumps(self._analysis()))
+
+    @staticmethod
+    def _reported_line(text):
+        import re
+        match = re.search(r'Location: Line (\d+)', text)
+        return int(match.group(1)) if match else 0
+
+    def _pick(self, lines, reported):
+        # (line index, bug) of the seeded bug closest to the reported line
+        found = [(i, bug) for i, line in enumerate(lines) for bug in self.bugs if bug["buggy"] in line]
+        if not found:
+            return None
+        index, bug = min(found, key=lambda item: abs(item[0] + 1 - reported))
+        with self._lock:
+            self.fixed.add((bug["file"], bug["buggy"]))
+        return index, bug
+
+    def _diff(self, text):
+        import re
+        numbered = re.findall(r'^\s*(\d+)\| (.*)$', text, re.MULTILINE)
+        lines = [line for _, line in numbered]
+        picked = self._pick(lines, self._reported_line(text))
+        if not picked:
+            return "No change needed."
+        index, bug = picked
+        number = int(numbered[index][0])
+        old = lines[index]
+        return f"--- a/{bug['file']}\n+++ b/{bug['file']}\n@@ -{number},1 +{number},1 @@\n-{old}\n+{old.replace(bug['buggy'], bug['fixed'], 1)}\n"
+
+    def _full_file(self, text):
+        # The template indents the first code line by 4 spaces
+        code = text.split("CODE CONTENT:\n    ```\n    ", 1)[-1].rsplit("\n    ```\n    \n    INSTRUCTIONS:", 1)[0]
+        lines = code.split("\n")
+        picked = self._pick(lines, self._reported_line(text))
+        if picked:
+            index, bug = picked
+            lines[index] = lines[index].replace(bug["buggy"], bug["fixed"], 1)
+        return "\n".join(lines)
+
+    def _analysis(self):
+        with self._lock:
+            pending = [bug for bug in self.bugs if (bug["file"], bug["buggy"]) not in self.fixed] or self.bugs
+        bug = pending[0]
+        return {"file": bug["file"], "line": bug["line"], "type": "LOGIC", "description": f"Seeded bug: {bug['buggy']}"}
+
+# --- Local sandbox ---
+
+class LocalSandbox:
+    """
+    Runs the universal runner on the host (on a copy of the clone, like the
+    sandbox) instead of in a container, for machines without Docker.
+    """
+
+    def __init__(self, docker_manager):
+        self.docker_manager = docker_manager
+
+    def run_tests(self, repo_url, branch_name, token, auth_mode="https", private_key=None, repo_path=None, changed_files=None, on_event=None):
+        with tempfile.TemporaryDirectory(prefix="bench-sandbox-") as tmp:
+            copy = os.path.join(tmp, "repo")
+            shutil.copytree(repo_path, copy, ignore=shutil.ignore_patterns(".git"))
+            env = dict(os.environ, RIFT_REPORT_DIR=os.path.join(tmp, "reports"), RIFT_CHANGED_FILES="\n".join(changed_files or []))
+            proc = subprocess.Popen([sys.executable, RUNNER, "--phase", "all"], cwd=copy, env=env,
+                                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            result = self.docker_manager._consume_events(proc.stdout, token, on_event)
+            proc.wait()
+            return result
+
+# --- One run (child process) ---
+
+def run_fixture(name, repo_url, sandbox, latency, max_iterations):
+    """
+    Runs the agent graph once against a fixture remote and returns the measurements.
+    Must run in a fresh process whose cwd is the run directory.
+    """
+    fixture = FIXTURES[name]
+    started = time.perf_counter()
+
+    from backend import langgraph_flow as flow
+    from backend.services import tracing
+    import_seconds = time.perf_counter() - started
+
+    stub = StubModel(fixture["files"], fixture["bugs"], latency)
+    model = stub.runnable()
+    flow.fix_generator._llm_for = lambda temperature=None: model
+    flow.bug_analyzer.llm = model
+    flow.github_service.create_pr = lambda *args, **kwargs: {"status": "skipped", "message": "Offline benchmark"}
+    if sandbox == "local":
+        flow.test_runner = LocalSandbox(flow.test_runner.docker_manager)
+    else:
+        flow.test_runner.docker_manager.startup()
+
+    state = {
+        "repo_url": repo_url,
+        "team_name": "Benchmark",
+        "leader_name": "Bench",
+        "token": BENCH_TOKEN,
+        "auth_mode": "https",
+        "private_key": None,
+        "workspace": "",
+        "repo_path": "",
+        "branch_name": "",
+        "iteration": 0,
+        "max_iterations": max_iterations,
+        "test_status": "PENDING",
+        "logs": [],
+        "fixes_applied": [],
+        "current_error": {},
+        "current_errors": [],
+        "last_tested_commit": "",
+        "push_failed": False,
+        "push_skipped": False
+    }
+
+    steps = []
+    time_to_green = None
+    trace = tracing.Trace()
+    start = last = time.perf_counter()
+    with tracing.activate(trace):
+        for event in flow.app.stream(state, config={"recursion_limit": 200}):
+            now = time.perf_counter()
+            for node, value in event.items():
+                steps.append({"node": node, "seconds": round(now - last, 4)})
+                state.update(value)
+                if node == "test" and value.get("test_status") == "PASSED" and time_to_green is None:
+                    time_to_green = round(now - start, 4)
+            last = now
+    total = time.perf_counter() - start
+
+    pushed = subprocess.run(["git", "ls-remote", "--exit-code", repo_url, state.get("branch_name") or "HEAD"],
+                            capture_output=True).returncode == 0
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+
+    nodes = {}
+    for step in steps:
+        entry = nodes.setdefault(step["node"], {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+        entry["count"] += 1
+        entry["total_seconds"] = round(entry["total_seconds"] + step["seconds"], 4)
+        entry["max_seconds"] = max(entry["max_seconds"], step["seconds"])
+
+    return {
+        "fixture": name,
+        "language": fixture["language"],
+        "status": state.get("test_status"),
+        "green": time_to_green is not None,
+        "time_to_green_seconds": time_to_green,
+        "total_seconds": round(total, 4),
+        "import_seconds": round(import_seconds, 4),
+        "iterations": state.get("iteration", 0),
+        "fixes": len([f for f in state.get("fixes_applied", []) if f.get("status") == "Fixed"]),
+        "seeded_bugs": len(fixture["bugs"]),
+        "model_calls": stub.calls,
+        "pushed": pushed,
+        "peak_rss_mb": round(own / scale, 1),
+        "children_peak_rss_mb": round(children / scale, 1),
+        "nodes": nodes,
+        "spans": trace.summary().get("step", {}),
+        "steps": steps
+    }
+
+# --- Orchestration ---
+
+def docker_available():
+    try:
+        import docker
+        docker.from_env().ping()
+        return True
+    except Exception:
+        return False
+
+def spawn_run(name, repo_url, run_dir, args, env):
+    os.makedirs(run_dir, exist_ok=True)
+    cmd = [sys.executable, "-m", "backend.scripts.benchmark", "--child", name, "--repo-url", repo_url,
+           "--sandbox", args.sandbox, "--model-latency", str(args.model_latency), "--max-iterations", str(args.max_iterations)]
+    proc = subprocess.run(cmd, cwd=run_dir, env=env, capture_output=True, text=True, errors="replace")
+    with open(os.path.join(run_dir, "output.log"), "w", encoding="utf-8") as f:
+        f.write(proc.stdout + proc.stderr)
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    return {"fixture": name, "language": FIXTURES[name]["language"], "status": "CRASHED", "green": False,
+            "error": (proc.stderr or proc.stdout)[-2000:]}
+
+def summarize(runs):
+    summary = {}
+    for name in dict.fromkeys(r["fixture"] for r in runs):
+        measured = [r for r in runs if r["fixture"] == name and "total_seconds" in r]
+        green = [r for r in measured if r["green"]]
+        entry = {"runs": len([r for r in runs if r["fixture"] == name]), "green": len(green)}
+        if measured:
+            entry["median_total_seconds"] = round(statistics.median(r["total_seconds"] for r in measured), 4)
+            entry["mean_iterations"] = round(statistics.mean(r["iterations"] for r in measured), 2)
+            entry["max_peak_rss_mb"] = max(r["peak_rss_mb"] for r in measured)
+            node_names = dict.fromkeys(n for r in measured for n in r["nodes"])
+            entry["median_node_seconds"] = {
+                n: round(statistics.median(r["nodes"].get(n, {}).get("total_seconds", 0.0) for r in measured), 4)
+                for n in node_names
+            }
+        if green:
+            entry["median_time_to_green_seconds"] = round(statistics.median(r["time_to_green_seconds"] for r in green), 4)
+        summary[name] = entry
+    return summary
+
+def compare(current, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"Compared with {baseline_path} ({baseline.get('commit', '?')[:12]}):")
+    for name, entry in current["summary"].items():
+        old = baseline.get("summary", {}).get(name)
+        if not old:
+            continue
+        for key in ("median_time_to_green_seconds", "median_total_seconds", "mean_iterations", "max_peak_rss_mb"):
+            if key in entry and old.get(key):
+                change = (entry[key] - old[key]) / old[key] * 100
+                print(f"  {name:12} {key:30} {old[key]:>10} -> {entry[key]:>10} ({change:+.1f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the fix loop.")
+    parser.add_argument("--languages", nargs="*", help="Fixtures to run (default: the offline ones)")
+    parser.add_argument("--all", action="store_true", help="Include fixtures that need registry access or a warm dependency cache")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--sandbox", choices=["auto", "docker", "local"], default="auto")
+    parser.add_argument("--model-latency", type=float, default=0.0, help="Seconds each stub model call takes")
+    parser.add_argument("--max-iterations", type=int, default=5)
+    parser.add_argument("--shared-cache", action="store_true", help="Reuse mirrors, LLM and dependency caches across runs (warm runs)")
+    parser.add_argument("--work-dir", help="Where remotes and run directories go (default: a temporary directory)")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="Earlier result file to print deltas against")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--repo-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_fixture(args.child, args.repo_url, args.sandbox, args.model_latency, args.max_iterations)
+        print(RESULT_MARKER + json.dumps(result))
+        return
+
+    if args.sandbox == "auto":
+        args.sandbox = "docker" if docker_available() else "local"
+    names = args.languages or [n for n, f in FIXTURES.items() if f["offline"] or args.all]
+    unknown = [n for n in names if n not in FIXTURES]
+    if unknown:
+        parser.error(f"Unknown fixtures: {', '.join(unknown)} (available: {', '.join(FIXTURES)})")
+
+    work_dir = os.path.abspath(args.work_dir or tempfile.mkdtemp(prefix="rift-bench-"))
+    remotes_dir = os.path.join(work_dir, "remotes")
+    os.makedirs(remotes_dir, exist_ok=True)
+
+    env = dict(os.environ)
+    env.update(git_env(remotes_dir))
+    env["GEMINI_API_KEY"] = "benchmark-stub"
+    env["PYTHONPATH"] = REPO_ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    env.setdefault("SANDBOX_SOURCE", "local")
+    for var in ("GIT_AUTHOR_NAME", "GIT_COMMITTER_NAME"):
+        env.setdefault(var, "Benchmark")
+    for var in ("GIT_AUTHOR_EMAIL", "GIT_COMMITTER_EMAIL"):
+        env.setdefault(var, "benchmark@localhost")
+
+    runs = []
+    for name in names:
+        fixture = FIXTURES[name]
+        if args.sandbox == "local" and not all(shutil.which(tool) for tool in fixture["toolchain"]):
+            print(f"{name}: skipped (toolchain not found: {', '.join(fixture['toolchain'])})")
+            runs.append({"fixture": name, "language": fixture["language"], "status": "SKIPPED", "green": False})
+            continue
+        for i in range(args.repeat):
+            # A fresh remote per run: every run starts from the seeded bugs
+            repo_url = create_remote(remotes_dir, f"{name}-{i}", fixture)
+            run_dir = os.path.join(work_dir, "shared" if args.shared_cache else f"{name}-{i}")
+            result = spawn_run(name, repo_url, run_dir, args, env)
+            result["repeat"] = i
+            runs.append(result)
+            print(f"{name} #{i + 1}: {result['status']} in {result.get('total_seconds', '-')}s, "
+                  f"{result.get('iterations', '-')} iteration(s), green after {result.get('time_to_green_seconds')}s")
+
+    commit = subprocess.run(["git", "-C", REPO_ROOT, "rev-parse", "HEAD"], capture_output=True, text=True).stdout.strip()
+    report = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "sandbox": args.sandbox,
+        "model_latency": args.model_latency,
+        "shared_cache": args.shared_cache,
+        "summary": summarize(runs),
+        "runs": runs
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output} (work dir: {work_dir})")
+    if args.compare:
+        compare(report, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Fixture repositories for the end-to-end benchmark (see benchmark.py).
+
+One small project per language in LANGUAGE_CONFIG, each with known seeded bugs.
+A bug is placed where the toolchain reports it (a failing assertion, a compile
+error, an exception raised in the source), so a fix at the reported location
+turns the suite green. `offline` fixtures need nothing from a package
+registry; the others need network access or a warm dependency cache.
+"""
+
+FIXTURES = {
+    "python": {
+        "language": "python",
+        "offline": True,
+        "toolchain": ["pytest"],
+        "files": {
+            "pyproject.toml": '[project]\nname = "fixture"\nversion = "0.1.0"\n',
+            "calc.py": "def add(a, b):\n    return a + b\n",
+            "strings.py": "def shout(text):\n    return text.uper() + \"!\"\n",
+            "test_calc.py": "from calc import add\n\n\ndef test_add():\n    assert add(2, 3) == 6\n",
+            "test_strings.py": "from strings import shout\n\n\ndef test_shout():\n    assert shout(\"hi\") == \"HI!\"\n",
+        },
+        "bugs": [
+            {"file": "test_calc.py", "buggy": "assert add(2, 3) == 6", "fixed": "assert add(2, 3) == 5"},
+            {"file": "strings.py", "buggy": "text.uper()", "fixed": "text.upper()"},
+        ],
+    },
+    "node": {
+        "language": "node",
+        "offline": True,
+        "toolchain": ["npm", "node"],
+        "files": {
+            "package.json": '{\n  "name": "fixture",\n  "version": "1.0.0",\n  "private": true,\n  "scripts": {"test": "node test.js"}\n}\n',
+            "math.js": "function mul(a, b) {\n  return a + b;\n}\n\nmodule.exports = { mul };\n",
+            "test.js": "const assert = require(\"assert\");\nconst { mul } = require(\"./math\");\n\nassert.strictEqual(mul(3, 4), 12);\nconsole.log(\"ok\");\n",
+        },
+        "bugs": [
+            {"file": "math.js", "buggy": "return a + b;", "fixed": "return a * b;"},
+        ],
+    },
+    "go": {
+        "language": "go",
+        "offline": True,
+        "toolchain": ["go"],
+        "files": {
+            "go.mod": "module fixture\n\ngo 1.21\n",
+            "calc.go": "package fixture\n\nfunc Sub(a, b int) int {\n\treturn a - \"b\"\n}\n",
+            "calc_test.go": "package fixture\n\nimport \"testing\"\n\nfunc TestSub(t *testing.T) {\n\tif Sub(5, 3) != 2 {\n\t\tt.Fatal(\"Sub(5, 3) != 2\")\n\t}\n}\n",
+        },
+        "bugs": [
+            {"file": "calc.go", "buggy": "return a - \"b\"", "fixed": "return a - b"},
+        ],
+    },
+    "rust": {
+        "language": "rust",
+        "offline": True,
+        "toolchain": ["cargo"],
+        "files": {
+            "Cargo.toml": "[package]\nname = \"fixture\"\nversion = \"0.1.0\"\nedition = \"2021\"\n",
+            "src/lib.rs": "pub fn double(x: i32) -> i32 {\n    x * 2u64\n}\n\n#[cfg(test)]\nmod tests {\n    #[test]\n    fn doubles() {\n        assert_eq!(super::double(4), 8);\n    }\n}\n",
+        },
+        "bugs": [
+            {"file": "src/lib.rs", "buggy": "x * 2u64", "fixed": "x * 2"},
+        ],
+    },
+    "cpp": {
+        "language": "cpp",
+        "offline": True,
+        "toolchain": ["make", "g++"],
+        "files": {
+            "Makefile": "test: calc.cpp test_calc.cpp\n\tg++ -o test_calc calc.cpp test_calc.cpp\n\t./test_calc\n",
+            "calc.cpp": "int add(int a, int b) {\n    return a + b\n}\n",
+            "test_calc.cpp": "#include <cassert>\n\nint add(int a, int b);\n\nint main() {\n    assert(add(2, 2) == 4);\n    return 0;\n}\n",
+        },
+        "bugs": [
+            {"file": "calc.cpp", "buggy": "return a + b", "fixed": "return a + b;"},
+        ],
+    },
+    "java_maven": {
+        "language": "java_maven",
+        "offline": False,
+        "toolchain": ["mvn"],
+        "files": {
+            "pom.xml": (
+                "<project xmlns=\"http://maven.apache.org/POM/4.0.0\">\n"
+                "  <modelVersion>4.0.0</modelVersion>\n"
+                "  <groupId>bench</groupId>\n  <artifactId>fixture</artifactId>\n  <version>1.0</version>\n"
+                "  <properties>\n    <maven.compiler.source>17</maven.compiler.source>\n"
+                "    <maven.compiler.target>17</maven.compiler.target>\n  </properties>\n"
+                "  <dependencies>\n    <dependency>\n      <groupId>junit</groupId>\n      <artifactId>junit</artifactId>\n"
+                "      <version>4.13.2</version>\n      <scope>test</scope>\n    </dependency>\n  </dependencies>\n"
+                "</project>\n"
+            ),
+            "src/main/java/bench/Calc.java": "package bench;\n\npublic class Calc {\n    public static int add(int a, int b) {\n        return a + b;\n    }\n}\n",
+            "src/test/java/bench/CalcTest.java": (
+                "package bench;\n\nimport static org.junit.Assert.assertEquals;\nimport org.junit.Test;\n\n"
+                "public class CalcTest {\n    @Test\n    public void adds() {\n        assertEquals(6, Calc.add(2, 3));\n    }\n}\n"
+            ),
+        },
+        "bugs": [
+            {"file": "src/test/java/bench/CalcTest.java", "buggy": "assertEquals(6, Calc.add(2, 3));", "fixed": "assertEquals(5, Calc.add(2, 3));"},
+        ],
+    },
+    "java_gradle": {
+        "language": "java_gradle",
+        "offline": False,
+        "toolchain": ["gradle"],
+        "files": {
+            "build.gradle": "plugins {\n    id 'java'\n}\n\nrepositories {\n    mavenCentral()\n}\n\ndependencies {\n    testImplementation 'junit:junit:4.13.2'\n}\n",
+            "src/main/java/bench/Calc.java": "package bench;\n\npublic class Calc {\n    public static int add(int a, int b) {\n        return a + b;\n    }\n}\n",
+            "src/test/java/bench/CalcTest.java": (
+                "package bench;\n\nimport static org.junit.Assert.assertEquals;\nimport org.junit.Test;\n\n"
+                "public class CalcTest {\n    @Test\n    public void adds() {\n        assertEquals(6, Calc.add(2, 3));\n    }\n}\n"
+            ),
+        },
+        "bugs": [
+            {"file": "src/test/java/bench/CalcTest.java", "buggy": "assertEquals(6, Calc.add(2, 3));", "fixed": "assertEquals(5, Calc.add(2, 3));"},
+        ],
+    },
+    "csharp": {
+        "language": "csharp",
+        "offline": False,
+        "toolchain": ["dotnet"],
+        "files": {
+            "Fixture.csproj": (
+                "<Project Sdk=\"Microsoft.NET.Sdk\">\n  <PropertyGroup>\n    <TargetFramework>net8.0</TargetFramework>\n"
+                "    <IsPackable>false</IsPackable>\n  </PropertyGroup>\n  <ItemGroup>\n"
+                "    <PackageReference Include=\"Microsoft.NET.Test.Sdk\" Version=\"17.8.0\" />\n"
+                "    <PackageReference Include=\"xunit\" Version=\"2.6.2\" />\n"
+                "    <PackageReference Include=\"xunit.runner.visualstudio\" Version=\"2.5.4\" />\n"
+                "  </ItemGroup>\n</Project>\n"
+            ),
+            "Calc.cs": "public static class Calc\n{\n    public static int Add(int a, int b) => a + b;\n}\n",
+            "CalcTests.cs": "using Xunit;\n\npublic class CalcTests\n{\n    [Fact]\n    public void Adds()\n    {\n        Assert.Equal(6, Calc.Add(2, 3));\n    }\n}\n",
+        },
+        "bugs": [
+            {"file": "CalcTests.cs", "buggy": "Assert.Equal(6, Calc.Add(2, 3));", "fixed": "Assert.Equal(5, Calc.Add(2, 3));"},
+        ],
+    },
+    "php": {
+        "language": "php",
+        "offline": False,
+        "toolchain": ["composer", "php"],
+        "files": {
+            "composer.json": '{\n  "require-dev": {"phpunit/phpunit": "^10.5"},\n  "autoload": {"classmap": ["src/"]}\n}\n',
+            "phpunit.xml": "<phpunit bootstrap=\"vendor/autoload.php\">\n  <testsuites>\n    <testsuite name=\"fixture\">\n      <directory>tests</directory>\n    </testsuite>\n  </testsuites>\n</phpunit>\n",
+            "src/Calc.php": "<?php\n\nclass Calc\n{\n    public static function add(int $a, int $b): int\n    {\n        return $a - $b;\n    }\n}\n",
+            "tests/CalcTest.php": "<?php\n\nuse PHPUnit\\Framework\\TestCase;\n\nclass CalcTest extends TestCase\n{\n    public function testAdds(): void\n    {\n        $this->assertSame(5, Calc::add(2, 3));\n    }\n}\n",
+        },
+        "bugs": [
+            {"file": "src/Calc.php", "buggy": "return $a - $b;", "fixed": "return $a + $b;"},
+        ],
+    },
+    "ruby": {
+        "language": "ruby",
+        "offline": False,
+        "toolchain": ["bundle"],
+        "files": {
+            "Gemfile": "source \"https://rubygems.org\"\n\ngem \"rspec\"\n",
+            "lib/calc.rb": "module Calc\n  def self.add(a, b)\n    a + b\n  end\nend\n",
+            "spec/calc_spec.rb": "require_relative \"../lib/calc\"\n\nRSpec.describe Calc do\n  it \"adds\" do\n    expect(Calc.add(2, 3)).to eq(6)\n  end\nend\n",
+        },
+        "bugs": [
+            {"file": "spec/calc_spec.rb", "buggy": "expect(Calc.add(2, 3)).to eq(6)", "fixed": "expect(Calc.add(2, 3)).to eq(5)"},
+        ],
+    },
+}
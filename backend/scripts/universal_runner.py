@@ -4,6 +4,16 @@ import sys
 import subprocess
 import json
 import re
+import hashlib
+import time
+import glob
+import shutil
+import fnmatch
+import argparse
+import threading
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 # Structured Error Output
 RESULTS = {
@@ -14,42 +24,107 @@ RESULTS = {
     "raw_logs": ""
 }
 
+# Streaming: output is sent in chunks of this many lines; only a tail is kept for the final result
+OUTPUT_CHUNK_LINES = 50
+RAW_LOG_LIMIT = 200000
+MAX_ERROR_EVENTS = 20
+
+# Exit status of a command killed with SIGKILL (the sandbox's OOM killer); reported as KILLED
+KILLED_EXIT_CODES = (137, -9)
+
+# Persistent dependency cache mounted by DockerManager (empty = disabled)
+CACHE_ROOT = os.environ.get("RIFT_CACHE_ROOT", "")
+
+# Cache locations the project runs against, not just download caches. An install that
+# gets snapshotted puts them here, in the container filesystem: `docker commit` does not
+# capture the /cache mount, and the cache entry may be evicted while the snapshot lives.
+IMAGE_DEPS_ROOT = os.environ.get("RIFT_IMAGE_DEPS_ROOT", "/opt/rift-deps")
+INSTALL_LOCATIONS = {"PYTHONUSERBASE", "GOMODCACHE", "BUNDLE_PATH"}
+
+# Files changed since the previous iteration, one per line (empty = run the full suite)
+CHANGED_FILES = [f for f in os.environ.get("RIFT_CHANGED_FILES", "").splitlines() if f.strip()]
+
+# Machine-readable test reports are written here (see LANGUAGE_CONFIG[...]["report"])
+REPORT_DIR = os.environ.get("RIFT_REPORT_DIR", "/tmp/rift-reports")
+MAX_REPORT_ERRORS = 50
+
+# Sharding across sandbox containers: RIFT_SHARD="index/count"; durations of earlier
+# runs ({test unit: seconds}) are read from RIFT_SHARD_TIMINGS_FILE to balance the shards
+try:
+    SHARD_INDEX, SHARD_COUNT = (int(x) for x in os.environ.get("RIFT_SHARD", "0/1").split("/"))
+except ValueError:
+    SHARD_INDEX, SHARD_COUNT = 0, 1
+SHARD_TIMINGS_FILE = os.environ.get("RIFT_SHARD_TIMINGS_FILE", "")
+
+# Directories never worth walking (vendored deps, build output, VCS data)
+SKIP_DIRS = {".git", "node_modules", "venv", ".venv", "env", "__pycache__", "vendor", "target", "build", "dist", ".tox"}
+
 LANGUAGE_CONFIG = {
     "python": {
         "files": ["requirements.txt", "Pipfile", "pyproject.toml", "setup.py", "*.py"],
         "install": ["pip install -r requirements.txt"] if os.path.exists("requirements.txt") else [],
         "test": ["pytest"], # Fallback?
-        "error_pattern": r'File "(.+?)", line (\d+)'
+        "select": {"strategy": "import_graph", "command": "pytest {targets}"},
+        "test_files": [".py"],
+        "error_pattern": r'File "(.+?)", line (\d+)',
+        "lockfiles": ["requirements.txt", "Pipfile.lock", "poetry.lock", "pyproject.toml", "setup.py"],
+        "cache_env": {"PIP_CACHE_DIR": "pip", "PYTHONUSERBASE": "userbase"},
+        "cache_flags": {"PIP_USER": "1"},
+        "report": {"format": "junit", "append": " --junitxml={dir}/pytest.xml", "files": ["{dir}/pytest.xml"]}
     },
     "node": {
         "files": ["package.json", "*.js", "*.ts"],
         "install": ["npm install"],
         "test": ["npm test"],
-        "error_pattern": r'at (.+?):(\d+):(\d+)'
+        "select": {"strategy": "path", "command": "npm test -- {targets}"},
+        "test_files": [".js", ".jsx", ".ts", ".tsx", ".mjs", ".cjs"],
+        "error_pattern": r'at (.+?):(\d+):(\d+)',
+        "lockfiles": ["package-lock.json", "yarn.lock", "pnpm-lock.yaml", "package.json"],
+        "cache_env": {"npm_config_cache": "npm"},
+        "cache_flags": {"npm_config_prefer_offline": "true"},
+        "report": {"format": "jest", "script_pattern": r'\bjest\b|react-scripts test', "rewrite": ["npm test", "npm test -- --json --outputFile={dir}/jest.json"], "files": ["{dir}/jest.json"]}
     },
     "java_maven": {
         "files": ["pom.xml"],
         "install": [],
         "test": ["mvn test"],
-        "error_pattern": r'(.+?):\[(\d+),(\d+)\]' 
+        "select": {"strategy": "class", "command": "mvn test -Dtest={targets} -DfailIfNoTests=false", "separator": ","},
+        "test_files": [".java", ".kt"],
+        "error_pattern": r'(.+?):\[(\d+),(\d+)\]',
+        "lockfiles": ["pom.xml"],
+        "cache_env": {"MAVEN_OPTS": "m2"},
+        "report": {"format": "junit", "files": ["**/target/surefire-reports/TEST-*.xml"]}
     },
     "java_gradle": {
         "files": ["build.gradle"],
         "install": [],
         "test": ["gradle test"],
-        "error_pattern": r'(.+?):(\d+): error' 
+        "select": {"strategy": "class", "command": "gradle test {targets}", "target_format": "--tests {}"},
+        "test_files": [".java", ".kt"],
+        "error_pattern": r'(.+?):(\d+): error',
+        "lockfiles": ["build.gradle", "build.gradle.kts", "gradle.lockfile"],
+        "cache_env": {"GRADLE_USER_HOME": "gradle"},
+        "report": {"format": "junit", "files": ["**/build/test-results/**/TEST-*.xml"]}
     },
     "go": {
         "files": ["go.mod", "*.go"],
         "install": [],
         "test": ["go test ./..."],
-        "error_pattern": r'(.+?):(\d+):'
+        "select": {"strategy": "package", "command": "go test {targets}"},
+        "test_files": ["_test.go"],
+        "error_pattern": r'([\w./-]+\.go):(\d+):',
+        "lockfiles": ["go.sum", "go.mod"],
+        "cache_env": {"GOMODCACHE": "mod", "GOCACHE": "build"},
+        "report": {"format": "go_json", "rewrite": ["go test", "go test -json"], "stdout": True}
     },
     "csharp": {
         "files": ["*.csproj", "*.sln"],
         "install": [],
         "test": ["dotnet test"],
-        "error_pattern": r'(.+?)\((\d+),(\d+)\): error'
+        "error_pattern": r'(.+?)\((\d+),(\d+)\): error',
+        "lockfiles": ["packages.lock.json"],
+        "cache_env": {"NUGET_PACKAGES": "nuget"},
+        "report": {"format": "trx", "append": " --logger \"trx;LogFileName=rift.trx\" --results-directory {dir}", "files": ["{dir}/**/*.trx"]}
     },
     "cpp": {
         "files": ["Makefile", "CMakeLists.txt", "*.cpp", "*.c"],
@@ -61,61 +136,439 @@ LANGUAGE_CONFIG = {
         "files": ["Cargo.toml", "*.rs"],
         "install": [],
         "test": ["cargo test"],
-        "error_pattern": r'--> (.+?):(\d+):(\d+)'
+        "error_pattern": r'--> (.+?):(\d+):(\d+)',
+        "lockfiles": ["Cargo.lock", "Cargo.toml"],
+        "cache_env": {"CARGO_HOME": "cargo", "CARGO_TARGET_DIR": "target"},
+        "report": {"format": "cargo_json", "rewrite": ["cargo test", "cargo test --message-format=json"], "stdout": True}
     },
     "php": {
         "files": ["composer.json", "*.php"],
         "install": ["composer install"],
         "test": ["vendor/bin/phpunit"],
-        "error_pattern": r'on line (\d+) in (.+?)'
+        "error_pattern": r' in (\S+\.php) on line (\d+)',
+        "lockfiles": ["composer.lock", "composer.json"],
+        "cache_env": {"COMPOSER_CACHE_DIR": "composer"}
     },
     "ruby": {
         "files": ["Gemfile", "*.rb"],
         "install": ["bundle install"],
         "test": ["rspec"],
-        "error_pattern": r'(.+?):(\d+):in'
+        "select": {"strategy": "path", "command": "rspec {targets}"},
+        "test_files": [".rb"],
+        "error_pattern": r'(.+?):(\d+):in',
+        "lockfiles": ["Gemfile.lock", "Gemfile"],
+        "cache_env": {"BUNDLE_PATH": "bundle"},
+        "report": {"format": "rspec_json", "append": " --format progress --format json --out {dir}/rspec.json", "files": ["{dir}/rspec.json"]}
     }
 }
 
-def detect_language():
-    # Priority check
-    if os.path.exists("pom.xml"): return "java_maven"
-    if os.path.exists("build.gradle"): return "java_gradle"
-    if os.path.exists("package.json"): return "node"
-    if os.path.exists("go.mod"): return "go"
-    if os.path.exists("Cargo.toml"): return "rust"
-    if os.path.exists("requirements.txt"): return "python"
-    
-    # Fallback to extension scan
+# Manifests that mark the root of a subproject, in priority order within a directory
+SUBPROJECT_MARKERS = [
+    ("pom.xml", "java_maven"), ("build.gradle", "java_gradle"), ("build.gradle.kts", "java_gradle"),
+    ("package.json", "node"), ("go.mod", "go"), ("Cargo.toml", "rust"),
+    ("requirements.txt", "python"), ("pyproject.toml", "python"), ("setup.py", "python"), ("Pipfile", "python"),
+    ("*.csproj", "csharp"), ("*.sln", "csharp"), ("composer.json", "php"), ("Gemfile", "ruby"), ("CMakeLists.txt", "cpp")
+]
+# Used when no manifest exists anywhere: the first source file seen decides
+EXTENSION_LANGUAGES = [
+    (".csproj", "csharp"), (".sln", "csharp"), (".py", "python"), (".js", "node"), (".ts", "node"), (".go", "go"),
+    (".java", "java_maven"), (".cpp", "cpp"), (".c", "cpp"), (".rs", "rust"), (".php", "php"), (".rb", "ruby")
+]
+# Sample/fixture projects are not subprojects of the repository
+DETECT_SKIP_DIRS = SKIP_DIRS | {"fixtures", "testdata", "examples", "samples", "docs"}
+MAX_SUBPROJECT_DEPTH = 3
+
+# Subprojects tested at the same time in one sandbox
+SUBPROJECT_CONCURRENCY = max(1, int(os.environ.get("RIFT_SUBPROJECT_CONCURRENCY", "4") or 1))
+
+def node_test_script(root="."):
+    try:
+        with open(os.path.join(root, "package.json"), "r", encoding="utf-8") as f:
+            return (json.load(f).get("scripts") or {}).get("test", "") or ""
+    except Exception:
+        return ""
+
+def has_node_tests(root):
+    script = node_test_script(root)
+    # `npm init` placeholder
+    return bool(script) and "no test specified" not in script
+
+def detect_subprojects(base="."):
+    """
+    Finds every subproject root and its toolchain in one pruned directory pass.
+    Returns [(root relative to base, language)], outermost first. A nested
+    project of the same toolchain (Maven module, Cargo/npm workspace member) is
+    left to the enclosing project's build.
+    """
+    found = []
+    fallback = None
+    for root, dirs, files in os.walk(base):
+        rel = os.path.normpath(os.path.relpath(root, base))
+        depth = 0 if rel == "." else rel.count(os.sep) + 1
+        if depth < MAX_SUBPROJECT_DEPTH:
+            dirs[:] = sorted(d for d in dirs if d not in DETECT_SKIP_DIRS and not d.startswith("."))
+        else:
+            dirs[:] = []
+
+        here = []
+        for pattern, language in SUBPROJECT_MARKERS:
+            if language not in here and any(fnmatch.fnmatch(f, pattern) for f in files):
+                here.append(language)
+        if "java_maven" in here and "java_gradle" in here:
+            here.remove("java_gradle")
+        for language in here:
+            if any(lang == language and (r == "." or rel.startswith(r + os.sep)) for r, lang in found):
+                continue
+            found.append((rel, language))
+
+        if fallback is None:
+            fallback = next((lang for f in files for ext, lang in EXTENSION_LANGUAGES if f.endswith(ext)), None)
+
+    if len(found) > 1:
+        # A package.json that only carries tooling (linters, formatters) has nothing to test
+        found = [(r, lang) for r, lang in found if lang != "node" or has_node_tests(os.path.join(base, r))] or found
+    if not found and fallback:
+        found = [(".", fallback)]
+    return found
+
+def dependency_cache_env(language, phase="all"):
+    """
+    Points the toolchain's package caches at a directory keyed by a hash of the
+    lockfiles/manifests, so an unchanged dependency set reuses the previous install.
+    In the install phase (followed by a snapshot), and later in containers started
+    from that snapshot, INSTALL_LOCATIONS live under IMAGE_DEPS_ROOT instead,
+    seeded from the cache entry.
+    """
+    config = LANGUAGE_CONFIG.get(language, {})
+    if not CACHE_ROOT or not config.get("cache_env"):
+        return {}
+
+    digest = hashlib.sha256()
+    for name in config.get("lockfiles", []):
+        if os.path.exists(name):
+            with open(name, "rb") as f:
+                digest.update(name.encode() + b"\0" + f.read())
+    key = digest.hexdigest()[:16]
+
+    base = os.path.join(CACHE_ROOT, language, key)
+    try:
+        os.makedirs(base, exist_ok=True)
+        # Marker mtime drives LRU eviction on the host
+        with open(os.path.join(base, ".last_used"), "w") as f:
+            f.write(str(time.time()))
+    except OSError:
+        return {}
+
+    image_base = os.path.join(IMAGE_DEPS_ROOT, language, key)
+    in_image = bool(config.get("install")) and (phase == "install" or os.path.isdir(image_base))
+
+    env = dict(config.get("cache_flags", {}))
+    for var, sub in config["cache_env"].items():
+        path = os.path.join(base, sub)
+        if in_image and var in INSTALL_LOCATIONS:
+            path = os.path.join(image_base, sub)
+            if phase == "install" and os.path.isdir(os.path.join(base, sub)) and not os.path.exists(path):
+                try:
+                    shutil.copytree(os.path.join(base, sub), path, symlinks=True)
+                except (OSError, shutil.Error):
+                    shutil.rmtree(path, ignore_errors=True)
+            os.makedirs(path, exist_ok=True)
+        if var == "MAVEN_OPTS":
+            env[var] = f"-Dmaven.repo.local={path}"
+        else:
+            env[var] = path
+
+    if "PYTHONUSERBASE" in env:
+        # Console scripts (pytest, ...) installed with --user land here
+        env["PATH"] = os.path.join(env["PYTHONUSERBASE"], "bin") + os.pathsep + os.environ.get("PATH", "")
+    if "BUNDLE_PATH" in env:
+        env["BUNDLE_APP_CONFIG"] = os.path.join(os.path.dirname(env["BUNDLE_PATH"]), "bundle_config")
+    return env
+
+def walk_repo():
     for root, dirs, files in os.walk("."):
+        dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
         for file in files:
-            if file.endswith(".csproj"): return "csharp"
-            if file.endswith(".sln"): return "csharp"
-            if file.endswith(".py"): return "python"
-            if file.endswith(".js"): return "node"
-            if file.endswith(".ts"): return "node"
-            if file.endswith(".go"): return "go"
-            if file.endswith(".java"): return "java_maven" # Default to maven?
-            if file.endswith(".cpp") or file.endswith(".c"): return "cpp"
-            if file.endswith(".rs"): return "rust"
-            if file.endswith(".php"): return "php"
-            if file.endswith(".rb"): return "ruby"
-    
-    return "unknown"
+            yield os.path.normpath(os.path.join(root, file))
+
+def is_test_file(path):
+    name = os.path.basename(path)
+    stem = name.split(".")[0]
+    return (
+        name.startswith("test_") or stem.endswith("_test") or stem.endswith("_spec")
+        or ".test." in name or ".spec." in name
+        or stem.endswith("Test") or stem.endswith("Tests")
+        or "__tests__" in path.split(os.sep)
+    )
+
+def python_module_names(path):
+    parts = path[:-3].split(os.sep)
+    if parts[-1] == "__init__":
+        parts = parts[:-1]
+    names = [".".join(parts)]
+    if len(parts) > 1 and parts[0] in ("src", "lib"):
+        names.append(".".join(parts[1:]))
+    return [n for n in names if n]
+
+def python_affected_tests(changed):
+    """
+    Test files that import a changed module, directly or transitively.
+    """
+    import ast
+
+    py_files = [f for f in walk_repo() if f.endswith(".py")]
+    module_to_file = {}
+    for path in py_files:
+        for name in python_module_names(path):
+            module_to_file[name] = path
+
+    importers = {}  # file -> files importing it
+    for path in py_files:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                tree = ast.parse(f.read())
+        except Exception:
+            continue
+
+        package = python_module_names(path)[0].split(".")
+        if not path.endswith("__init__.py"):
+            package = package[:-1]
+
+        for node in ast.walk(tree):
+            targets = []
+            if isinstance(node, ast.Import):
+                targets = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom):
+                base = node.module or ""
+                if node.level:
+                    prefix = package[:len(package) - node.level + 1]
+                    base = ".".join(prefix + ([base] if base else []))
+                targets = [base] + [f"{base}.{alias.name}" for alias in node.names]
+
+            for module in targets:
+                # a.b.c may be defined by a/b/c.py or by a/b.py / a/__init__.py
+                while module:
+                    if module in module_to_file:
+                        importers.setdefault(module_to_file[module], set()).add(path)
+                        break
+                    module = module.rpartition(".")[0]
+
+    affected = set(f for f in changed if f.endswith(".py"))
+    queue = list(affected)
+    while queue:
+        current = queue.pop()
+        for importer in importers.get(current, ()):
+            if importer not in affected:
+                affected.add(importer)
+                queue.append(importer)
 
-def run_command(cmd):
+    return sorted(f for f in affected if is_test_file(f) and os.path.exists(f))
+
+def path_affected_tests(changed):
+    """
+    Test files mapped to changed files by name (foo.js -> foo.test.js, test_foo.rb, FooTest.java...).
+    """
+    stems = set()
+    selected = set()
+    for path in changed:
+        if is_test_file(path) and os.path.exists(path):
+            selected.add(os.path.normpath(path))
+        stems.add(os.path.basename(path).split(".")[0])
+
+    for path in walk_repo():
+        if not is_test_file(path):
+            continue
+        stem = os.path.basename(path).split(".")[0]
+        for changed_stem in stems:
+            if stem in (changed_stem, f"test_{changed_stem}", f"{changed_stem}_test", f"{changed_stem}_spec", f"{changed_stem}Test", f"{changed_stem}Tests"):
+                selected.add(path)
+    return sorted(selected)
+
+def select_tests(language):
+    """
+    Builds a test command limited to tests affected by CHANGED_FILES.
+    Returns (command, targets), or (None, []) when the full suite should run.
+    """
+    config = LANGUAGE_CONFIG.get(language, {})
+    select = config.get("select")
+    if not CHANGED_FILES or not select:
+        return None, []
+
+    changed = [os.path.normpath(os.path.relpath(f) if os.path.isabs(f) else f) for f in CHANGED_FILES]
+    strategy = select["strategy"]
+
+    if strategy == "import_graph":
+        targets = python_affected_tests(changed)
+    elif strategy == "package":
+        dirs = {os.path.dirname(f) for f in changed if f.endswith(".go")}
+        targets = sorted("./" + d if d else "." for d in dirs)
+    elif strategy == "class":
+        targets = sorted({os.path.basename(f).split(".")[0] for f in path_affected_tests(changed)})
+    else:
+        targets = path_affected_tests(changed)
+
+    if not targets:
+        return None, []
+
+    fmt = select.get("target_format", "{}")
+    joined = select.get("separator", " ").join(fmt.format(t) for t in targets)
+    return select["command"].format(targets=joined), targets
+
+def shard_units(language):
+    """
+    The units a suite is split into: test files, Go packages or JVM test classes
+    (matching the language's `select` strategy).
+    """
+    config = LANGUAGE_CONFIG.get(language, {})
+    if not config.get("select") or not config.get("test_files"):
+        return []
+    files = [f for f in walk_repo() if f.endswith(tuple(config["test_files"])) and (language == "go" or is_test_file(f))]
+    strategy = config["select"]["strategy"]
+    if strategy == "package":
+        return sorted({"./" + os.path.dirname(f) if os.path.dirname(f) else "." for f in files})
+    if strategy == "class":
+        return sorted({os.path.basename(f).split(".")[0] for f in files})
+    return sorted(files)
+
+def load_shard_timings():
+    if not SHARD_TIMINGS_FILE:
+        return {}
     try:
-        # Capture strictly
-        result = subprocess.run(
+        with open(SHARD_TIMINGS_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def partition(units, timings, count):
+    """
+    Longest-processing-time-first: the slowest unit goes to the least loaded
+    shard. Units without a recorded duration count as the median one.
+    Deterministic, so every shard computes the same split.
+    """
+    known = sorted(timings[u] for u in units if u in timings)
+    default = known[len(known) // 2] if known else 1.0
+    loads = [0.0] * count
+    shards = [[] for _ in range(count)]
+    for unit in sorted(units, key=lambda u: (-timings.get(u, default), u)):
+        target = min(range(count), key=lambda i: (loads[i], i))
+        shards[target].append(unit)
+        loads[target] += timings.get(unit, default)
+    return shards
+
+def shard_tests(language):
+    """
+    Builds the test command for this shard.
+    Returns (command, targets, runs): command None with runs True means the
+    full suite (languages that can't be split run whole on the first shard);
+    runs False means nothing was assigned to this shard.
+    """
+    if SHARD_COUNT <= 1:
+        return None, [], True
+    units = shard_units(language)
+    if not units:
+        return None, [], SHARD_INDEX == 0
+
+    mine = sorted(partition(units, load_shard_timings(), SHARD_COUNT)[SHARD_INDEX])
+    if not mine:
+        return None, [], False
+    select = LANGUAGE_CONFIG[language]["select"]
+    fmt = select.get("target_format", "{}")
+    joined = select.get("separator", " ").join(fmt.format(t) for t in mine)
+    return select["command"].format(targets=joined), mine, True
+
+class LogTail:
+    """
+    Keeps only the last `limit` characters of output; the full stream is sent as events.
+    """
+    def __init__(self, limit):
+        self.limit = limit
+        self.parts = deque()
+        self.size = 0
+
+    def append(self, text):
+        self.parts.append(text)
+        self.size += len(text)
+        while self.size > self.limit and len(self.parts) > 1:
+            self.size -= len(self.parts.popleft())
+
+    def text(self):
+        return "".join(self.parts)[-self.limit:]
+
+RAW_LOGS = LogTail(RAW_LOG_LIMIT)
+_emit_lock = threading.Lock()
+
+def emit(event, **fields):
+    """
+    Writes one NDJSON event line; DockerManager consumes these as they arrive.
+    """
+    line = json.dumps({"event": event, **fields}) + "\n"
+    with _emit_lock:
+        sys.stdout.write(line)
+        sys.stdout.flush()
+
+def finish():
+    RESULTS["raw_logs"] = RAW_LOGS.text()
+    emit("finished", result=RESULTS)
+
+def run_command(cmd, env=None, stage="test", language=None, capture=None):
+    """
+    Runs a shell command, streaming combined stdout/stderr as `output` events.
+    When a language is given, error locations are reported as `error` events as
+    soon as they appear. Lines are also appended to `capture` if given.
+    Returns the exit code.
+    """
+    RAW_LOGS.append(f"\n[{stage.upper()}] {cmd}\n")
+    try:
+        proc = subprocess.Popen(
             cmd, 
             shell=True, 
             stdout=subprocess.PIPE, 
-            stderr=subprocess.PIPE, 
-            text=True
+            stderr=subprocess.STDOUT, 
+            text=True,
+            errors="replace",
+            env={**os.environ, **env} if env else None
         )
-        return result.returncode, result.stdout, result.stderr
     except Exception as e:
-        return 1, "", str(e)
+        RAW_LOGS.append(str(e))
+        return 1
+
+    chunk = []
+    for line in proc.stdout:
+        RAW_LOGS.append(line)
+        chunk.append(line)
+        if capture is not None:
+            capture.append(line)
+
+        if language:
+            for err in extract_errors(line, language):
+                if record_error(err) and len(RESULTS["errors"]) <= MAX_ERROR_EVENTS:
+                    emit("error", stage=stage, error=err)
+
+        if len(chunk) >= OUTPUT_CHUNK_LINES:
+            emit("output", stage=stage, data="".join(chunk))
+            chunk = []
+
+    if chunk:
+        emit("output", stage=stage, data="".join(chunk))
+    return proc.wait()
+
+def error_key(err):
+    return (err["file"], err["line"], err["message"][:200])
+
+def record_error(err):
+    """
+    Adds a regex-matched error to RESULTS, bounded like RAW_LOGS: repeats of the same
+    location and message are dropped, and only the first MAX_REPORT_ERRORS are kept.
+    Returns True if the error was added.
+    """
+    errors = RESULTS["errors"]
+    if len(errors) >= MAX_REPORT_ERRORS:
+        return False
+    key = error_key(err)
+    if any(error_key(e) == key for e in errors):
+        return False
+    errors.append(err)
+    return True
 
 def extract_errors(logs, language):
     errors = []
@@ -126,74 +579,665 @@ def extract_errors(logs, language):
         return []
         
     matches = re.findall(pattern, logs)
-    # Normailize
+    # Every error_pattern captures (file, line, ...); the file group may carry a prefix
+    # such as "at fn (" or "# ", so its last token is taken
     for m in matches:
-        err = {"file": "", "line": 0, "message": "Detected Error"}
-        
-        # Heuristics for groups
-        # Python: (file, line)
-        # Node: (file, line, col)
-        if language == "python":
-            err["file"] = m[0]
-            err["line"] = int(m[1])
-        elif language == "node":
-            err["file"] = m[0]
-            err["line"] = int(m[1])
-        # Add more mappings as needed
-        
-        errors.append(err)
-        
+        tokens = m[0].split()
+        path = resolve_repo_path(tokens[-1].strip("(\"'")) if tokens else None
+        if not path:
+            # Not pinned to a repository file: nothing the fixer could attach it to
+            continue
+        errors.append({"file": path, "line": int(m[1]), "message": "Detected Error"})
+
     return errors
 
-def main():
-    try:
-        lang = detect_language()
-        RESULTS["language"] = lang
-        
-        if lang == "unknown":
-            print(json.dumps(RESULTS))
+# --- Structured test reports ---
+
+# Stack frame / location formats across toolchains, as (regex, file group, line group)
+FRAME_PATTERNS = [
+    (re.compile(r'File "([^"]+)", line (\d+)'), 1, 2),                # Python traceback
+    (re.compile(r'\(([\w$.-]+\.(?:java|kt|scala)):(\d+)\)'), 1, 2),   # JVM stack trace
+    (re.compile(r' in (\S+\.cs):line (\d+)'), 1, 2),                  # .NET stack trace
+    (re.compile(r'([\w./\\@+~-]+\.[A-Za-z]{1,5}):(\d+)'), 1, 2),      # path:line[:col] (pytest, JS, Go, Rust, Ruby)
+]
+EXTERNAL_PATH_MARKERS = ("site-packages", "dist-packages", "node_modules", "/usr/", "/gems/", "/.cargo/", "/go/pkg/", "<frozen", "<anonymous>")
+
+_repo_files = None
+
+def repo_files_by_name():
+    global _repo_files
+    if _repo_files is None:
+        _repo_files = {}
+        for path in walk_repo():
+            _repo_files.setdefault(os.path.basename(path), []).append(path)
+    return _repo_files
+
+def resolve_repo_path(path, hint=""):
+    """
+    Maps a path from a report (absolute, package-relative or bare file name) to a
+    repository-relative path, or None if the file is not part of the repository.
+    """
+    if not path or any(marker in path for marker in EXTERNAL_PATH_MARKERS):
+        return None
+    path = path.replace("\\", "/")
+    if path.startswith("file://"):
+        path = path[7:]
+    if os.path.isabs(path):
+        rel = os.path.relpath(path)
+        if rel.startswith("..") or not os.path.isfile(rel):
+            return None
+        return os.path.normpath(rel)
+    if os.path.isfile(path):
+        return os.path.normpath(path)
+
+    # Bare names (JVM frames, Go test output): look the file up by name
+    candidates = repo_files_by_name().get(os.path.basename(path), [])
+    if len(candidates) > 1 and hint:
+        hinted = [c for c in candidates if hint.replace(".", "/").endswith(os.path.dirname(c).replace(os.sep, "/"))]
+        candidates = hinted or candidates
+    return candidates[0] if candidates else None
+
+def locate(text, innermost_last=False, hint=""):
+    """
+    Finds the most relevant in-repository location in a failure message/stack trace.
+    Python tracebacks list the innermost frame last; other toolchains list it first.
+    """
+    frames = []
+    for pattern, file_group, line_group in FRAME_PATTERNS:
+        for m in pattern.finditer(text or ""):
+            frames.append((m.start(), m.group(file_group), int(m.group(line_group))))
+    frames.sort()
+
+    seen = set()
+    resolved = []
+    for _, path, line in frames:
+        repo_path = resolve_repo_path(path, hint)
+        if repo_path and (repo_path, line) not in seen:
+            seen.add((repo_path, line))
+            resolved.append((repo_path, line))
+    if not resolved:
+        return None, 0
+    return resolved[-1] if innermost_last else resolved[0]
+
+def classify_error(message):
+    text = message or ""
+    if re.search(r'IndentationError|TabError|unexpected indent', text):
+        return "INDENTATION"
+    if re.search(r'SyntaxError|ParseError|syntax error|Unexpected token|expected .* found|error: expected', text):
+        return "SYNTAX"
+    if re.search(r'ImportError|ModuleNotFoundError|Cannot find module|cannot find package|unresolved import|LoadError|package .* does not exist|could not be found \(are you missing', text):
+        return "IMPORT"
+    if re.search(r'TypeError|mismatched types|cannot use .* as|incompatible types|cannot convert|NoMethodError', text):
+        return "TYPE_ERROR"
+    return "LOGIC"
+
+def report_error(file, line, message, test=""):
+    return {
+        "file": file or "",
+        "line": int(line or 0),
+        "type": classify_error(message),
+        "message": (message or "").strip()[:2000],
+        "test": test,
+        "source": "report"
+    }
+
+def parse_junit(paths, innermost_last):
+    errors = []
+    for path in paths:
+        try:
+            root = ET.parse(path).getroot()
+        except Exception:
+            continue
+        for case in root.iter("testcase"):
+            for problem in list(case):
+                if problem.tag not in ("failure", "error"):
+                    continue
+                message = (problem.get("message") or "") + "\n" + (problem.text or "")
+                classname = case.get("classname", "")
+                file, line = locate(message, innermost_last, hint=classname)
+                if not file and case.get("file"):
+                    file, line = resolve_repo_path(case.get("file")), case.get("line", 0)
+                if not file and classname:
+                    # JVM: com.acme.FooTest -> FooTest.java
+                    for ext in (".java", ".kt", ".scala"):
+                        file = resolve_repo_path(classname.split(".")[-1].split("$")[0] + ext, classname)
+                        if file:
+                            break
+                errors.append(report_error(file, line, message, f"{classname}.{case.get('name', '')}".strip(".")))
+    return errors
+
+def parse_jest(paths):
+    errors = []
+    for path in paths:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            continue
+        for suite in data.get("testResults", []):
+            suite_file = resolve_repo_path(suite.get("name", ""))
+            failed = [a for a in suite.get("assertionResults", []) if a.get("status") == "failed"]
+            if not failed and suite.get("status") == "failed" and suite.get("message"):
+                # Suite failed to run (syntax error, missing module)
+                file, line = locate(suite["message"])
+                errors.append(report_error(file or suite_file, line, suite["message"]))
+            for assertion in failed:
+                message = "\n".join(assertion.get("failureMessages", []))
+                file, line = locate(message)
+                if not file:
+                    file, line = suite_file, (assertion.get("location") or {}).get("line", 0)
+                errors.append(report_error(file, line, message, assertion.get("fullName", "")))
+    return errors
+
+def parse_go_json(lines):
+    outputs = {}
+    failed = []
+    plain = []
+    for raw in lines:
+        try:
+            event = json.loads(raw)
+        except ValueError:
+            plain.append(raw)
+            continue
+        if not isinstance(event, dict):
+            continue
+        key = (event.get("Package", ""), event.get("Test"))
+        if event.get("Action") in ("output", "build-output"):
+            outputs[key] = outputs.get(key, "") + (event.get("Output") or "")
+        elif event.get("Action") in ("fail", "build-fail"):
+            failed.append(key)
+
+    errors = []
+    failed_tests = {pkg for pkg, test in failed if test}
+    for package, test in failed:
+        if not test and package in failed_tests:
+            continue  # Package summary of test failures already reported
+        text = outputs.get((package, test), "")
+        file, line = locate(text, hint=package)
+        errors.append(report_error(file, line, text, test or ""))
+
+    if not errors and plain:
+        # Build errors are printed as plain text before any JSON
+        text = "".join(plain)
+        file, line = locate(text)
+        if file:
+            errors.append(report_error(file, line, text))
+    return errors
+
+def parse_cargo_json(lines):
+    errors = []
+    panics = re.compile(r"thread '([^']+)' panicked at (?:'(.*?)', )?([^:\s]+):(\d+):\d+:?\s*(.*)")
+    for raw in lines:
+        try:
+            event = json.loads(raw)
+        except ValueError:
+            m = panics.search(raw)
+            if m:
+                file = resolve_repo_path(m.group(3))
+                errors.append(report_error(file, m.group(4), m.group(2) or m.group(5) or raw, m.group(1)))
+            continue
+        if not isinstance(event, dict) or event.get("reason") != "compiler-message":
+            continue
+        message = event.get("message", {})
+        if message.get("level") != "error":
+            continue
+        spans = message.get("spans", [])
+        primary = next((sp for sp in spans if sp.get("is_primary")), spans[0] if spans else {})
+        file = resolve_repo_path(primary.get("file_name", ""))
+        errors.append(report_error(file, primary.get("line_start", 0), message.get("rendered") or message.get("message", "")))
+    return errors
+
+def parse_trx(paths):
+    errors = []
+    for path in paths:
+        try:
+            root = ET.parse(path).getroot()
+        except Exception:
+            continue
+        for result in root.iter():
+            if not result.tag.endswith("UnitTestResult") or result.get("outcome") != "Failed":
+                continue
+            message = stack = ""
+            for node in result.iter():
+                if node.tag.endswith("Message"):
+                    message = node.text or ""
+                elif node.tag.endswith("StackTrace"):
+                    stack = node.text or ""
+            file, line = locate(stack)
+            errors.append(report_error(file, line, message + "\n" + stack, result.get("testName", "")))
+    return errors
+
+def parse_rspec_json(paths):
+    errors = []
+    for path in paths:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            continue
+        for example in data.get("examples", []):
+            if example.get("status") != "failed":
+                continue
+            exception = example.get("exception") or {}
+            message = f"{exception.get('class', '')}: {exception.get('message', '')}"
+            file, line = locate("\n".join(exception.get("backtrace") or []))
+            if not file:
+                file, line = resolve_repo_path(example.get("file_path", "")), example.get("line_number", 0)
+            errors.append(report_error(file, line, message, example.get("full_description", "")))
+    return errors
+
+def report_config(language):
+    """
+    The language's report settings, or None when the project's test script can't
+    write that report (`script_pattern`: the report flags are jest's, mocha or a
+    plain `node test.js` would reject them); failures then come from the log parser.
+    """
+    report = LANGUAGE_CONFIG.get(language, {}).get("report")
+    if report and report.get("script_pattern") and not re.search(report["script_pattern"], node_test_script()):
+        return None
+    return report
+
+def report_command(cmd, language):
+    """
+    Adds the flags that make the toolchain write a machine-readable report.
+    """
+    report = report_config(language)
+    if not report:
+        return cmd
+    if report.get("rewrite"):
+        old, new = report["rewrite"]
+        if cmd.startswith(old):
+            cmd = new + cmd[len(old):]
+    if report.get("append"):
+        cmd += report["append"]
+    return cmd.replace("{dir}", REPORT_DIR)
+
+def report_paths(report, started):
+    paths = []
+    for pattern in report.get("files", []):
+        for path in glob.glob(pattern.replace("{dir}", REPORT_DIR), recursive=True):
+            # Ignore reports left over from earlier builds
+            if os.path.getmtime(path) >= started - 1:
+                paths.append(path)
+    return paths
+
+def collect_report(language, started, stdout_lines):
+    """
+    Parses the reports written by the last test run into error records with
+    file/line/test/message. Returns [] when no usable report was produced.
+    """
+    report = report_config(language)
+    if not report:
+        return []
+
+    paths = report_paths(report, started)
+    fmt = report["format"]
+    if fmt == "junit":
+        errors = parse_junit(paths, innermost_last=(language == "python"))
+    elif fmt == "jest":
+        errors = parse_jest(paths)
+    elif fmt == "go_json":
+        errors = parse_go_json(stdout_lines)
+    elif fmt == "cargo_json":
+        errors = parse_cargo_json(stdout_lines)
+    elif fmt == "trx":
+        errors = parse_trx(paths)
+    elif fmt == "rspec_json":
+        errors = parse_rspec_json(paths)
+    else:
+        errors = []
+
+    unique = []
+    seen = set()
+    for err in errors:
+        key = error_key(err)
+        if key not in seen:
+            seen.add(key)
+            unique.append(err)
+    # Errors pinned to a file first: those can be fixed without asking the LLM
+    unique.sort(key=lambda e: not e["file"])
+    return unique[:MAX_REPORT_ERRORS]
+
+def collect_timings(language, started, stdout_lines):
+    """
+    Durations of the last run per shard unit (see `shard_units`), read from the
+    same reports as the errors. Used to balance the shards of later runs.
+    """
+    report = report_config(language)
+    if not report or not LANGUAGE_CONFIG[language].get("select"):
+        return {}
+    timings = {}
+
+    def add(unit, seconds):
+        try:
+            seconds = float(seconds or 0)
+        except ValueError:
             return
+        if unit:
+            timings[unit] = round(timings.get(unit, 0.0) + seconds, 3)
 
-        config = LANGUAGE_CONFIG.get(lang, {})
-        
-        # Install
-        for cmd in config.get("install", []):
-            code, out, err = run_command(cmd)
-            RESULTS["raw_logs"] += f"\n[INSTALL] {cmd}\n{out}\n{err}\n"
-            if code != 0:
-                RESULTS["status"] = "INSTALL_FAILED"
-                RESULTS["exit_code"] = code
-                print(json.dumps(RESULTS))
-                return
-
-        # Test
-        test_cmds = config.get("test", [])
-        if not test_cmds:
-             RESULTS["raw_logs"] += "\nNo test command configured.\n"
-             print(json.dumps(RESULTS))
-             return
-
-        # Just verify we have files first for Python logs if needed
-        # Run test
-        final_code = 0
-        for cmd in test_cmds:
-            code, out, err = run_command(cmd)
-            RESULTS["raw_logs"] += f"\n[TEST] {cmd}\n{out}\n{err}\n"
-            if code != 0:
-                final_code = code
-
-        RESULTS["exit_code"] = final_code
-        RESULTS["status"] = "PASSED" if final_code == 0 else "FAILED"
-        
-        if final_code != 0:
-            RESULTS["errors"] = extract_errors(RESULTS["raw_logs"], lang)
+    fmt = report["format"]
+    paths = report_paths(report, started)
+    if fmt == "junit":
+        modules = {}
+        if language == "python":
+            for path in walk_repo():
+                if path.endswith(".py"):
+                    for name in python_module_names(path):
+                        modules[name] = path
+        for path in paths:
+            try:
+                root = ET.parse(path).getroot()
+            except Exception:
+                continue
+            for case in root.iter("testcase"):
+                classname = case.get("classname", "")
+                if language == "python":
+                    # tests.test_mod.TestClass -> tests/test_mod.py
+                    unit = case.get("file") and os.path.normpath(case.get("file"))
+                    name = classname
+                    while not unit and name:
+                        unit = modules.get(name)
+                        name = name.rpartition(".")[0]
+                else:
+                    unit = classname.split(".")[-1].split("$")[0]
+                add(unit, case.get("time"))
+    elif fmt == "jest":
+        for path in paths:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except Exception:
+                continue
+            for suite in data.get("testResults", []):
+                duration = (suite.get("endTime") or 0) - (suite.get("startTime") or 0)
+                add(resolve_repo_path(suite.get("name", "")), max(duration, 0) / 1000)
+    elif fmt == "go_json":
+        module = ""
+        try:
+            with open("go.mod", "r", encoding="utf-8") as f:
+                match = re.search(r'^module\s+(\S+)', f.read(), re.MULTILINE)
+                module = match.group(1) if match else ""
+        except OSError:
+            pass
+        for raw in stdout_lines:
+            try:
+                event = json.loads(raw)
+            except ValueError:
+                continue
+            if not isinstance(event, dict) or event.get("Test") or event.get("Action") not in ("pass", "fail"):
+                continue
+            package = event.get("Package", "")
+            if module and (package == module or package.startswith(module + "/")):
+                add("./" + package[len(module) + 1:] if package != module else ".", event.get("Elapsed"))
+    elif fmt == "rspec_json":
+        for path in paths:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except Exception:
+                continue
+            for example in data.get("examples", []):
+                add(os.path.normpath(example.get("file_path", "")) if example.get("file_path") else None, example.get("run_time"))
+    return timings
+
+def run_project(lang, phase):
+    """
+    Installs and tests the project in the working directory, filling RESULTS.
+    """
+    config = LANGUAGE_CONFIG.get(lang, {})
+    cache_env = dependency_cache_env(lang, phase)
+
+    # Install
+    install_cmds = config.get("install", []) if phase != "test" else []
+    if install_cmds:
+        emit("stage", stage="install")
+    for cmd in install_cmds:
+        code = run_command(cmd, cache_env, stage="install")
+        if code != 0:
+            RESULTS["status"] = "KILLED" if code in KILLED_EXIT_CODES else "INSTALL_FAILED"
+            RESULTS["exit_code"] = code
+            return
+
+    if phase == "install":
+        RESULTS["status"] = "INSTALLED"
+        RESULTS["exit_code"] = 0
+        return
+
+    # Test (only the affected tests when the changed files are known)
+    test_cmds = config.get("test", [])
+    selected_cmd, targets = select_tests(lang)
+    if selected_cmd:
+        test_cmds = [selected_cmd]
+        RESULTS["test_selection"] = {"mode": "selected", "targets": targets}
+    elif SHARD_COUNT > 1:
+        # One of several containers running the full suite: only this shard's part
+        shard_cmd, targets, runs = shard_tests(lang)
+        RESULTS["test_selection"] = {"mode": "shard", "shard": f"{SHARD_INDEX}/{SHARD_COUNT}", "targets": targets}
+        if not runs:
+            RAW_LOGS.append("\nNo tests assigned to this shard.\n")
+            RESULTS["status"] = "PASSED"
+            RESULTS["exit_code"] = 0
+            RESULTS["errors"] = []
+            return
+        if shard_cmd:
+            test_cmds = [shard_cmd]
+    else:
+        RESULTS["test_selection"] = {"mode": "full", "targets": []}
+
+    if not test_cmds:
+         RAW_LOGS.append("\nNo test command configured.\n")
+         return
+
+    # Run test, asking the toolchain for a machine-readable report
+    shutil.rmtree(REPORT_DIR, ignore_errors=True)
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    test_cmds = [report_command(cmd, lang) for cmd in test_cmds]
+    capture = [] if config.get("report", {}).get("stdout") else None
+    started = time.time()
+
+    emit("stage", stage="test", commands=test_cmds)
+    final_code = 0
+    for cmd in test_cmds:
+        code = run_command(cmd, cache_env, stage="test", language=lang, capture=capture)
+        if code != 0:
+            final_code = code
+
+    RESULTS["exit_code"] = final_code
+    RESULTS["status"] = "PASSED" if final_code == 0 else "FAILED"
+    if final_code in KILLED_EXIT_CODES:
+        # Out of memory: no test report to learn from
+        RESULTS["status"] = "KILLED"
+        RAW_LOGS.append("\nTest process was killed (out of memory or SIGKILL).\n")
+    RESULTS["timings"] = collect_timings(lang, started, capture or [])
+
+    if final_code == 0:
+        RESULTS["errors"] = []
+    else:
+        # Precise records from the report replace the regex matches on raw output
+        report_errors = collect_report(lang, started, capture or [])
+        if report_errors:
+            RESULTS["errors"] = report_errors
+            emit("stage", stage="report", errors=len(report_errors))
+            for err in report_errors[:MAX_ERROR_EVENTS]:
+                emit("error", stage="report", error=err)
+
+# --- Polyglot repositories ---
+
+def in_subproject(root, err, language):
+    # Child runners report paths relative to their subproject
+    err = dict(err, subproject=root, language=language)
+    if err.get("file") and not os.path.isabs(err["file"]):
+        err["file"] = os.path.normpath(os.path.join(root, err["file"]))
+    return err
+
+def assign_changed_files(subprojects):
+    """
+    Gives each changed file to the innermost subproject root containing it,
+    rebased onto that root. Returns {root: [paths]}.
+    """
+    roots = sorted({root for root, _ in subprojects}, key=lambda r: (r != ".", r.count(os.sep), r), reverse=True)
+    owned = {root: [] for root in roots}
+    for path in CHANGED_FILES:
+        path = os.path.normpath(os.path.relpath(path) if os.path.isabs(path) else path)
+        for root in roots:
+            if root == "." or path.startswith(root + os.sep):
+                owned[root].append(path if root == "." else os.path.relpath(path, root))
+                break
+    return owned
+
+def run_subproject(index, root, lang, phase, changed):
+    """
+    Runs one subproject with a child runner in its own directory, relaying its
+    events tagged with the subproject. Returns the child's result.
+    """
+    env = dict(os.environ)
+    env["RIFT_REPORT_DIR"] = os.path.join(REPORT_DIR, f"subproject-{index}")
+    env["RIFT_CHANGED_FILES"] = "\n".join(changed or [])
+    if SHARD_COUNT > 1:
+        timings = {unit[len(root) + 1:] if root != "." else unit: seconds
+                   for unit, seconds in load_shard_timings().items()
+                   if (unit.startswith(root + ":") if root != "." else ":" not in unit)}
+        os.makedirs(REPORT_DIR, exist_ok=True)
+        env["RIFT_SHARD_TIMINGS_FILE"] = os.path.join(REPORT_DIR, f"subproject-{index}.timings.json")
+        with open(env["RIFT_SHARD_TIMINGS_FILE"], "w", encoding="utf-8") as f:
+            json.dump(timings, f)
+    cmd = [sys.executable, os.path.abspath(__file__), "--phase", phase, "--language", lang]
+
+    result = None
+    other_output = LogTail(RAW_LOG_LIMIT)
+    try:
+        proc = subprocess.Popen(cmd, cwd=root, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, errors="replace", env=env)
+    except Exception as e:
+        return {"status": "SYSTEM_ERROR", "exit_code": 1, "errors": [], "raw_logs": str(e)}
+
+    for line in proc.stdout:
+        event = None
+        if line.startswith('{"event"'):
+            try:
+                event = json.loads(line)
+            except ValueError:
+                event = None
+        if event is None:
+            other_output.append(line)
+            continue
+        kind = event.pop("event")
+        if kind == "finished":
+            result = event.get("result") or {}
+            continue
+        if kind == "error":
+            event["error"] = in_subproject(root, event.get("error", {}), lang)
+        emit(kind, subproject=root, **event)
+
+    code = proc.wait()
+    if result is None:
+        result = {"status": "SYSTEM_ERROR", "exit_code": code or 1, "errors": [], "raw_logs": other_output.text()}
+    result["errors"] = [in_subproject(root, err, lang) for err in result.get("errors", [])]
+    return result
+
+def run_subprojects(subprojects, phase):
+    """
+    Installs and tests every subproject concurrently and merges their results.
+    With changed files, subprojects none of them touch are skipped.
+    """
+    owned = assign_changed_files(subprojects) if CHANGED_FILES else {}
+    results = {}
+    jobs = []
+    for index, (root, lang) in enumerate(subprojects):
+        if CHANGED_FILES and phase != "install" and not owned.get(root):
+            results[index] = {"status": "SKIPPED", "exit_code": 0, "errors": [], "raw_logs": "",
+                              "test_selection": {"mode": "skipped", "targets": []}}
+        else:
+            jobs.append((index, root, lang))
+
+    with ThreadPoolExecutor(max_workers=SUBPROJECT_CONCURRENCY) as pool:
+        futures = {index: pool.submit(run_subproject, index, root, lang, phase, owned.get(root)) for index, root, lang in jobs}
+        for index, future in futures.items():
+            results[index] = future.result()
+
+    breakdown = []
+    errors = []
+    targets = []
+    timings = {}
+    modes = set()
+    for index, (root, lang) in enumerate(subprojects):
+        res = results[index]
+        selection = res.get("test_selection") or {}
+        modes.add(selection.get("mode"))
+        targets.extend(os.path.normpath(os.path.join(root, t)) for t in selection.get("targets", []))
+        errors.extend(res.get("errors", []))
+        # Shard units are per subproject; keep them apart for the next split
+        timings.update({unit if root == "." else f"{root}:{unit}": seconds for unit, seconds in (res.get("timings") or {}).items()})
+        breakdown.append({
+            "root": root,
+            "language": lang,
+            "status": res.get("status"),
+            "exit_code": res.get("exit_code"),
+            "errors": len(res.get("errors", [])),
+            "test_selection": selection
+        })
+
+    statuses = [res.get("status") for res in results.values()]
+    if phase == "install":
+        failed = [s for s in statuses if s != "INSTALLED"]
+        status = failed[0] if failed else "INSTALLED"
+    else:
+        # Failures with errors to fix come first
+        status = next((s for s in ("FAILED", "INSTALL_FAILED", "KILLED", "SYSTEM_ERROR") if s in statuses), "PASSED")
+    RESULTS["status"] = status
+    RESULTS["exit_code"] = next((res.get("exit_code") or 1 for res in results.values() if res.get("status") not in ("PASSED", "SKIPPED", "INSTALLED")), 0)
+    RESULTS["errors"] = errors if status != "PASSED" else []
+    RESULTS["subprojects"] = breakdown
+    if timings:
+        RESULTS["timings"] = timings
+    if phase != "install":
+        mode = "selected" if modes & {"selected", "skipped"} else "shard" if "shard" in modes else "full"
+        RESULTS["test_selection"] = {"mode": mode, "targets": targets}
+        if mode == "shard":
+            RESULTS["test_selection"]["shard"] = f"{SHARD_INDEX}/{SHARD_COUNT}"
+
+    # Each subproject gets an equal share of the log tail; failing ones last so they survive trimming
+    share = RAW_LOG_LIMIT // max(1, len(subprojects))
+    order = sorted(range(len(subprojects)), key=lambda i: results[i].get("status") not in ("PASSED", "SKIPPED", "INSTALLED"))
+    for index in order:
+        root, lang = subprojects[index]
+        res = results[index]
+        RAW_LOGS.append(f"\n===== {root} ({lang}): {res.get('status')} =====\n")
+        RAW_LOGS.append((res.get("raw_logs") or "")[-share:])
+
+def main(phase="all", language=None):
+    """
+    phase: "all" installs and tests, "install" stops after a successful install
+    (status INSTALLED) so the container can be snapshotted, "test" skips install.
+    Repositories with several subprojects (e.g. a Python backend and a Node
+    frontend) run one child runner per subproject, concurrently; `language` is
+    set for those children and skips detection.
+    Progress is reported as NDJSON events; the last event is always `finished`.
+    """
+    try:
+        if language:
+            subprojects = [(".", language)]
+        else:
+            subprojects = detect_subprojects()
+        languages = list(dict.fromkeys(lang for _, lang in subprojects))
+        RESULTS["language"] = ", ".join(languages) if languages else "unknown"
+        emit("stage", stage="detect", language=RESULTS["language"],
+             subprojects=[{"root": root, "language": lang} for root, lang in subprojects])
 
-        print(json.dumps(RESULTS))
+        if len(subprojects) == 1 and subprojects[0][0] == ".":
+            run_project(subprojects[0][1], phase)
+        elif subprojects:
+            run_subprojects(subprojects, phase)
+        finish()
         
     except Exception as e:
         RESULTS["status"] = "SYSTEM_ERROR"
-        RESULTS["raw_logs"] += str(e)
-        print(json.dumps(RESULTS))
+        RAW_LOGS.append(str(e))
+        finish()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--phase", default="all", choices=["all", "install", "test"])
+    parser.add_argument("--language")
+    args = parser.parse_args()
+    main(args.phase, args.language)
@@ -0,0 +1,223 @@
+import re
+import ast
+from typing import Dict, List, Optional, Set, Tuple
+
+# Rough size of a token, used to turn the token budget into characters
+CHARS_PER_TOKEN = 4
+
+IMPORT_PATTERN = re.compile(
+    r'^\s*(import\s|from\s+\S+\s+import\s|package\s|using\s|use\s|require(_once)?[\s(]|include(_once)?[\s(]|#include\s|extern\s+crate\s)'
+    r'|^\s*(const|let|var)\s+.*=\s*require\('
+)
+IDENTIFIER = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+FLOW_KEYWORDS = re.compile(r'(\}\s*)?(if|else|for|foreach|while|do|switch|match|catch|try|finally)\b')
+INDENT_LANGUAGE_EXTENSIONS = (".py", ".rb")
+
+class ContextBuilder:
+    """
+    Cuts a fix prompt down to the code around an error instead of the whole file.
+
+    The editable window is the innermost function/class enclosing the error
+    line: found with `ast` for Python, by brace depth for C-like languages and
+    by indentation otherwise (and for Python files that don't parse). Errors
+    outside any scope get the lines around them. Imports
+    and the module-level symbols the window references are sent as read-only
+    context. Everything is trimmed to fit a token budget; the fixed window is
+    spliced back into the original file with `splice`.
+    """
+
+    @classmethod
+    def build(cls, content: str, file_path: str, line: int, token_budget: int) -> Dict:
+        """
+        Returns {"start", "end" (1-based, inclusive), "code" (the editable window),
+        "context" (read-only imports and symbols), "line" (error line within the window)}.
+        Files that already fit the budget are returned whole.
+        """
+        lines = content.split("\n")
+        budget = token_budget * CHARS_PER_TOKEN
+        line = min(max(int(line or 1), 1), len(lines))
+
+        if len(content) <= budget:
+            return cls._window(lines, 1, len(lines), line, "")
+
+        tree = None
+        if file_path.endswith(".py"):
+            try:
+                tree = ast.parse(content)
+            except SyntaxError:
+                tree = None
+
+        if tree is not None:
+            start, end = cls._python_scope(tree, line) or (1, len(lines))
+            context_lines = cls._python_context(tree, lines, start, end)
+        else:
+            if file_path.endswith(INDENT_LANGUAGE_EXTENSIONS):
+                start, end = cls._indent_scope(lines, line)
+            else:
+                start, end = cls._brace_scope(lines, line)
+            context_lines = cls._regex_context(lines, start, end)
+
+        start, end = cls._fit(lines, start, end, line, budget * 3 // 4)
+        context = cls._trim("\n".join(context_lines), budget - cls._size(lines, start, end))
+        return cls._window(lines, start, end, line, context)
+
+    @staticmethod
+    def splice(content: str, window: Dict, fixed_code: str) -> str:
+        lines = content.split("\n")
+        lines[window["start"] - 1:window["end"]] = fixed_code.split("\n")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _window(lines: List[str], start: int, end: int, line: int, context: str) -> Dict:
+        return {
+            "start": start,
+            "end": end,
+            "code": "\n".join(lines[start - 1:end]),
+            "context": context,
+            "line": line - start + 1
+        }
+
+    @staticmethod
+    def _size(lines: List[str], start: int, end: int) -> int:
+        return sum(len(l) + 1 for l in lines[start - 1:end])
+
+    @classmethod
+    def _fit(cls, lines: List[str], start: int, end: int, line: int, budget: int) -> Tuple[int, int]:
+        # Oversized scope: keep a window centred on the error line
+        if cls._size(lines, start, end) <= budget:
+            return start, end
+        lo = hi = line
+        while True:
+            grown = False
+            if lo > start and cls._size(lines, lo - 1, hi) <= budget:
+                lo -= 1
+                grown = True
+            if hi < end and cls._size(lines, lo, hi + 1) <= budget:
+                hi += 1
+                grown = True
+            if not grown:
+                return lo, hi
+
+    @staticmethod
+    def _trim(text: str, budget: int) -> str:
+        if budget <= 0:
+            return ""
+        if len(text) <= budget:
+            return text
+        return text[:budget].rsplit("\n", 1)[0]
+
+    # --- Python ---
+
+    @staticmethod
+    def _python_scope(tree: ast.AST, line: int) -> Optional[Tuple[int, int]]:
+        best = None
+        for node in ast.walk(tree):
+            if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                continue
+            start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+            end = getattr(node, "end_lineno", None) or node.lineno
+            if start <= line <= end and (best is None or end - start < best[1] - best[0]):
+                best = (start, end)
+        return best
+
+    @staticmethod
+    def _python_context(tree: ast.AST, lines: List[str], start: int, end: int) -> List[str]:
+        names: Set[str] = set(IDENTIFIER.findall("\n".join(lines[start - 1:end])))
+        context = []
+        for node in tree.body:
+            node_start = node.lineno
+            node_end = getattr(node, "end_lineno", None) or node.lineno
+            if start <= node_start and node_end <= end:
+                continue
+            if isinstance(node, (ast.Import, ast.ImportFrom)):
+                context.extend(lines[node_start - 1:node_end])
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                if node.name in names and not (node_start <= start and end <= node_end):
+                    # Signature only; the body is not needed to call it correctly
+                    context.append(lines[node_start - 1])
+            elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+                targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+                if any(isinstance(t, ast.Name) and t.id in names for t in targets):
+                    context.extend(lines[node_start - 1:node_end])
+        return context
+
+    # --- Fallbacks for other languages ---
+
+    @staticmethod
+    def _indent(line: str) -> int:
+        return len(line) - len(line.lstrip())
+
+    @classmethod
+    def _indent_scope(cls, lines: List[str], line: int) -> Tuple[int, int]:
+        # Walk up to the nearest less-indented line that opens a block, then down to its dedent
+        base = cls._indent(lines[line - 1]) if lines[line - 1].strip() else None
+        start = line
+        for i in range(line - 1, 0, -1):
+            text = lines[i - 1]
+            if text.strip() and (base is None or cls._indent(text) < base) and re.match(r'\s*(def|class|module|async\s+def)\b', text):
+                start = i
+                break
+        else:
+            return 1, len(lines)
+
+        head_indent = cls._indent(lines[start - 1])
+        end = start
+        for i in range(start + 1, len(lines) + 1):
+            text = lines[i - 1]
+            if not text.strip():
+                continue
+            if cls._indent(text) <= head_indent:
+                # Ruby blocks close with a matching `end`
+                if text.strip() == "end" and cls._indent(text) == head_indent:
+                    end = i
+                break
+            end = i
+        return start, max(end, line)
+
+    @staticmethod
+    def _brace_scope(lines: List[str], line: int) -> Tuple[int, int]:
+        # Depth at the start of each line, ignoring braces inside strings and line comments
+        depths = []
+        depth = 0
+        for text in lines:
+            depths.append(depth)
+            stripped = re.sub(r'"(\\.|[^"\\])*"|\'(\\.|[^\'\\])*\'|//.*$', '', text)
+            depth += stripped.count("{") - stripped.count("}")
+
+        # Openers of the enclosing blocks, innermost first
+        openers = []
+        target = depths[line - 1]
+        for i in range(line - 1, 0, -1):
+            if target == 0:
+                break
+            if depths[i - 1] < target and "{" in lines[i - 1]:
+                openers.append(i)
+                target = depths[i - 1]
+        if not openers:
+            return 1, len(lines)
+
+        # Prefer the enclosing function over an if/for block inside it
+        start = openers[0]
+        for i in openers:
+            header = lines[i - 1].strip() if lines[i - 1].strip() != "{" or i == 1 else lines[i - 2].strip()
+            if "(" in header and not FLOW_KEYWORDS.match(header):
+                start = i
+                break
+        # Include a signature that sits on the line before a lone "{"
+        if lines[start - 1].strip() == "{" and start > 1:
+            start -= 1
+
+        opener_depth = depths[start - 1]
+        end = line
+        for i in range(line, len(lines) + 1):
+            end = i
+            if i < len(lines) and depths[i] <= opener_depth:
+                break
+        return start, end
+
+    @staticmethod
+    def _regex_context(lines: List[str], start: int, end: int) -> List[str]:
+        return [
+            text for i, text in enumerate(lines, 1)
+            if not (start <= i <= end) and IMPORT_PATTERN.match(text)
+        ]
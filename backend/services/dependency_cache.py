@@ -0,0 +1,91 @@
+import os
+import time
+import threading
+from typing import Dict, List
+from backend.utils.file_utils import FileUtils
+
+class DependencyCache:
+    """
+    Host-side accounting for the sandbox dependency cache.
+    Layout: <root>/<language>/<lockfile hash>/, each entry carrying a `.last_used`
+    marker that the universal runner touches. Entries are evicted least recently
+    used first once the total size exceeds the limit.
+    """
+
+    # Entries touched this recently may still be in use by a running sandbox
+    IN_USE_GRACE = 900  # seconds
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def _dir_size(path: str) -> int:
+        total = 0
+        for dirpath, _, files in os.walk(path):
+            for name in files:
+                try:
+                    total += os.lstat(os.path.join(dirpath, name)).st_size
+                except OSError:
+                    pass
+        return total
+
+    def entries(self) -> List[Dict]:
+        results = []
+        if not os.path.isdir(self.root):
+            return results
+
+        for language in os.listdir(self.root):
+            lang_dir = os.path.join(self.root, language)
+            if not os.path.isdir(lang_dir):
+                continue
+            for key in os.listdir(lang_dir):
+                path = os.path.join(lang_dir, key)
+                marker = os.path.join(path, ".last_used")
+                try:
+                    last_used = os.path.getmtime(marker if os.path.exists(marker) else path)
+                except OSError:
+                    continue
+                results.append({
+                    "language": language,
+                    "key": key,
+                    "path": path,
+                    "size": self._dir_size(path),
+                    "last_used": last_used
+                })
+        return results
+
+    def usage(self) -> Dict:
+        entries = self.entries()
+        return {
+            "total_bytes": sum(e["size"] for e in entries),
+            "max_bytes": self.max_bytes,
+            "entries": len(entries)
+        }
+
+    def enforce_limit(self) -> List[str]:
+        """
+        Evicts least recently used entries until the cache fits in max_bytes.
+        Returns the evicted paths.
+        """
+        if not self._lock.acquire(blocking=False):
+            return []  # Another eviction pass is already running
+        try:
+            entries = sorted(self.entries(), key=lambda e: e["last_used"])
+            total = sum(e["size"] for e in entries)
+            evicted = []
+            now = time.time()
+
+            for entry in entries:
+                if total <= self.max_bytes:
+                    break
+                if now - entry["last_used"] < self.IN_USE_GRACE:
+                    continue
+                FileUtils.safe_delete_folder(entry["path"])
+                total -= entry["size"]
+                evicted.append(entry["path"])
+            return evicted
+        finally:
+            self._lock.release()
@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Callable, Dict, Optional, Tuple
+from backend.config import Config
+from backend.services.tracing import span
+
+class LLMCache:
+    """
+    Disk-backed cache of raw LLM responses (SQLite), keyed by
+    (model, prompt template version, normalized inputs).
+    Entries expire after `ttl` seconds; once the stored responses exceed
+    `max_bytes` the least recently used ones are evicted.
+    Concurrent lookups of the same key are coalesced: one caller queries the
+    model, the others wait for its answer.
+    """
+
+    def __init__(self, path: str, max_bytes: int, ttl: int):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Dict] = {}
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT, size INTEGER, created REAL, last_access REAL)"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def normalize(value):
+        if isinstance(value, str):
+            # Line endings and trailing whitespace don't change the meaning of a prompt
+            return "\n".join(line.rstrip() for line in value.replace("\r\n", "\n").split("\n")).strip()
+        if isinstance(value, dict):
+            return {k: LLMCache.normalize(v) for k, v in sorted(value.items())}
+        if isinstance(value, (list, tuple)):
+            return [LLMCache.normalize(v) for v in value]
+        return value
+
+    @staticmethod
+    def make_key(model: str, template_version: str, inputs: Dict) -> str:
+        payload = json.dumps([model, template_version, LLMCache.normalize(inputs)], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            return row[0]
+
+    def put(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), now, now)
+            )
+            self._evict(now)
+            self._db.commit()
+
+    def _evict(self, now: float):
+        self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY last_access ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+
+    def get_or_compute(self, key: str, compute: Callable[[], str]) -> Tuple[str, bool]:
+        """
+        Returns (response, cache_hit). A response coalesced from an identical
+        in-flight request counts as a hit. Exceptions from `compute` propagate
+        to every waiting caller and nothing is cached.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached, True
+
+        with self._lock:
+            flight = self._in_flight.get(key)
+            owner = flight is None
+            if owner:
+                flight = {"done": threading.Event(), "value": None, "error": None}
+                self._in_flight[key] = flight
+
+        if not owner:
+            flight["done"].wait()
+            if flight["error"] is not None:
+                raise flight["error"]
+            return flight["value"], True
+
+        try:
+            value = compute()
+            flight["value"] = value
+            self.put(key, value)
+            return value, False
+        except Exception as e:
+            flight["error"] = e
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            flight["done"].set()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            count, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"entries": count, "total_bytes": total, "max_bytes": self.max_bytes}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_llm_cache() -> Optional[LLMCache]:
+    """
+    Process-wide cache instance, or None when LLM_CACHE_DIR is empty.
+    """
+    global _cache
+    if not Config.LLM_CACHE_DIR:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache(
+                os.path.join(Config.LLM_CACHE_DIR, "responses.sqlite3"),
+                Config.LLM_CACHE_MAX_MB * 1024 * 1024,
+                Config.LLM_CACHE_TTL_HOURS * 3600
+            )
+        return _cache
+
+def cached_invoke(chain, inputs: Dict, model: str, template_version: str, cache_info: Dict = None) -> str:
+    """
+    Invokes a prompt | llm chain and returns the response text, served from the
+    cache when an identical request was answered before. If `cache_info` is
+    given, cache_info["hit"] is set so callers can report savings.
+    """
+    def invoke() -> str:
+        # Only real model calls are timed; cache hits never get here
+        with span("llm_call", model=model, prompt=template_version):
+            return chain.invoke(inputs).content
+
+    cache = get_llm_cache()
+    if cache is None:
+        hit = False
+        content = invoke()
+    else:
+        key = LLMCache.make_key(model, template_version, inputs)
+        content, hit = cache.get_or_compute(key, invoke)
+
+    if cache_info is not None:
+        cache_info["hit"] = hit
+    return content
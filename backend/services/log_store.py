@@ -0,0 +1,106 @@
+import os
+import json
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+class RunLogStore:
+    """
+    Append-only log for one run. Every line gets a monotonically increasing
+    sequence number (starting at 0). The newest `capacity` lines stay in memory;
+    older lines are spilled to `<spill_dir>/<run_id>.log` as JSON lines, with a
+    sparse seq -> byte offset index so cursor reads never scan the whole file.
+    """
+
+    INDEX_EVERY = 256
+
+    def __init__(self, run_id: str, capacity: int, spill_dir: str):
+        self.run_id = run_id
+        self.capacity = capacity
+        self.spill_path = os.path.join(spill_dir, f"{run_id}.log")
+        self._memory = deque()  # (seq, text)
+        self._next_seq = 0
+        self._spilled = 0  # lines [0, _spilled) are on disk
+        self._index: List[int] = []  # byte offset of seq i * INDEX_EVERY
+        self._lock = threading.Lock()
+        os.makedirs(spill_dir, exist_ok=True)
+
+    @property
+    def next_seq(self) -> int:
+        return self._next_seq
+
+    def __len__(self) -> int:
+        return self._next_seq
+
+    def append(self, text: str) -> int:
+        with self._lock:
+            seq = self._next_seq
+            self._memory.append((seq, text))
+            self._next_seq += 1
+            if len(self._memory) > self.capacity:
+                self._spill(*self._memory.popleft())
+            return seq
+
+    def extend(self, lines: List[str]):
+        for line in lines:
+            self.append(line)
+
+    def _spill(self, seq: int, text: str):
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            if seq % self.INDEX_EVERY == 0:
+                self._index.append(f.tell())
+            f.write(json.dumps(text) + "\n")
+        self._spilled = seq + 1
+
+    def _read_spilled(self, since: int, limit: int) -> List[Dict]:
+        block = since // self.INDEX_EVERY
+        if block >= len(self._index):
+            return []
+        seq = block * self.INDEX_EVERY
+        lines = []
+        with open(self.spill_path, "r", encoding="utf-8") as f:
+            f.seek(self._index[block])
+            for raw in f:
+                if seq >= self._spilled or len(lines) >= limit:
+                    break
+                if seq >= since:
+                    lines.append({"seq": seq, "text": json.loads(raw)})
+                seq += 1
+        return lines
+
+    def read(self, since: int = 0, limit: int = 500) -> Dict:
+        """
+        Returns up to `limit` lines with seq >= since, and the cursor for the next call.
+        """
+        with self._lock:
+            since = max(since, 0)
+            lines = []
+            if since < self._spilled:
+                lines = self._read_spilled(since, limit)
+            for seq, text in self._memory:
+                if len(lines) >= limit:
+                    break
+                if seq >= since and (not lines or seq > lines[-1]["seq"]):
+                    lines.append({"seq": seq, "text": text})
+
+            next_seq = lines[-1]["seq"] + 1 if lines else min(since, self._next_seq)
+            return {
+                "lines": lines,
+                "next_seq": next_seq,
+                "last_seq": self._next_seq - 1,
+                "has_more": next_seq < self._next_seq
+            }
+
+    def tail(self, count: int) -> List[str]:
+        with self._lock:
+            items = list(self._memory)[-count:] if count > 0 else []
+            return [text for _, text in items]
+
+    def delete(self):
+        with self._lock:
+            self._memory.clear()
+            if os.path.exists(self.spill_path):
+                try:
+                    os.unlink(self.spill_path)
+                except OSError:
+                    pass
@@ -0,0 +1,120 @@
+import re
+from typing import Dict, List, Optional
+
+HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+class PatchError(Exception):
+    pass
+
+class PatchApplier:
+    """
+    Applies model-generated unified diffs to file content.
+    Models get line numbers and context slightly wrong, so each hunk is located
+    by content rather than trusted offsets: exact match nearest the stated line
+    first, then ignoring whitespace, then with up to `fuzz` context lines
+    dropped from either end (like `patch --fuzz`).
+    """
+
+    @staticmethod
+    def extract_diff(text: str) -> str:
+        """
+        Strips markdown fences and chatter around a diff.
+        """
+        fenced = re.search(r'```(?:diff|patch)?\s*\n(.*?)```', text, re.DOTALL)
+        if fenced:
+            text = fenced.group(1)
+        lines = text.splitlines()
+        for i, line in enumerate(lines):
+            if line.startswith("--- ") or line.startswith("@@"):
+                return "\n".join(lines[i:])
+        return ""
+
+    @staticmethod
+    def parse(diff: str) -> List[Dict]:
+        """
+        Returns hunks as {"start": int (1-based), "lines": [(op, text)]} with op in " ", "-", "+".
+        """
+        hunks = []
+        current = None
+        for line in diff.splitlines():
+            if line.startswith("--- ") or line.startswith("+++ "):
+                continue
+            if line.startswith("@@"):
+                match = HUNK_HEADER.match(line)
+                current = {"start": int(match.group(1)) if match else 0, "lines": []}
+                hunks.append(current)
+                continue
+            if current is None or line.startswith("\\"):
+                continue
+            op, text = (line[0], line[1:]) if line and line[0] in " -+" else (" ", line)
+            current["lines"].append((op, text))
+        hunks = [h for h in hunks if any(op in "-+" for op, _ in h["lines"])]
+        if not hunks:
+            raise PatchError("Diff contains no changes")
+        return hunks
+
+    @staticmethod
+    def _find(lines: List[str], needle: List[str], hint: int, loose: bool) -> Optional[int]:
+        if not needle:
+            return min(max(hint, 0), len(lines))
+        norm = (lambda s: "".join(s.split())) if loose else (lambda s: s)
+        target = [norm(s) for s in needle]
+        candidates = [
+            i for i in range(len(lines) - len(needle) + 1)
+            if norm(lines[i]) == target[0] and [norm(s) for s in lines[i:i + len(needle)]] == target
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda i: abs(i - hint))
+
+    @classmethod
+    def _locate(cls, lines: List[str], hunk_lines: List, hint: int, fuzz: int):
+        """
+        Returns (position, trimmed hunk lines) or None.
+        """
+        for trim in range(fuzz + 1):
+            head = cls._leading_context(hunk_lines, trim)
+            tail = cls._leading_context(hunk_lines[::-1], trim)
+            trimmed = hunk_lines[head:len(hunk_lines) - tail]
+            old = [text for op, text in trimmed if op != "+"]
+            for loose in (False, True):
+                pos = cls._find(lines, old, hint + head, loose)
+                if pos is not None:
+                    return pos, trimmed
+        return None
+
+    @staticmethod
+    def _leading_context(hunk_lines: List, limit: int) -> int:
+        count = 0
+        while count < limit and count < len(hunk_lines) and hunk_lines[count][0] == " ":
+            count += 1
+        return count
+
+    @classmethod
+    def apply(cls, content: str, diff: str, fuzz: int = 2) -> str:
+        """
+        Returns the patched content, or raises PatchError if any hunk can't be placed.
+        """
+        lines = content.split("\n")
+        offset = 0
+        for number, hunk in enumerate(cls.parse(diff), 1):
+            hint = max(hunk["start"] - 1 + offset, 0)
+            located = cls._locate(lines, hunk["lines"], hint, fuzz)
+            if located is None:
+                raise PatchError(f"Hunk {number} does not match the file")
+            pos, trimmed = located
+            old_count = sum(1 for op, _ in trimmed if op != "+")
+            # Keep the file's own text for context lines (the model may have mangled whitespace)
+            new_lines = []
+            cursor = pos
+            for op, text in trimmed:
+                if op == " ":
+                    new_lines.append(lines[cursor])
+                    cursor += 1
+                elif op == "-":
+                    cursor += 1
+                else:
+                    new_lines.append(text)
+            lines[pos:pos + old_count] = new_lines
+            offset += len(new_lines) - old_count
+        return "\n".join(lines)
@@ -0,0 +1,97 @@
+import os
+import re
+import hashlib
+import threading
+import subprocess
+from typing import Dict, Optional
+from backend.config import Config
+
+class RepoMirror:
+    """
+    Local bare mirrors of remote repositories, one per repository URL, under `root`.
+    A run first brings the mirror up to date with an incremental fetch, then
+    clones its workspace from the mirror locally (objects are hardlinked), so
+    repeat runs only download what changed upstream.
+    Credentials are never stored in a mirror: the authenticated URL is passed
+    to each fetch and not saved as a remote.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def key(repo_url: str) -> str:
+        # Same repository over https and ssh shares one mirror
+        normalized = repo_url.strip().rstrip("/")
+        normalized = re.sub(r'^(https://|ssh://|git@)', '', normalized).replace(":", "/")
+        normalized = re.sub(r'^[^@/]+@', '', normalized)  # user/token in URL
+        if normalized.endswith(".git"):
+            normalized = normalized[:-4]
+        name = re.sub(r'[^A-Za-z0-9_.-]', '-', normalized.split("/")[-1])[:40]
+        return f"{name}-{hashlib.sha256(normalized.lower().encode()).hexdigest()[:12]}.git"
+
+    def path_for(self, repo_url: str) -> str:
+        return os.path.join(self.root, self.key(repo_url))
+
+    def existing(self, repo_url: str) -> Optional[str]:
+        path = self.path_for(repo_url)
+        return path if os.path.isfile(os.path.join(path, "HEAD")) else None
+
+    def _lock_for(self, path: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(path, threading.Lock())
+
+    @staticmethod
+    def _git(args, env=None, cwd=None):
+        proc = subprocess.run(["git"] + args, env=env, cwd=cwd, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip() or proc.stdout.strip())
+        return proc.stdout
+
+    def update(self, repo_url: str, auth_url: str, env: Dict = None) -> str:
+        """
+        Creates or incrementally fetches the mirror for `repo_url` and returns its path.
+        """
+        path = self.path_for(repo_url)
+        with self._lock_for(path):
+            if not self.existing(repo_url):
+                self._git(["init", "--bare", "--quiet", path], env)
+            self._git([
+                "--git-dir", path, "fetch", "--prune", "--quiet", "--no-tags", auth_url,
+                "+refs/heads/*:refs/heads/*", "+refs/tags/*:refs/tags/*"
+            ], env)
+            # Point HEAD at the remote's default branch so clones check it out
+            try:
+                out = self._git(["ls-remote", "--symref", auth_url, "HEAD"], env)
+                match = re.search(r'ref: (refs/heads/\S+)\s+HEAD', out)
+                if match:
+                    self._git(["--git-dir", path, "symbolic-ref", "HEAD", match.group(1)], env)
+            except RuntimeError:
+                pass
+        return path
+
+    def clone(self, mirror_path: str, clone_path: str, origin_url: str, env: Dict = None):
+        """
+        Clones a working copy from the mirror (hardlinked objects, no network) and
+        points `origin` at the real remote so fetch/push behave as usual.
+        """
+        self._git(["clone", "--quiet", "-c", "core.longpaths=true", mirror_path, clone_path], env)
+        self._git(["remote", "set-url", "origin", origin_url], env, cwd=clone_path)
+
+_mirror = None
+_mirror_lock = threading.Lock()
+
+def get_repo_mirror() -> Optional[RepoMirror]:
+    """
+    Process-wide mirror cache, or None when MIRROR_DIR is empty.
+    """
+    global _mirror
+    if not Config.MIRROR_DIR:
+        return None
+    with _mirror_lock:
+        if _mirror is None:
+            _mirror = RepoMirror(Config.MIRROR_DIR)
+        return _mirror
@@ -1,48 +1,278 @@
 import os
 import ast
-from typing import List, Dict
+import atexit
+import threading
+import multiprocessing
+import subprocess
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional, Tuple
+from backend.config import Config
+
+# Vendored dependencies, virtualenvs, caches and build output are never scanned
+PRUNE_DIRS = {
+    ".git", ".hg", ".svn", "node_modules", "venv", ".venv", "env", "virtualenv", "site-packages",
+    "__pycache__", ".tox", ".nox", ".mypy_cache", ".pytest_cache", ".ruff_cache", ".eggs",
+    "build", "dist", "vendor", "third_party"
+}
+
+# Below this many files the process pool costs more than it saves
+POOL_MIN_FILES = 32
+
+def module_names(rel_path: str) -> List[str]:
+    """
+    Importable names of a Python file: pkg/mod.py -> pkg.mod, pkg/__init__.py -> pkg
+    (plus the name without a leading src/ or lib/ directory).
+    """
+    parts = os.path.normpath(rel_path)[:-3].split(os.sep)
+    if parts[-1] == "__init__":
+        parts = parts[:-1]
+    names = [".".join(parts)]
+    if len(parts) > 1 and parts[0] in ("src", "lib"):
+        names.append(".".join(parts[1:]))
+    return [n for n in names if n]
+
+def _imports(tree: ast.AST, rel_path: str) -> List[str]:
+    # Absolute module names imported by the file (relative imports resolved)
+    package = (module_names(rel_path) or [""])[0].split(".")
+    if not rel_path.endswith("__init__.py"):
+        package = package[:-1]
+    modules = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ""
+            if node.level:
+                prefix = package[:len(package) - node.level + 1]
+                base = ".".join(prefix + ([base] if base else []))
+            if base:
+                modules.add(base)
+            modules.update(f"{base}.{alias.name}".strip(".") for alias in node.names)
+    return sorted(modules)
+
+def _check_syntax(full_path: str, rel_path: str) -> Optional[Tuple[bool, Optional[str], List[str]]]:
+    # Runs in worker processes; returns (has_syntax_error, error_detail, imported modules),
+    # or None for files that can't be read or decoded as source (binary, not UTF-8), which are skipped
+    try:
+        with open(full_path, "r", encoding="utf-8") as f:
+            content = f.read()
+        tree = ast.parse(content)
+        return False, None, _imports(tree, rel_path)
+    except SyntaxError as e:
+        return True, f"SyntaxError: {e.msg} at line {e.lineno}", []
+    except Exception as e:
+        print(f"Error scanning file {rel_path}: {e}")
+        return None
+
+class ScannedFile(dict):
+    """
+    Scan record. Behaves like the dicts the scanner used to return, but the file
+    `content` is only read when a consumer asks for it (e.g. the LLM analyzer),
+    so holding the scan results of a large repository stays cheap.
+    """
+
+    def __missing__(self, key):
+        if key == "content":
+            return self._read()
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key == "content" and not dict.__contains__(self, key):
+            return self._read()
+        return dict.get(self, key, default)
+
+    def _read(self) -> str:
+        try:
+            with open(self["full_path"], "r", encoding="utf-8") as f:
+                return f.read()
+        except Exception as e:
+            return f"Error reading file: {e}"
 
 class RepoScanner:
+    # Parse results keyed by (git blob hash, repo-relative path), shared across clones/workspaces, and by (path, size, mtime)
+    _cache: "OrderedDict[tuple, Tuple[bool, Optional[str], List[str]]]" = OrderedDict()
+    _cache_lock = threading.Lock()
+    _pool = None
+    _pool_lock = threading.Lock()
+
+    @classmethod
+    def _executor(cls) -> ProcessPoolExecutor:
+        with cls._pool_lock:
+            if cls._pool is None:
+                # Spawned, not forked: a fork of this threaded server can inherit locks held by other threads
+                cls._pool = ProcessPoolExecutor(max_workers=Config.SCAN_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+                atexit.register(cls.shutdown)
+            return cls._pool
+
+    @classmethod
+    def shutdown(cls):
+        with cls._pool_lock:
+            if cls._pool is not None:
+                cls._pool.shutdown(wait=False, cancel_futures=True)
+                cls._pool = None
+
+    @classmethod
+    def _cache_get(cls, keys):
+        with cls._cache_lock:
+            for key in keys:
+                if key in cls._cache:
+                    cls._cache.move_to_end(key)
+                    return cls._cache[key]
+        return None
+
+    @classmethod
+    def _cache_put(cls, keys, value):
+        with cls._cache_lock:
+            for key in keys:
+                cls._cache[key] = value
+                cls._cache.move_to_end(key)
+            while len(cls._cache) > Config.SCAN_CACHE_ENTRIES:
+                cls._cache.popitem(last=False)
+
     @staticmethod
-    def scan_repository(repo_path: str) -> List[Dict]:
+    def _git_files(repo_path: str) -> Optional[Dict[str, Optional[str]]]:
         """
-        Recursively scans the repository for Python files.
-        Checks for syntax errors using ast.parse.
-        Returns a list of file info objects.
+        Tracked and untracked-but-not-ignored files as {rel_path: blob hash or None}.
+        The blob hash is only given for files unmodified since the last commit.
+        Returns None if the directory is not a git checkout.
         """
-        results = []
-        
-        for root, _, files in os.walk(repo_path):
-            if ".git" in root:
+        def git(*args) -> List[str]:
+            out = subprocess.run(["git", "-C", repo_path] + list(args), capture_output=True, check=True).stdout
+            return [p.decode("utf-8", "replace") for p in out.split(b"\0") if p]
+
+        try:
+            staged = git("ls-files", "-s", "-z")
+            modified = set(git("ls-files", "-m", "-z"))
+            untracked = git("ls-files", "-o", "--exclude-standard", "-z")
+        except Exception:
+            return None
+
+        files = {}
+        for entry in staged:
+            meta, _, path = entry.partition("\t")
+            parts = meta.split()
+            files[path] = parts[1] if len(parts) > 1 and path not in modified else None
+        for path in untracked:
+            files[path] = None
+        return files
+
+    @staticmethod
+    def _walk_files(repo_path: str) -> Dict[str, Optional[str]]:
+        files = {}
+        for root, dirs, names in os.walk(repo_path):
+            dirs[:] = [d for d in dirs if d not in PRUNE_DIRS and not d.endswith(".egg-info")]
+            for name in names:
+                files[os.path.relpath(os.path.join(root, name), repo_path)] = None
+        return files
+
+    @staticmethod
+    def _pruned(rel_path: str) -> bool:
+        parts = rel_path.replace("\\", "/").split("/")[:-1]
+        return any(p in PRUNE_DIRS or p.endswith(".egg-info") for p in parts)
+
+    @classmethod
+    def scan_repository(cls, repo_path: str, only: List[str] = None) -> List[Dict]:
+        """
+        Scans the repository for Python files (respecting .gitignore and skipping
+        vendored/virtualenv/build directories) and checks them for syntax errors.
+        Unchanged files are served from the cache; the rest are parsed in a
+        process pool. `only` limits the scan to the given relative paths.
+        Returns lightweight ScannedFile records with lazily loaded `content`.
+        """
+        files = cls._git_files(repo_path)
+        if files is None:
+            files = cls._walk_files(repo_path)
+        if only is not None:
+            wanted = {os.path.normpath(p) for p in only}
+            files = {p: h for p, h in files.items() if os.path.normpath(p) in wanted}
+
+        records = []
+        pending = []  # (record, cache keys)
+        for rel_path in sorted(files):
+            if not rel_path.endswith(".py") or cls._pruned(rel_path):
                 continue
-                
-            for file in files:
-                if file.endswith(".py"):
-                    full_path = os.path.join(root, file)
-                    rel_path = os.path.relpath(full_path, repo_path)
-                    
-                    try:
-                        with open(full_path, "r", encoding="utf-8") as f:
-                            content = f.read()
-                            
-                        # Check Syntax
-                        try:
-                            ast.parse(content)
-                            is_syntax_error = False
-                            error_detail = None
-                        except SyntaxError as e:
-                            is_syntax_error = True
-                            error_detail = f"SyntaxError: {e.msg} at line {e.lineno}"
-                            
-                        results.append({
-                            "file": rel_path,
-                            "full_path": full_path,
-                            "has_syntax_error": is_syntax_error,
-                            "error_detail": error_detail,
-                            "content": content
-                        })
-                        
-                    except Exception as e:
-                        print(f"Error scanning file {rel_path}: {e}")
-                        
-        return results
+            full_path = os.path.join(repo_path, rel_path)
+            try:
+                st = os.stat(full_path)
+            except OSError:
+                continue
+
+            record = ScannedFile(file=os.path.normpath(rel_path), full_path=full_path, size=st.st_size)
+            keys = [("stat", os.path.abspath(full_path), st.st_size, st.st_mtime_ns)]
+            if files[rel_path]:
+                # Imports resolve relative to the file's package, so identical content at another path differs
+                keys.insert(0, ("blob", files[rel_path], record["file"]))
+
+            cached = cls._cache_get(keys)
+            if cached is not None:
+                record["has_syntax_error"], record["error_detail"], record["imports"] = cached
+                cls._cache_put(keys, cached)
+            else:
+                pending.append((record, keys))
+            records.append(record)
+
+        if pending:
+            paths = [record["full_path"] for record, _ in pending]
+            rel_paths = [record["file"] for record, _ in pending]
+            if len(pending) >= POOL_MIN_FILES and Config.SCAN_WORKERS > 1:
+                try:
+                    results = list(cls._executor().map(_check_syntax, paths, rel_paths, chunksize=16))
+                except Exception as e:
+                    print(f"Scan pool failed, scanning inline: {e}")
+                    results = list(map(_check_syntax, paths, rel_paths))
+            else:
+                results = list(map(_check_syntax, paths, rel_paths))
+
+            for (record, keys), result in zip(pending, results):
+                if result is None:
+                    continue
+                record["has_syntax_error"], record["error_detail"], record["imports"] = result
+                cls._cache_put(keys, result)
+            records = [record for record in records if "has_syntax_error" in record]
+
+        return records
+
+    @staticmethod
+    def head_commit(repo_path: str) -> str:
+        try:
+            return subprocess.run(["git", "-C", repo_path, "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        except Exception:
+            return ""
+
+    @staticmethod
+    def changed_since(repo_path: str, commit: str) -> Optional[List[str]]:
+        """
+        Files added, modified or deleted since `commit` (committed or not), plus
+        untracked files. Returns None when the diff can't be computed.
+        """
+        try:
+            diff = subprocess.run(["git", "-C", repo_path, "diff", "--name-only", "-z", commit],
+                                  capture_output=True, check=True).stdout
+            untracked = subprocess.run(["git", "-C", repo_path, "ls-files", "-o", "--exclude-standard", "-z"],
+                                       capture_output=True, check=True).stdout
+        except Exception:
+            return None
+        paths = [p.decode("utf-8", "replace") for p in (diff + b"\0" + untracked).split(b"\0") if p]
+        return sorted({os.path.normpath(p) for p in paths})
+
+    @staticmethod
+    def direct_importers(records: List[Dict], changed: List[str]) -> List[str]:
+        """
+        Files that import one of the changed files directly (not transitively).
+        """
+        changed_modules = {name for path in changed if path.endswith(".py") for name in module_names(path)}
+        if not changed_modules:
+            return []
+        known_modules = {name for record in records for name in module_names(record["file"])} | changed_modules
+
+        importers = []
+        for record in records:
+            for module in record.get("imports") or []:
+                # a.b.c may be defined by a/b/c.py or by a/b.py / a/__init__.py
+                while module and module not in known_modules:
+                    module = module.rpartition(".")[0]
+                if module in changed_modules:
+                    importers.append(record["file"])
+                    break
+        return sorted(set(importers) - set(changed))
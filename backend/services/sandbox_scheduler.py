@@ -0,0 +1,72 @@
+import time
+import threading
+from typing import Dict
+
+UNLIMITED_SLOTS = 1 << 16
+
+class SandboxScheduler:
+    """
+    Admission control for sandbox containers.
+    Every active sandbox reserves the CPU and memory limits it runs with; a new
+    one is only admitted while the reservations fit the host's capacity, so
+    concurrent runs queue instead of starving each other and the host.
+    A single sandbox is always admitted on an idle host, even if its limits
+    exceed the capacity, so a small host can't deadlock.
+    """
+
+    def __init__(self, capacity_cpus: float, capacity_memory: int, cpus: float, memory: int):
+        self.capacity_cpus = capacity_cpus
+        self.capacity_memory = capacity_memory
+        self.cpus = cpus
+        self.memory = memory
+        self.active = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+
+    def _free_slots(self) -> int:
+        free = []
+        if self.cpus > 0:
+            free.append(int((self.capacity_cpus - self.active * self.cpus) // self.cpus))
+        if self.memory > 0:
+            free.append(int((self.capacity_memory - self.active * self.memory) // self.memory))
+        if not free:
+            return UNLIMITED_SLOTS  # No limits configured: nothing to account for
+        if self.active == 0:
+            return max(min(free), 1)
+        return max(min(free), 0)
+
+    def acquire(self, slots: int = 1, timeout: float = None) -> int:
+        """
+        Reserves up to `slots` sandboxes, waiting until at least one fits.
+        Returns the number granted (0 if `timeout` seconds passed first).
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            self.waiting += 1
+            try:
+                while self._free_slots() < 1:
+                    remaining = None if deadline is None else deadline - time.time()
+                    if remaining is not None and remaining <= 0:
+                        return 0
+                    self._cond.wait(remaining)
+                granted = min(slots, self._free_slots())
+                self.active += granted
+                return granted
+            finally:
+                self.waiting -= 1
+
+    def release(self, slots: int = 1):
+        with self._cond:
+            self.active = max(0, self.active - slots)
+            self._cond.notify_all()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "active": self.active,
+                "waiting": self.waiting,
+                "reserved_cpus": self.active * self.cpus,
+                "reserved_memory": self.active * self.memory,
+                "capacity_cpus": self.capacity_cpus,
+                "capacity_memory": self.capacity_memory
+            }
@@ -0,0 +1,148 @@
+import os
+import re
+import time
+import hashlib
+import calendar
+import threading
+from typing import Dict, Optional
+from backend.scripts.universal_runner import LANGUAGE_CONFIG, detect_subprojects
+
+SNAPSHOT_REPOSITORY = "rift-snapshot"
+SNAPSHOT_LABEL = "rift.snapshot.repo"
+# Bump when what a snapshot must contain changes (v2: installed packages in the image, not /cache)
+SNAPSHOT_LAYOUT = "v2"
+
+# Every manifest/lockfile the runner knows about, across ecosystems
+MANIFEST_FILES = sorted({name for cfg in LANGUAGE_CONFIG.values() for name in cfg.get("lockfiles", [])})
+
+class SandboxSnapshots:
+    """
+    Post-install sandbox images, one per (repository, manifest hash).
+    A snapshot is created with `docker commit` right after a successful install;
+    later test runs on the same repo start from it and skip the install step.
+
+    Invalidation: the tag embeds a hash of the repo's manifests, the base image
+    ID and SNAPSHOT_LAYOUT, so any dependency or toolchain change yields a new
+    tag, and older snapshots for the same repository are removed when a new one
+    is committed. Installed packages are part of the image (see the runner's
+    IMAGE_DEPS_ROOT), so evicting dependency cache entries can't break a snapshot.
+    Retention: at most `max_images` snapshots, none unused for longer than `max_age`.
+    """
+
+    def __init__(self, client, base_image: str, max_images: int, max_age: int):
+        self.client = client
+        self.base_image = base_image
+        self.max_images = max_images
+        self.max_age = max_age
+        self._last_used: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def repo_slug(repo_url: str) -> str:
+        name = repo_url.rstrip("/").replace(".git", "")
+        name = name.replace("git@github.com:", "").replace("https://github.com/", "").replace("https://", "")
+        slug = re.sub(r'[^a-z0-9_.-]', '-', name.lower()).strip("-.")
+        return slug[:80] or "repo"
+
+    def manifest_hash(self, repo_path: str) -> str:
+        digest = hashlib.sha256(SNAPSHOT_LAYOUT.encode())
+        try:
+            digest.update(self.client.images.get(self.base_image).id.encode())
+        except Exception:
+            digest.update(self.base_image.encode())
+
+        # Root manifests plus those of every subproject the runner will install
+        names = list(MANIFEST_FILES)
+        for root, language in detect_subprojects(repo_path):
+            if root != ".":
+                names.extend(os.path.join(root, name) for name in LANGUAGE_CONFIG.get(language, {}).get("lockfiles", []))
+        for name in names:
+            path = os.path.join(repo_path, name)
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    digest.update(name.encode() + b"\0" + f.read())
+        return digest.hexdigest()[:16]
+
+    def tag_for(self, repo_url: str, repo_path: str) -> str:
+        return f"{self.repo_slug(repo_url)}-{self.manifest_hash(repo_path)}"
+
+    def lookup(self, tag: str) -> Optional[str]:
+        """
+        Returns the full image name if a snapshot exists for the tag.
+        """
+        image = f"{SNAPSHOT_REPOSITORY}:{tag}"
+        try:
+            self.client.images.get(image)
+        except Exception:
+            return None
+        with self._lock:
+            self._last_used[image] = time.time()
+        return image
+
+    def commit(self, container, repo_url: str, tag: str) -> Optional[str]:
+        slug = self.repo_slug(repo_url)
+        image = f"{SNAPSHOT_REPOSITORY}:{tag}"
+        try:
+            container.commit(
+                repository=SNAPSHOT_REPOSITORY,
+                tag=tag,
+                conf={"Labels": {SNAPSHOT_LABEL: slug}}
+            )
+        except Exception as e:
+            print(f"Snapshot commit failed: {e}")
+            return None
+
+        with self._lock:
+            self._last_used[image] = time.time()
+
+        # Manifest changed: snapshots of the same repo with another hash are stale
+        self._remove(lambda img, name: img.labels.get(SNAPSHOT_LABEL) == slug and name != image)
+        self.enforce_retention()
+        return image
+
+    def enforce_retention(self):
+        now = time.time()
+        try:
+            images = self.client.images.list(filters={"label": SNAPSHOT_LABEL})
+        except Exception:
+            return
+
+        ranked = []
+        for img in images:
+            for name in img.tags:
+                with self._lock:
+                    last_used = self._last_used.get(name)
+                if last_used is None:
+                    last_used = self._created(img)
+                ranked.append((last_used, name))
+
+        ranked.sort(reverse=True)
+        for index, (last_used, name) in enumerate(ranked):
+            if index >= self.max_images or now - last_used > self.max_age:
+                self._remove_image(name)
+
+    @staticmethod
+    def _created(img) -> float:
+        created = img.attrs.get("Created", "")
+        try:
+            return calendar.timegm(time.strptime(created[:19], "%Y-%m-%dT%H:%M:%S"))
+        except Exception:
+            return 0.0
+
+    def _remove(self, predicate):
+        try:
+            images = self.client.images.list(filters={"label": SNAPSHOT_LABEL})
+        except Exception:
+            return
+        for img in images:
+            for name in img.tags:
+                if predicate(img, name):
+                    self._remove_image(name)
+
+    def _remove_image(self, name: str):
+        try:
+            self.client.images.remove(name, force=True)
+        except Exception as e:
+            print(f"Snapshot removal failed for {name}: {e}")
+        with self._lock:
+            self._last_used.pop(name, None)
@@ -0,0 +1,62 @@
+import os
+import json
+import hashlib
+import threading
+from typing import Dict, Optional
+from backend.config import Config
+
+class TestTimings:
+    """
+    Per-repository test durations ({shard unit: seconds}) reported by the
+    universal runner, one JSON file per repository under `root`. Used to
+    balance test shards; new measurements are blended with the stored ones so
+    a single slow run doesn't skew the split.
+    """
+
+    # Weight of the newest measurement
+    SMOOTHING = 0.5
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def path_for(self, repo_url: str) -> str:
+        key = hashlib.sha256(repo_url.strip().rstrip("/").lower().encode()).hexdigest()[:16]
+        return os.path.join(self.root, f"{key}.json")
+
+    def load(self, repo_url: str) -> Dict[str, float]:
+        try:
+            with open(self.path_for(repo_url), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def record(self, repo_url: str, timings: Dict[str, float]):
+        if not timings:
+            return
+        path = self.path_for(repo_url)
+        with self._lock:
+            stored = self.load(repo_url)
+            for unit, seconds in timings.items():
+                previous = stored.get(unit)
+                stored[unit] = round(seconds if previous is None else self.SMOOTHING * seconds + (1 - self.SMOOTHING) * previous, 3)
+            tmp = f"{path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(stored, f)
+            os.replace(tmp, path)
+
+_timings = None
+_timings_lock = threading.Lock()
+
+def get_test_timings() -> Optional[TestTimings]:
+    """
+    Process-wide timing store, or None when TEST_TIMINGS_DIR is empty.
+    """
+    global _timings
+    if not Config.TEST_TIMINGS_DIR:
+        return None
+    with _timings_lock:
+        if _timings is None:
+            _timings = TestTimings(Config.TEST_TIMINGS_DIR)
+        return _timings
@@ -0,0 +1,209 @@
+import time
+import bisect
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Upper bounds in seconds; sandbox steps run from milliseconds (cached LLM, git) to tens of minutes
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+
+# Spans kept per run; a run that loops for hours stops recording (histograms still count)
+MAX_SPANS = 5000
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+class Histogram:
+    """
+    Cumulative Prometheus histogram with one label, rendered in the text
+    exposition format.
+    """
+
+    def __init__(self, name: str, help_text: str, label: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[str, List] = {}  # label value -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, label_value: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.setdefault(label_value, [0] * (len(self.buckets) + 1) + [0.0])
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key in sorted(series):
+            values = series[key]
+            label = f'{self.label}="{_escape(key)}"'
+            count = 0
+            for bound, observed in zip(self.buckets, values):
+                count += observed
+                lines.append(f'{self.name}_bucket{{{label},le="{bound:g}"}} {count}')
+            count += values[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{label}}} {values[-1]:.6f}")
+            lines.append(f"{self.name}_count{{{label}}} {count}")
+        return "\n".join(lines) + "\n"
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+NODE_DURATION = Histogram("rift_node_duration_seconds", "Wall-clock time of agent graph nodes.", "node")
+STEP_DURATION = Histogram("rift_step_duration_seconds", "Wall-clock time of steps inside nodes (docker start, install, tests, LLM calls, git push).", "step")
+RUN_DURATION = Histogram("rift_run_duration_seconds", "Wall-clock time of whole agent runs by final status.", "status")
+
+HISTOGRAMS = {"node": NODE_DURATION, "step": STEP_DURATION}
+
+class Trace:
+    """
+    Spans of one agent run. Spans are recorded by `span()` in whatever thread
+    they finish in; `to_dict()` is what results.json carries.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.spans: List[Dict] = []
+        self.dropped = 0
+        self._ids = 0
+        self._lock = threading.Lock()
+
+    def next_id(self) -> int:
+        with self._lock:
+            self._ids += 1
+            return self._ids
+
+    def offset(self, counter: float) -> float:
+        return counter - self._start
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._start
+
+    def add(self, record: Dict):
+        with self._lock:
+            if len(self.spans) < MAX_SPANS:
+                self.spans.append(record)
+            else:
+                self.dropped += 1
+
+    def summary(self) -> Dict[str, Dict]:
+        """
+        {kind: {name: {count, total_seconds, max_seconds}}}
+        """
+        result = {}
+        with self._lock:
+            spans = list(self.spans)
+        for record in spans:
+            entry = result.setdefault(record["kind"], {}).setdefault(record["name"], {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            entry["count"] += 1
+            entry["total_seconds"] = round(entry["total_seconds"] + record["duration_seconds"], 4)
+            entry["max_seconds"] = max(entry["max_seconds"], record["duration_seconds"])
+        return result
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: (s["start_seconds"], s["id"]))
+        return {
+            "started_at": self.started_at,
+            "duration_seconds": round(self.elapsed(), 4),
+            "summary": self.summary(),
+            "spans": spans,
+            "dropped_spans": self.dropped
+        }
+
+_trace: contextvars.ContextVar = contextvars.ContextVar("rift_trace", default=None)
+_parent: contextvars.ContextVar = contextvars.ContextVar("rift_span", default=None)
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+@contextmanager
+def activate(trace: Trace):
+    """
+    Makes `trace` the destination of spans opened in this context (and in
+    work submitted through `in_context`).
+    """
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+
+def _finish(trace: Optional[Trace], span_id: Optional[int], parent: Optional[int], name: str, kind: str, start: float, duration: float, status: str, attributes: Dict):
+    HISTOGRAMS[kind].observe(duration, name)
+    if trace:
+        trace.add({
+            "id": span_id,
+            "parent": parent,
+            "name": name,
+            "kind": kind,
+            "start_seconds": round(trace.offset(start), 4),
+            "duration_seconds": round(duration, 4),
+            "status": status,
+            "thread": threading.current_thread().name,
+            **({"attributes": attributes} if attributes else {})
+        })
+
+@contextmanager
+def span(name: str, kind: str = "step", **attributes):
+    """
+    Times the block: the duration is observed in the `kind` histogram and, inside
+    an active trace, recorded as a span nested under the enclosing one. Yields the
+    attribute dict so the block can add to it (e.g. a result status).
+    """
+    trace = _trace.get()
+    parent = _parent.get()
+    span_id = trace.next_id() if trace else None
+    token = _parent.set(span_id) if trace else None
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield attributes
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        if trace:
+            _parent.reset(token)
+        _finish(trace, span_id, parent, name, kind, start, time.perf_counter() - start, attributes.pop("status", status), attributes)
+
+def record_span(name: str, start: float, end: float, kind: str = "step", **attributes):
+    """
+    Records a span measured elsewhere (perf_counter timestamps), e.g. sandbox
+    stages reconstructed from the runner's event stream.
+    """
+    trace = _trace.get()
+    span_id = trace.next_id() if trace else None
+    _finish(trace, span_id, _parent.get(), name, kind, start, max(0.0, end - start), attributes.pop("status", "ok"), attributes)
+
+def traced_node(name: str, fn: Callable) -> Callable:
+    """
+    Wraps a graph node in a "node" span. The signature is preserved so LangGraph
+    still passes `config` to nodes that take it.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with span(name, kind="node"):
+            return fn(*args, **kwargs)
+    return wrapper
+
+def in_context(fn: Callable) -> Callable:
+    """
+    Binds `fn` to the caller's trace and parent span, for work handed to thread pools.
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return wrapper
+
+def render_metrics() -> str:
+    return "".join(h.render() for h in (NODE_DURATION, STEP_DURATION, RUN_DURATION))
@@ -21,6 +21,9 @@ import {
 
 const API_URL = "http://localhost:8000";
 
+// Only the newest lines are kept in the browser; the server keeps the full log
+const MAX_LOG_LINES = 1000;
+
 // --- Components ---
 
 const StatusBadge = ({ status }: { status: string }) => {
@@ -29,6 +32,7 @@ const StatusBadge = ({ status }: { status: string }) => {
     FAILED: "bg-red-900/50 text-red-400 border-red-700",
     PENDING: "bg-yellow-900/50 text-yellow-400 border-yellow-700",
     RUNNING: "bg-blue-900/50 text-blue-400 border-blue-700 animate-pulse",
+    QUEUED: "bg-slate-800/50 text-slate-300 border-slate-600",
     ERROR: "bg-red-900/50 text-red-400 border-red-700",
   };
   const s = status as keyof typeof styles;
@@ -66,21 +70,56 @@ export default function Dashboard() {
     auth_mode: "https",
   });
 
+  const [runId, setRunId] = useState<string | null>(null);
+
   const logsEndRef = useRef<HTMLDivElement>(null);
 
   useEffect(() => {
-    const poll = async () => {
-      try {
-        const res = await axios.get(`${API_URL}/status`);
-        setStatus(res.data);
-      } catch (e) {
-        console.error("Polling error", e);
-      }
-    };
+    // Live run: the server pushes a snapshot, then only deltas
+    if (runId) {
+      const source = new EventSource(`${API_URL}/runs/${runId}/events`);
 
-    const interval = setInterval(poll, 2000);
-    return () => clearInterval(interval);
-  }, []);
+      source.addEventListener("snapshot", (e) => {
+        setStatus(JSON.parse((e as MessageEvent).data));
+      });
+      source.addEventListener("state", (e) => {
+        const changed = JSON.parse((e as MessageEvent).data);
+        setStatus((prev: any) => ({ ...prev, ...changed }));
+      });
+      source.addEventListener("logs", (e) => {
+        const { lines, next_seq } = JSON.parse((e as MessageEvent).data);
+        setStatus((prev: any) => ({
+          ...prev,
+          logs: [...prev.logs, ...lines].slice(-MAX_LOG_LINES),
+          log_next_seq: next_seq,
+        }));
+      });
+      source.addEventListener("fixes", (e) => {
+        const updates = JSON.parse((e as MessageEvent).data);
+        setStatus((prev: any) => {
+          const fixes = [...prev.fixes_applied];
+          updates.forEach((u: any) => (fixes[u.index] = u.fix));
+          return { ...prev, fixes_applied: fixes };
+        });
+      });
+      source.addEventListener("end", () => source.close());
+      source.onerror = (e) => console.error("Event stream error", e);
+
+      return () => source.close();
+    }
+
+    // No run started from this page yet: show the latest run, and follow it
+    // if it is still in progress (page reloaded mid-run, or started elsewhere)
+    axios
+      .get(`${API_URL}/status`)
+      .then((res) => {
+        setStatus(res.data);
+        if (res.data.run_id && ["QUEUED", "RUNNING"].includes(res.data.status)) {
+          setRunId(res.data.run_id);
+        }
+      })
+      .catch((e) => console.error("Status error", e));
+  }, [runId]);
 
 
 
@@ -140,10 +179,11 @@ export default function Dashboard() {
     checkVercelDeployment(formData.repo_url);
 
     try {
-      await axios.post(`${API_URL}/start-autonomous-run`, {
+      const res = await axios.post(`${API_URL}/start-autonomous-run`, {
         ...formData,
         auth_mode: authMode,
       });
+      setRunId(res.data.run_id);
     } catch (err: any) {
       alert(
         "Failed to start agent: " + (err.response?.data?.detail || err.message),
@@ -151,7 +191,8 @@ export default function Dashboard() {
     }
   };
 
-  const isRunning = status.status === "RUNNING";
+  const isRunning =
+    status.status === "RUNNING" || status.status === "QUEUED";
 
   return (
     <div className="min-h-screen bg-[#0f172a] text-slate-200 font-sans selection:bg-blue-500/30">